@@ -0,0 +1,423 @@
+"""
+Micro benchmarks for the poopy pipeline
+
+    python benchmark.py lexer --lines 200000
+    python benchmark.py engines --lines 20000
+    python benchmark.py procs --lines 50000
+    python benchmark.py loops --lines 50000
+    python benchmark.py calls --lines 50000
+    python benchmark.py locals --lines 50000
+    python benchmark.py globals --lines 50000
+    python benchmark.py values --lines 50000
+    python benchmark.py numeric --lines 50000
+    python benchmark.py recursion --lines 50000
+    python benchmark.py builtins --lines 50000
+"""
+from argparse import ArgumentParser
+import time
+import tracemalloc
+
+from core.cache import children
+import core.transpiler as transpiler
+from core.context import Context
+from core.lexer import Lexer
+from core.parser import Parser
+from core.run import ENGINES, Run
+from core.runtime import RTException
+from core.symbol_table import GlobalSymbolTable
+
+SAMPLE_PROGRAM = """@ generated benchmark program
+BUCKET counter_{n} = {n} * 2.5 + (3 - 1) ^ 2
+BUCKET greeting_{n} = "Hello poopy number " + "{n}"
+PROC add_{n}(a1, a2) : a1 + a2
+IF counter_{n} >= 10 THEN POOP_OUT_RET(greeting_{n}) ELSE POOP_OUT_RET("small")
+LOOP i = 0 TILL 3 STEP 1 DO add_{n}(i, counter_{n}) != 0
+BUCKET items_{n} = {{1, 2, 3, counter_{n}}}
+"""
+
+COMPUTE_PROGRAM = """
+PROC work(n)
+    BUCKET total = 0
+    LOOP i = 1 TILL n DO
+        BUCKET total = total + i * 2 - (i / 3) ^ 2
+        IF total > 1000 THEN BUCKET total = total - 1000 ALTER total < 0 THEN BUCKET total = 0 ELSE total
+    END
+END
+PROC square(x) : x * x
+work({n})
+LOOP i = 1 TILL {n} DO square(i) + square(i + 1)
+"""
+
+PROC_PROGRAM = """
+PROC add(a1, a2) : a1 + a2
+PROC half(x) : IF x > 10 THEN x * 0.5 - 3 ELSE x / 2
+LOOP i = 1 TILL {n} DO add(0 - i, half(i))
+"""
+
+LOOP_PROGRAM = """
+BUCKET rate = 11
+BUCKET scale = 2.5
+LOOP i = 1 TILL {n} DO
+    BUCKET last = i * rate + (scale * rate - 1) / (rate + 1) + i ^ 2
+END
+"""
+
+CALL_PROGRAM = """
+PROC greet(name) : "Hello " + name
+PROC add(a1, a2) : a1 + a2
+PROC scale(x, factor) : x * factor
+PROC area(w, h, mode) : IF mode == 1 THEN w * h ALTER mode == 2 THEN w * h / 2 ELSE w + h
+LOOP i = 1 TILL {n} DO
+    greet("Poopy")
+    add(i, scale(i, 7))
+    area(i, 7, 1)
+END
+"""
+
+
+LOCALS_PROGRAM = """
+PROC work(n)
+    BUCKET total = 0
+    BUCKET step = 7
+    LOOP i = 1 TILL n DO
+        BUCKET total = total + i * step - step
+        IF total > 1000 THEN BUCKET total = total - 1000 ELSE total
+    END
+END
+work({n})
+"""
+
+# rate is assigned twice so it is not folded, every read is a global lookup
+GLOBALS_PROGRAM = """
+BUCKET rate = 3
+BUCKET rate = rate + 4
+PROC work(n)
+    BUCKET total = 0
+    LOOP i = 1 TILL n DO
+        BUCKET total = total + i * rate - rate
+        IF IS_NUMBER(total) THEN total ELSE POOP_OUT(total)
+    END
+END
+work({n})
+"""
+
+# every value the loop makes is kept in the list the program returns
+VALUES_PROGRAM = """
+BUCKET rate = 7
+PROC scale(x) : x * rate
+LOOP i = 1 TILL {n} DO {{i, scale(i), "item", i + 0.5, i > 25000}}
+"""
+
+# only numbers, level 2 runs the expressions and the typed copy of step on
+# plain values
+NUMERIC_PROGRAM = """
+PROC step(x, y)
+    BUCKET d = x * x - y * y + 3
+    IF d > 100 THEN d / 7 - x ELSE d * 2 + y
+END
+BUCKET total = 0
+LOOP i = 1 TILL {n} DO
+    BUCKET total = total + i * 7 - (i / 3) ^ 2 / 100
+    IF total > 1000 THEN BUCKET total = total - 1000 ELSE total
+    step(i, total)
+END
+"""
+
+# a call per few nodes run, the PROCs recurse instead of looping
+RECURSION_PROGRAM = """
+PROC fib(n) : IF n < 2 THEN n ELSE fib(n - 1) + fib(n - 2)
+PROC count(n)
+    BUCKET left = n - 1
+    IF left > 0 THEN count(left) ELSE left
+END
+LOOP i = 1 TILL {n} DO
+    fib(8)
+    count(20)
+END
+"""
+
+# a built-in call per statement, the values are dropped
+BUILTINS_PROGRAM = """
+LOOP i = 1 TILL {n} DO
+    POOP_OUT_RET(i)
+    IS_NUMBER(i)
+    IS_STRING("poopy")
+    MATH_SQRT(i)
+END
+"""
+
+
+def generate_program(lines):
+    chunks = []
+    per_chunk = SAMPLE_PROGRAM.count("\n")
+    for n in range(max(1, lines // per_chunk)):
+        chunks.append(SAMPLE_PROGRAM.format(n=n))
+    return "".join(chunks)
+
+
+def best_of(repeat, func):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def measure_memory(func):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = func()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    return sum(stat.size_diff for stat in stats), result
+
+
+def bench_lexer(args):
+    text = generate_program(args.lines)
+
+    def lex():
+        tokens, error = Lexer("<benchmark>", text).make_tokens()
+        if error:
+            raise SystemExit(error.as_string())
+        return tokens
+
+    elapsed, tokens = best_of(args.repeat, lex)
+    print(f"source size     : {len(text) / 1e6:.2f} MB")
+    print(f"tokens          : {len(tokens)}")
+    print(f"best of {args.repeat}       : {elapsed:.3f} s")
+    print(f"tokens/sec      : {len(tokens) / elapsed:,.0f}")
+
+    size, tokens = measure_memory(lex)
+    print(f"bytes/token     : {size / len(tokens):.1f}")
+
+
+def bench_parser(args):
+    text = generate_program(args.lines)
+    tokens, error = Lexer("<benchmark>", text).make_tokens()
+    if error:
+        raise SystemExit(error.as_string())
+
+    def parse():
+        ast = Parser(tokens).parse()
+        if ast.error:
+            raise SystemExit(ast.error.as_string())
+        return ast.node
+
+    elapsed, _ = best_of(args.repeat, parse)
+    print(f"tokens          : {len(tokens)}")
+    print(f"best of {args.repeat}       : {elapsed:.3f} s")
+    print(f"tokens/sec      : {len(tokens) / elapsed:,.0f}")
+
+    chain = "+".join(["1"] * 100000)
+    chain_tokens, _ = Lexer("<benchmark>", chain).make_tokens()
+    elapsed, _ = best_of(1, lambda: Parser(chain_tokens).parse())
+    print(f"100k term chain : {elapsed:.3f} s")
+
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(children(node))
+    return count
+
+
+def bench_ast(args):
+    text = generate_program(args.lines)
+
+    def build():
+        tokens, error = Lexer("<benchmark>", text).make_tokens()
+        if error:
+            raise SystemExit(error.as_string())
+        ast = Parser(tokens).parse()
+        if ast.error:
+            raise SystemExit(ast.error.as_string())
+        return ast.node
+
+    # only what the tree keeps alive is counted, the token stream is freed
+    size, node = measure_memory(build)
+    nodes = count_nodes(node)
+    print(f"source size     : {len(text) / 1e6:.2f} MB")
+    print(f"nodes           : {nodes}")
+    print(f"tree size       : {size / 1e6:.1f} MB")
+    print(f"bytes/node      : {size / nodes:.1f}")
+
+
+def bench_engines(args):
+    text = COMPUTE_PROGRAM.format(n=args.lines)
+    tokens, error = Lexer("<benchmark>", text).make_tokens()
+    if error:
+        raise SystemExit(error.as_string())
+    node = Parser(tokens, strict=True).parse().node
+
+    for name, engine in ENGINES.items():
+
+        def execute():
+            context = Context("<program>")
+            context.symbol_table = GlobalSymbolTable()
+            try:
+                engine().visit(node, context)
+            except RTException as e:
+                raise SystemExit(e.error.as_string())
+
+        elapsed, _ = best_of(args.repeat, execute)
+        print(f"{name:<16}: {elapsed:.3f} s")
+
+
+def bench_procs(args):
+    text = PROC_PROGRAM.format(n=args.lines)
+    tokens, error = Lexer("<benchmark>", text).make_tokens()
+    if error:
+        raise SystemExit(error.as_string())
+
+    hot_calls = transpiler.HOT_CALLS
+    for name, engine in ENGINES.items():
+        for tiering, threshold in (("engine only", float("inf")), ("transpiled", hot_calls)):
+
+            def execute():
+                # a fresh tree, the tiering state lives on the ProcNodes
+                node = Parser(tokens, strict=True).parse().node
+                context = Context("<program>")
+                context.symbol_table = GlobalSymbolTable()
+                try:
+                    engine().visit(node, context)
+                except RTException as e:
+                    raise SystemExit(e.error.as_string())
+
+            transpiler.HOT_CALLS = threshold
+            elapsed, _ = best_of(args.repeat, execute)
+            print(f"{name + ' ' + tiering:<24}: {elapsed:.3f} s")
+    transpiler.HOT_CALLS = hot_calls
+
+
+def bench_opt_levels(text, args, opt_levels=(1, 2)):
+    tokens, error = Lexer("<benchmark>", text).make_tokens()
+    if error:
+        raise SystemExit(error.as_string())
+
+    for name, engine in ENGINES.items():
+        for opt_level in opt_levels:
+
+            def execute():
+                # a fresh tree, the optimizer rewrites it in place
+                node = Parser(tokens, strict=True).parse().node
+                node = Run().optimize(node, opt_level, keep_result=False)
+                context = Context("<program>")
+                context.symbol_table = GlobalSymbolTable()
+                try:
+                    engine().visit(node, context)
+                except RTException as e:
+                    raise SystemExit(e.error.as_string())
+
+            elapsed, _ = best_of(args.repeat, execute)
+            print(f"{name + ' opt level ' + str(opt_level):<24}: {elapsed:.3f} s")
+
+
+def bench_loops(args):
+    bench_opt_levels(LOOP_PROGRAM.format(n=args.lines), args)
+
+
+def bench_calls(args):
+    bench_opt_levels(CALL_PROGRAM.format(n=args.lines), args)
+
+
+def bench_locals(args):
+    # nothing in the program folds, level 1 only resolves the PROC locals
+    bench_opt_levels(LOCALS_PROGRAM.format(n=args.lines), args, (0, 1))
+
+
+def bench_globals(args):
+    # level 1 resolves the program, every global read gets a lookup cache
+    bench_opt_levels(GLOBALS_PROGRAM.format(n=args.lines), args, (0, 1))
+
+
+def bench_numeric(args):
+    bench_opt_levels(NUMERIC_PROGRAM.format(n=args.lines), args)
+
+
+def bench_recursion(args):
+    # the engines run every call, none is transpiled
+    hot_calls = transpiler.HOT_CALLS
+    transpiler.HOT_CALLS = float("inf")
+    bench_opt_levels(RECURSION_PROGRAM.format(n=args.lines // 100), args, (0, 1))
+    transpiler.HOT_CALLS = hot_calls
+
+
+def count_values(value):
+    """Values a result holds and the distinct objects behind them"""
+    count = 0
+    objects = set()
+    values = [value]
+    while values:
+        value = values.pop()
+        count += 1
+        objects.add(id(value))
+        values.extend(getattr(value, "elements", ()))
+    return count, len(objects)
+
+
+def bench_values(args):
+    text = VALUES_PROGRAM.format(n=args.lines)
+    tokens, error = Lexer("<benchmark>", text).make_tokens()
+    if error:
+        raise SystemExit(error.as_string())
+    node = Parser(tokens, strict=True).parse().node
+
+    for name, engine in ENGINES.items():
+
+        def execute():
+            context = Context("<program>")
+            context.symbol_table = GlobalSymbolTable()
+            try:
+                return engine().visit(node, context)
+            except RTException as e:
+                raise SystemExit(e.error.as_string())
+
+        # warm up first, the engines compile and cache per node
+        execute()
+        elapsed, _ = best_of(args.repeat, execute)
+        # only what the result keeps alive is counted
+        size, value = measure_memory(execute)
+        values, objects = count_values(value)
+        print(
+            f"{name:<16}: {elapsed:.3f} s, {values} values in {objects} objects,"
+            f" {size / 1e6:.1f} MB, {size / values:.1f} bytes/value"
+        )
+
+
+def bench_builtins(args):
+    bench_opt_levels(BUILTINS_PROGRAM.format(n=args.lines), args, (1,))
+
+
+BENCHMARKS = {
+    "calls": bench_calls,
+    "globals": bench_globals,
+    "locals": bench_locals,
+    "loops": bench_loops,
+    "values": bench_values,
+    "numeric": bench_numeric,
+    "recursion": bench_recursion,
+    "builtins": bench_builtins,
+    "procs": bench_procs,
+    "engines": bench_engines,
+    "ast": bench_ast,
+    "lexer": bench_lexer,
+    "parser": bench_parser,
+}
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--lines", type=int, default=120000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
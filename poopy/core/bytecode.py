@@ -0,0 +1,370 @@
+from array import array
+
+import core.constant as cc
+from core.nodes import ProcNode, InlineCallNode, SpecialCallNode, op_name
+from core.cache import children
+
+# Every instruction is an opcode followed by one argument, a constant pool
+# index, a count or a jump target (instruction offset into the code array)
+NUMBER = 0  # consts[arg] = Number of the literal
+STRING = 1  # consts[arg] = String of the literal
+LOAD = 2  # consts[arg] = (name, pos_start, pos_end)
+STORE = 3  # consts[arg] = name, keeps the value on the stack
+BINARY = 4  # consts[arg] = BinOpNode, its operation table and where an error is
+NEGATE = 5  # consts[arg] = UnaryOpNode
+NOT = 6  # consts[arg] = UnaryOpNode
+POP = 7
+PUSH_NONE = 8
+JUMP = 9  # arg = target
+JUMP_IF_FALSE = 10  # arg = target, pops the condition
+BEGIN_LIST = 11  # pushes the error slot of the list and its handler block
+ELEMENT = 12  # arg = end of the element, an error there is handled by the list
+ELEMENT_LIST = 13  # same as ELEMENT for an element that is a list itself
+BUILD_LIST = 14  # consts[arg] = count
+FOR_SETUP = 15  # consts[arg] = (var name, has step, ForNode)
+FOR_ITER = 16  # arg = target once the loop is done
+FOR_APPEND = 17
+FOR_END = 18  # consts[arg] = should return null
+MAKE_PROC = 19  # consts[arg] = ProcNode
+CALL = 20  # consts[arg] = (arg count, CallNode)
+RETURN = 21
+INVARIANT = 22  # consts[arg] = [slot, end], a cached value is pushed and the expression skipped
+SAVE_INVARIANT = 23  # consts[arg] = InvariantNode, keeps the value on the stack
+INDUCTION = 24  # consts[arg] = [InductionNode, end], same skip as INVARIANT
+INLINE_CALL = 25  # consts[arg] = [InlineCallNode, target], jumps to the call as written unless inlined
+ENTER_INLINE = 26  # consts[arg] = (InlineCallNode, arg count)
+SPECIALIZE = 27  # consts[arg] = SpecialCallNode, swaps the callee for its specialised PROC
+LOAD_LOCAL = 28  # consts[arg] = (slot, name, pos_start, pos_end), a name resolved to a slot of the frame
+LOAD_OUTER = 29  # consts[arg] = (depth, slot, name, pos_start, pos_end), a slot of a frame further out
+STORE_LOCAL = 30  # arg = slot, keeps the value on the stack
+LOAD_GLOBAL = 31  # consts[arg] = (name, LookupCache, pos_start, pos_end), a LOAD through its cache
+NUMERIC = 32  # consts[arg] = (NumericNode, leaf count), pops the values of its leaves
+TAIL_CALL = 33  # consts[arg] = (arg count, CallNode), a CALL whose value the body returns
+
+OPNAMES = (
+    "NUMBER",
+    "STRING",
+    "LOAD",
+    "STORE",
+    "BINARY",
+    "NEGATE",
+    "NOT",
+    "POP",
+    "PUSH_NONE",
+    "JUMP",
+    "JUMP_IF_FALSE",
+    "BEGIN_LIST",
+    "ELEMENT",
+    "ELEMENT_LIST",
+    "BUILD_LIST",
+    "FOR_SETUP",
+    "FOR_ITER",
+    "FOR_APPEND",
+    "FOR_END",
+    "MAKE_PROC",
+    "CALL",
+    "RETURN",
+    "INVARIANT",
+    "SAVE_INVARIANT",
+    "INDUCTION",
+    "INLINE_CALL",
+    "ENTER_INLINE",
+    "SPECIALIZE",
+    "LOAD_LOCAL",
+    "LOAD_OUTER",
+    "STORE_LOCAL",
+    "LOAD_GLOBAL",
+    "NUMERIC",
+    "TAIL_CALL",
+)
+
+JUMP_OPS = frozenset((JUMP, JUMP_IF_FALSE, ELEMENT, ELEMENT_LIST, FOR_ITER))
+SLOT_OPS = frozenset((STORE_LOCAL,))
+CONST_OPS = frozenset(
+    (NUMBER, STRING, LOAD, STORE, BINARY, NEGATE, NOT, BUILD_LIST, FOR_SETUP,
+     FOR_END, MAKE_PROC, CALL, INVARIANT, SAVE_INVARIANT, INDUCTION,
+     INLINE_CALL, ENTER_INLINE, SPECIALIZE, LOAD_LOCAL, LOAD_OUTER, LOAD_GLOBAL,
+     NUMERIC, TAIL_CALL)
+)
+
+
+class Code:
+    """Bytecode of a program or of a PROC body"""
+
+    __slots__ = ("name", "code", "consts")
+
+    def __init__(self, name, code, consts):
+        self.name = name
+        self.code = code
+        self.consts = consts
+
+    def __repr__(self):
+        return f"<Code {self.name}>"
+
+
+class BytecodeCompiler:
+    """
+    Compiles a tree to a Code object. A PROC body is compiled on its own
+    when the VM first calls it, so a deferred body is never parsed here.
+    In a body compiled with tail_calls, a call whose value the body returns
+    is a TAIL_CALL.
+    """
+
+    def __init__(self, name, tail_calls=False):
+        self.name = name
+        self.tail_calls = tail_calls
+        self.code = array("l")
+        self.consts = []
+
+    def compile(self, node):
+        self.visit(node)
+        self.emit(RETURN)
+        if self.tail_calls:
+            self.mark_tail_calls()
+        return Code(self.name, self.code, self.consts)
+
+    def mark_tail_calls(self):
+        """Turns every CALL followed by a RETURN, straight or through jumps, into a TAIL_CALL"""
+        code = self.code
+        for at in range(0, len(code), 2):
+            if code[at] != CALL:
+                continue
+            target = at + 2
+            # jumps out of an IF case, only ever forward
+            while code[target] == JUMP:
+                target = code[target + 1]
+            if code[target] == RETURN:
+                code[at] = TAIL_CALL
+
+    def emit(self, op, arg=0):
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def here(self):
+        return len(self.code)
+
+    def patch(self, at, target):
+        self.code[at + 1] = target
+
+    def visit(self, node):
+        getattr(self, f"visit_{type(node).__name__}")(node)
+
+    def visit_NumberNode(self, node):
+        self.emit(NUMBER, self.const(node.constant))
+
+    def visit_StringNode(self, node):
+        self.emit(STRING, self.const(node.constant))
+
+    def visit_ListNode(self, node):
+        self.emit(BEGIN_LIST)
+        for element in node.element_nodes:
+            at = self.emit(ELEMENT_LIST if type(element).__name__ == "ListNode" else ELEMENT)
+            self.visit(element)
+            self.patch(at, self.here())
+        self.emit(BUILD_LIST, self.const(len(node.element_nodes)))
+
+    def visit_BinOpNode(self, node):
+        self.visit(node.left_node)
+        self.visit(node.right_node)
+        self.emit(BINARY, self.const(node))
+
+    def visit_UnaryOpNode(self, node):
+        self.visit(node.node)
+        # +x is x
+        if node.op == cc.TT_MINUS:
+            self.emit(NEGATE, self.const(node))
+        elif node.op == "NOT":
+            self.emit(NOT, self.const(node))
+
+    def visit_VarAccessNode(self, node):
+        if node.cache is not None:
+            self.emit(LOAD_GLOBAL, self.const((node.var_name, node.cache, node.pos_start, node.pos_end)))
+        elif node.depth is None:
+            self.emit(LOAD, self.const((node.var_name, node.pos_start, node.pos_end)))
+        elif node.depth == 0:
+            self.emit(LOAD_LOCAL, self.const((node.slot, node.var_name, node.pos_start, node.pos_end)))
+        else:
+            const = (node.depth, node.slot, node.var_name, node.pos_start, node.pos_end)
+            self.emit(LOAD_OUTER, self.const(const))
+
+    def visit_VarAssignNode(self, node):
+        self.visit(node.value_node)
+        if node.slot is None:
+            self.emit(STORE, self.const(node.var_name))
+        else:
+            self.emit(STORE_LOCAL, node.slot)
+
+    def visit_IfNode(self, node):
+        end_jumps = []
+        for condition, case, should_return_null in node.cases:
+            self.visit(condition)
+            next_case = self.emit(JUMP_IF_FALSE)
+            self.visit(case)
+            if should_return_null:
+                self.emit(POP)
+                self.emit(PUSH_NONE)
+            end_jumps.append(self.emit(JUMP))
+            self.patch(next_case, self.here())
+
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            self.visit(expr)
+            if should_return_null:
+                self.emit(POP)
+                self.emit(PUSH_NONE)
+        else:
+            self.emit(PUSH_NONE)
+
+        for at in end_jumps:
+            self.patch(at, self.here())
+
+    def visit_ForNode(self, node):
+        self.visit(node.start_value_node)
+        self.visit(node.end_value_node)
+        has_step = node.step_value_node is not None
+        if has_step:
+            self.visit(node.step_value_node)
+        self.emit(FOR_SETUP, self.const((node.var_name, has_step, node)))
+
+        loop = self.emit(FOR_ITER)
+        self.visit(node.body_node)
+        self.emit(FOR_APPEND)
+        self.emit(JUMP, loop)
+        self.patch(loop, self.here())
+        self.emit(FOR_END, self.const(node.should_return_null))
+
+    def visit_InvariantNode(self, node):
+        skip = [node.slot, 0]
+        self.emit(INVARIANT, self.const(skip))
+        self.visit(node.node)
+        self.emit(SAVE_INVARIANT, self.const(node))
+        skip[1] = self.here()
+
+    def visit_InductionNode(self, node):
+        skip = [node, 0]
+        self.emit(INDUCTION, self.const(skip))
+        self.visit(node.node)
+        skip[1] = self.here()
+
+    def visit_NumericNode(self, node):
+        for leaf in node.leaves:
+            self.visit(leaf)
+        self.emit(NUMERIC, self.const((node, len(node.leaves))))
+
+    def visit_InlineCallNode(self, node):
+        guard = [node, 0]
+        self.emit(INLINE_CALL, self.const(guard))
+        for arg_node in node.call.arg_nodes:
+            self.visit(arg_node)
+        # the body is compiled on its own, like a PROC body
+        self.emit(ENTER_INLINE, self.const((node, len(node.call.arg_nodes))))
+        end = self.emit(JUMP)
+        guard[1] = self.here()
+        self.visit(node.call)
+        self.patch(end, self.here())
+
+    def visit_SpecialCallNode(self, node):
+        call = node.call
+        self.visit(call.node_to_call)
+        self.emit(SPECIALIZE, self.const(node))
+        for arg_node in call.arg_nodes:
+            self.visit(arg_node)
+        self.emit(CALL, self.const((len(call.arg_nodes), call)))
+
+    def visit_ProcNode(self, node):
+        self.emit(MAKE_PROC, self.const(node))
+
+    def visit_CallNode(self, node):
+        self.visit(node.node_to_call)
+        for arg_node in node.arg_nodes:
+            self.visit(arg_node)
+        self.emit(CALL, self.const((len(node.arg_nodes), node)))
+
+
+def describe(op, const):
+    if op == STORE:
+        return const
+    if op == MAKE_PROC:
+        return f"<PROC {const.var_name or '<anonymous>'}>"
+    if op == CALL or op == TAIL_CALL:
+        return f"{const[0]} args"
+    if op == BUILD_LIST:
+        return f"{const} elements"
+    if op == FOR_SETUP:
+        return f"{const[0]} (step: {const[1]})"
+    if op == INVARIANT:
+        return f"{const[0]}, to {const[1]}"
+    if op == SAVE_INVARIANT:
+        return const.slot
+    if op == INDUCTION:
+        return f"{const[0].var_name}, to {const[1]}"
+    if op == INLINE_CALL:
+        return f"{const[0].var_name}, else {const[1]}"
+    if op == ENTER_INLINE:
+        return f"{const[0].var_name}, {const[1]} args"
+    if op == SPECIALIZE:
+        return const.var_name
+    if op == NUMERIC:
+        return f"{const[1]} leaves"
+    if op == LOAD_LOCAL:
+        return f"{const[1]!r}, slot {const[0]}"
+    if op == LOAD_OUTER:
+        return f"{const[2]!r}, slot {const[1]} of {const[0]} out"
+    if op in (NUMBER, STRING):
+        return repr(const)
+    if op == BINARY:
+        return op_name(const.op)
+    if op in (LOAD, LOAD_GLOBAL):
+        return repr(const[0])
+    return ""
+
+
+def disassemble(code):
+    """Human readable listing of a Code object"""
+    lines = [f"Disassembly of {code.name}:"]
+    ops = code.code
+    for offset in range(0, len(ops), 2):
+        op, arg = ops[offset], ops[offset + 1]
+        line = f"{offset:>6} {OPNAMES[op]:<14}"
+        if op in JUMP_OPS or op in SLOT_OPS:
+            line += f" {arg:>4}"
+        elif op in CONST_OPS:
+            line += f" {arg:>4}"
+            description = describe(op, code.consts[arg])
+            if description:
+                line += f" ({description})"
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def disassemble_program(node):
+    """Listing of a program followed by the body of every PROC in it"""
+    listings = [disassemble(BytecodeCompiler("<program>").compile(node))]
+    # specialised PROCs are shared by the calls with the same literal args
+    specialized = set()
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is ProcNode and node.body_node is not None:
+            name = f"<PROC {node.var_name or '<anonymous>'}>"
+            listings.append(disassemble(BytecodeCompiler(name, True).compile(node.body_node)))
+        elif type(node) is InlineCallNode:
+            name = f"<inlined PROC {node.var_name}>"
+            listings.append(disassemble(BytecodeCompiler(name, True).compile(node.body_node)))
+        elif type(node) is SpecialCallNode:
+            if node.special in specialized:
+                nodes.append(node.call)
+                continue
+            specialized.add(node.special)
+            name = f"<specialized PROC {node.var_name}>"
+            listings.append(disassemble(BytecodeCompiler(name, True).compile(node.special.body_node)))
+            nodes.extend(reversed(children(node.special.body_node)))
+            nodes.append(node.call)
+            continue
+        nodes.extend(reversed(children(node)))
+    return "\n\n".join(listings)
@@ -0,0 +1,358 @@
+from array import array
+import gc
+import hashlib
+import importlib
+import marshal
+import os
+import sys
+import tempfile
+
+from core.nodes import (
+    NumberNode,
+    BinOpNode,
+    UnaryOpNode,
+    VarAssignNode,
+    VarAccessNode,
+    IfNode,
+    ForNode,
+    ProcNode,
+    CallNode,
+    StringNode,
+    ListNode,
+    InvariantNode,
+    InductionNode,
+    NumericNode,
+    InlineCallNode,
+    SpecialCallNode,
+)
+from core.position import Source
+from core.token import TokenStream
+
+CACHE_DIR_NAME = "__poopcache__"
+CACHE_FILE_EXT = ".poopc"
+MAGIC = "POOPC"
+# modules whose code decides the tree a source parses to, and how it is
+# encoded. A hash of them versions the entries, so changing any of them
+# never reads a stale tree.
+TREE_MODULES = ("core.constant", "core.token", "core.lexer", "core.parser", "core.nodes", "core.cache")
+
+TAG_NUMBER = 0
+TAG_STRING = 1
+TAG_BINOP = 2
+TAG_UNARYOP = 3
+TAG_VAR_ASSIGN = 4
+TAG_VAR_ACCESS = 5
+TAG_LIST = 6
+TAG_IF = 7
+TAG_FOR = 8
+TAG_PROC = 9
+TAG_CALL = 10
+
+NO_ELSE = 2
+
+
+def children(node):
+    """Child nodes in the order the decoder pops them back"""
+    node_type = type(node)
+    if node_type is BinOpNode:
+        return (node.left_node, node.right_node)
+    if node_type is UnaryOpNode:
+        return (node.node,)
+    if node_type is VarAssignNode:
+        return (node.value_node,)
+    if node_type is ListNode:
+        return node.element_nodes
+    if node_type is IfNode:
+        nodes = []
+        for condition, case, _ in node.cases:
+            nodes.append(condition)
+            nodes.append(case)
+        if node.else_case:
+            nodes.append(node.else_case[0])
+        return nodes
+    if node_type is ForNode:
+        nodes = [node.start_value_node, node.end_value_node]
+        if node.step_value_node:
+            nodes.append(node.step_value_node)
+        nodes.append(node.body_node)
+        return nodes
+    if node_type is ProcNode:
+        # a deferred body is stored as its tokens
+        return () if node.body_node is None else (node.body_node,)
+    if node_type is CallNode:
+        return [node.node_to_call] + node.arg_nodes
+    # only optimized trees have the nodes below, those are never cached
+    if node_type in (InvariantNode, InductionNode, NumericNode):
+        return (node.node,)
+    if node_type is InlineCallNode:
+        return (node.call, node.body_node)
+    if node_type is SpecialCallNode:
+        return (node.call, node.special)
+    return ()
+
+
+def encode_fields(code, values, node):
+    node_type = type(node)
+    if node_type is NumberNode:
+        code.extend((TAG_NUMBER, node.start, node.end))
+        values.append(node.value)
+    elif node_type is StringNode:
+        code.extend((TAG_STRING, node.start, node.end))
+        values.append(node.value)
+    elif node_type is BinOpNode:
+        code.extend((TAG_BINOP, node.op))
+    elif node_type is UnaryOpNode:
+        code.extend((TAG_UNARYOP, node.start))
+        # a token kind or a keyword, so it goes with the values
+        values.append(node.op)
+    elif node_type is VarAssignNode:
+        code.extend((TAG_VAR_ASSIGN, node.start))
+        values.append(node.var_name)
+    elif node_type is VarAccessNode:
+        code.extend((TAG_VAR_ACCESS, node.start, node.end))
+        values.append(node.var_name)
+    elif node_type is ListNode:
+        code.extend((TAG_LIST, len(node.element_nodes), node.start, node.end))
+    elif node_type is IfNode:
+        code.extend((TAG_IF, len(node.cases)))
+        code.extend(should_return_null for _, _, should_return_null in node.cases)
+        code.append(NO_ELSE if node.else_case is None else node.else_case[1])
+    elif node_type is ForNode:
+        code.extend((TAG_FOR, node.step_value_node is not None, node.should_return_null, node.start))
+        values.append(node.var_name)
+    elif node_type is ProcNode:
+        body_tokens = node.body_tokens
+        deferred = 0 if body_tokens is None else len(body_tokens)
+        code.extend((TAG_PROC, len(node.arg_names), node.should_return_null, node.start, deferred))
+        values.append(node.var_name)
+        values.extend(node.arg_names)
+        if deferred:
+            code.fromlist(body_tokens.kinds.tolist())
+            code.extend(body_tokens.starts)
+            code.extend(body_tokens.ends)
+            values.extend(body_tokens.values)
+    elif node_type is CallNode:
+        code.extend((TAG_CALL, len(node.arg_nodes)))
+    else:
+        raise TypeError(f"can not cache {node_type.__name__}")
+
+
+def encode(node):
+    """
+    Flattens a tree into a post-order int array of tags, operators,
+    offsets and counts plus a side list of values and names. Deep trees never
+    recurse in the encoder or in marshal.
+    """
+    code = array("I")
+    values = []
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            encode_fields(code, values, node)
+            continue
+        stack.append((node, True))
+        for child in reversed(children(node)):
+            stack.append((child, False))
+    return code.tobytes(), values
+
+
+def decode(data, source):
+    code = array("I")
+    code.frombytes(data[0])
+    values = iter(data[1])
+    stack = []
+    idx = 0
+    end = len(code)
+
+    def pop(count):
+        if not count:
+            return []
+        nodes = stack[-count:]
+        del stack[-count:]
+        return nodes
+
+    while idx < end:
+        tag = code[idx]
+        idx += 1
+
+        if tag == TAG_NUMBER:
+            stack.append(NumberNode(next(values), source, code[idx], code[idx + 1]))
+            idx += 2
+        elif tag == TAG_STRING:
+            stack.append(StringNode(next(values), source, code[idx], code[idx + 1]))
+            idx += 2
+        elif tag == TAG_VAR_ACCESS:
+            stack.append(VarAccessNode(next(values), source, code[idx], code[idx + 1]))
+            idx += 2
+        elif tag == TAG_BINOP:
+            left, right = pop(2)
+            stack.append(BinOpNode(left, code[idx], right))
+            idx += 1
+        elif tag == TAG_UNARYOP:
+            stack.append(UnaryOpNode(next(values), stack.pop(), source, code[idx]))
+            idx += 1
+        elif tag == TAG_VAR_ASSIGN:
+            stack.append(VarAssignNode(next(values), stack.pop(), source, code[idx]))
+            idx += 1
+        elif tag == TAG_LIST:
+            count, start, stop = code[idx : idx + 3]
+            idx += 3
+            stack.append(ListNode(pop(count), source, start, stop))
+        elif tag == TAG_IF:
+            count = code[idx]
+            flags = [bool(flag) for flag in code[idx + 1 : idx + 1 + count]]
+            else_flag = code[idx + 1 + count]
+            idx += count + 2
+            else_case = None
+            if else_flag != NO_ELSE:
+                else_case = (stack.pop(), bool(else_flag))
+            nodes = pop(2 * count)
+            cases = [
+                (nodes[2 * i], nodes[2 * i + 1], flags[i]) for i in range(count)
+            ]
+            stack.append(IfNode(cases, else_case))
+        elif tag == TAG_FOR:
+            has_step, should_return_null, start = code[idx : idx + 3]
+            idx += 3
+            body = stack.pop()
+            step = stack.pop() if has_step else None
+            start_value, end_value = pop(2)
+            stack.append(
+                ForNode(
+                    next(values), start_value, end_value, step, body,
+                    bool(should_return_null), source, start,
+                )
+            )
+        elif tag == TAG_PROC:
+            count, should_return_null, start, deferred = code[idx : idx + 4]
+            idx += 4
+            var_name = next(values)
+            arg_names = [next(values) for _ in range(count)]
+            if deferred:
+                body_tokens = TokenStream(source)
+                body_tokens.kinds = array("B", code[idx : idx + deferred])
+                idx += deferred
+                body_tokens.starts = code[idx : idx + deferred]
+                idx += deferred
+                body_tokens.ends = code[idx : idx + deferred]
+                idx += deferred
+                body_tokens.values = [next(values) for _ in range(deferred)]
+                node = ProcNode(
+                    var_name, arg_names, None, bool(should_return_null), source, start, body_tokens
+                )
+            else:
+                node = ProcNode(var_name, arg_names, stack.pop(), bool(should_return_null), source, start)
+            stack.append(node)
+        elif tag == TAG_CALL:
+            count = code[idx]
+            idx += 1
+            arg_nodes = pop(count)
+            stack.append(CallNode(stack.pop(), arg_nodes))
+        else:
+            raise ValueError(f"unknown node tag {tag}")
+
+    if len(stack) != 1:
+        raise ValueError("malformed AST cache")
+    return stack[0]
+
+
+def copy_tree(node):
+    """Deep copy of a parsed tree, made through the cache encoding"""
+    return decode(encode(node), node.source)
+
+
+class AstCache:
+    """
+    pyc style cache of parsed programs. Each source has one entry, named
+    after it, and the entry records the sha256 of the source, a hash of the
+    code building the tree and the python version, so a changed source or
+    interpreter never reads a stale tree. A changed source overwrites the
+    entry of its old content. Writes go to a temporary file renamed into
+    place, so concurrent workers sharing a cache directory only ever see
+    complete entries.
+    """
+
+    def __init__(self):
+        self.enabled = not os.getenv("POOPY_NO_CACHE")
+        # a shared directory for every source, default is next to the source
+        self.cache_dir = os.getenv("POOPY_CACHE_DIR")
+        self._tree_version = None
+
+    def tree_version(self):
+        if self._tree_version is None:
+            version = hashlib.sha256()
+            for name in TREE_MODULES:
+                with open(importlib.import_module(name).__file__, "rb") as f:
+                    version.update(f.read())
+            self._tree_version = version.hexdigest()
+        return self._tree_version
+
+    def digest(self, text):
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def path_for(self, fname):
+        head, tail = os.path.split(os.path.abspath(fname))
+        if self.cache_dir:
+            # the shared directory mirrors the tree of the sources, like
+            # PYTHONPYCACHEPREFIX does for .pyc files
+            cache_dir = os.path.join(self.cache_dir, os.path.splitdrive(head)[1].lstrip(os.sep))
+        else:
+            cache_dir = os.path.join(head, CACHE_DIR_NAME)
+        return os.path.join(cache_dir, f"{tail}.{sys.implementation.cache_tag}{CACHE_FILE_EXT}")
+
+    def header(self, digest):
+        return (MAGIC, self.tree_version(), sys.implementation.cache_tag, digest)
+
+    def cacheable(self, fname):
+        return self.enabled and fname is not None and os.path.isfile(fname)
+
+    def load(self, fname, text):
+        """Returns the cached tree of text, None on a miss or a bad entry"""
+        if not self.cacheable(fname):
+            return None
+
+        digest = self.digest(text)
+        try:
+            with open(self.path_for(fname), "rb") as f:
+                entry = marshal.loads(f.read())
+            header, code = entry
+            if tuple(header) != self.header(digest):
+                return None
+        except Exception:
+            return None
+
+        # same as the parser, the rebuilt tree has no cycles to collect
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return decode(code, Source(fname, text))
+        except Exception:
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def store(self, fname, text, node):
+        if not self.cacheable(fname):
+            return
+
+        digest = self.digest(text)
+        path = self.path_for(fname)
+        tmp_path = None
+        try:
+            data = marshal.dumps((self.header(digest), encode(node)))
+            cache_dir = os.path.dirname(path)
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".tmp-", suffix=CACHE_FILE_EXT)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            # a cache that can not be written is just a cache miss next time
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+ast_cache = AstCache()
@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+import core.constant as cc
+from core.lexer import Lexer
+from core.parser import Parser
+
+POOPY_FILE_EXTS = (cc.POOPY_FILE_EXT, cc.POOPY_FILE_EXT_EMOJI)
+
+
+class CheckResult:
+    """
+    Outcome of checking one file. Only plain values are kept, so results
+    cross the process boundary without dragging the source along.
+    """
+
+    __slots__ = ("fname", "elapsed", "err_name", "details", "line", "col")
+
+    def __init__(self, fname, elapsed, err_name=None, details=None, line=None, col=None):
+        self.fname = fname
+        self.elapsed = elapsed
+        self.err_name = err_name
+        self.details = details
+        self.line = line
+        self.col = col
+
+    @property
+    def ok(self):
+        return self.err_name is None
+
+    def as_string(self):
+        timing = f"({self.elapsed * 1000:.1f} ms)"
+        if self.ok:
+            return f"ok   {self.fname} {timing}"
+        if self.line is None:
+            return f"FAIL {self.fname} : {self.err_name} : {self.details} {timing}"
+        return f"FAIL {self.fname}:{self.line}:{self.col} : {self.err_name} : {self.details} {timing}"
+
+
+def collect_files(paths):
+    """Files are taken as given, directories are walked for poopy sources"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != "__poopcache__")
+            for name in sorted(names):
+                if name.endswith(POOPY_FILE_EXTS):
+                    files.append(os.path.join(root, name))
+    return files
+
+
+def check_file(fname):
+    """Lexes and parses a single file, nothing is executed"""
+    start = time.perf_counter()
+    try:
+        with open(fname, "r") as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return CheckResult(fname, time.perf_counter() - start, "Unreadable File", str(e))
+
+    try:
+        tokens, error = Lexer(fname, text).make_tokens()
+        if not error:
+            # a checker has to see every PROC body, not only the called ones
+            error = Parser(tokens, strict=True).parse().error
+    except RecursionError:
+        # the parser recurses once per nesting level
+        return CheckResult(fname, time.perf_counter() - start, "Too Deeply Nested", "maximum recursion depth exceeded")
+    elapsed = time.perf_counter() - start
+
+    if not error:
+        return CheckResult(fname, elapsed)
+    return CheckResult(
+        fname,
+        elapsed,
+        error.err_name,
+        error.details,
+        error.pos_start.ln + 1,
+        error.pos_start.col + 1,
+    )
+
+
+def guarded_check_file(fname):
+    """check_file that reports a crash of the checker as a failed file"""
+    start = time.perf_counter()
+    try:
+        return check_file(fname)
+    except Exception as e:
+        return CheckResult(fname, time.perf_counter() - start, "Checker Crashed", f"{type(e).__name__}: {e}")
+
+
+def check_files(paths, jobs=None):
+    """
+    Yields a CheckResult per file in the order the files were collected.
+    Files are spread over a pool of jobs processes, one per core by default.
+    """
+    files = collect_files(paths)
+    if not files:
+        return
+
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    if jobs == 1:
+        yield from map(guarded_check_file, files)
+        return
+
+    # batches keep the pickling overhead low when there are thousands of
+    # small files, while still leaving a few batches per worker to balance
+    chunksize = max(1, len(files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(guarded_check_file, files, chunksize=chunksize)
@@ -0,0 +1,337 @@
+from core.types.number import number
+from core.types.list import List
+import core.constant as cc
+from core.error import RTError
+from core.runtime import RTException, OperationError, operation_error
+from core.transpiler import GUARD_FAILED, DivisionByZero, numeric_code, division_error
+from core.hoisting import reset_invariants, cached_invariant, save_invariant, induction_value
+
+class ClosureCompiler:
+    """
+    Execution engine that compiles every node once into a Python closure.
+    Node dispatch, operators, child closures and positions are all resolved
+    while compiling, so running a node is a single call. Closures take the
+    context and return the value the tree walking Interpreter produces for
+    the node, and raise the RTException it would.
+    """
+
+    def __init__(self):
+        # code of the PROC bodies by body node, compiled on their first call.
+        # Nothing else is kept, a streamed statement is freed once it ran.
+        self.compiled = {}
+
+    def visit(self, node, context):
+        """Same contract as Interpreter.visit"""
+        return self.compile(node)(context)
+
+    def execute_body(self, node, context):
+        """Same contract as Interpreter.execute_body"""
+        code = self.compiled.get(node)
+        if code is None:
+            code = self.compiled[node] = self.compile(node)
+        return code(context)
+
+    def compile(self, node):
+        return getattr(self, f"compile_{type(node).__name__}")(node)
+
+    def compile_NumberNode(self, node):
+        value = node.constant
+
+        def number_(context):
+            return value
+
+        return number_
+
+    def compile_StringNode(self, node):
+        value = node.constant
+
+        def string(context):
+            return value
+
+        return string
+
+    def compile_ListNode(self, node):
+        element_codes = [self.compile(ele) for ele in node.element_nodes]
+
+        def list_(context):
+            # every element is evaluated, the last error wins
+            elements = []
+            list_error = None
+            for code in element_codes:
+                try:
+                    elements.append(code(context))
+                except RTException as e:
+                    list_error = e
+            if list_error:
+                raise list_error
+            return List(elements)
+
+        return list_
+
+    def compile_BinOpNode(self, node):
+        left_code = self.compile(node.left_node)
+        right_code = self.compile(node.right_node)
+        operation = node.operation
+
+        def bin_op(context):
+            left = left_code(context)
+            right = right_code(context)
+            try:
+                return operation[left.__class__, right.__class__](left, right)
+            except OperationError as e:
+                raise RTException(operation_error(e, node, context))
+
+        return bin_op
+
+    def compile_UnaryOpNode(self, node):
+        operand_code = self.compile(node.node)
+        if node.op == cc.TT_PLUS:
+            # +x is x
+            return operand_code
+        operation = node.operation
+
+        def unary_op(context):
+            operand = operand_code(context)
+            try:
+                return operation[operand.__class__](operand)
+            except OperationError as e:
+                raise RTException(operation_error(e, node, context))
+
+        return unary_op
+
+    def compile_VarAccessNode(self, node):
+        var_name = node.var_name
+        depth, slot = node.depth, node.slot
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        if depth is None and node.cache is not None:
+            cache = node.cache
+
+            def var_access(context):
+                symbol_table = context.symbol_table
+                if cache.version == symbol_table.root.version:
+                    cache.hits += 1
+                    value = cache.value
+                else:
+                    value = cache.lookup(symbol_table, var_name)
+                if not value:
+                    raise RTException(RTError(pos_start, pos_end, f"{var_name} is not defined", context))
+                return value
+
+        elif depth is None:
+            def var_access(context):
+                value = context.symbol_table.get(var_name)
+                if not value:
+                    raise RTException(RTError(pos_start, pos_end, f"{var_name} is not defined", context))
+                return value
+
+        elif depth == 0:
+            def var_access(context):
+                value = context.symbol_table.slots[slot]
+                if value is None:
+                    value = context.symbol_table.get(var_name)
+                    if not value:
+                        raise RTException(RTError(pos_start, pos_end, f"{var_name} is not defined", context))
+                return value
+
+        else:
+            def var_access(context):
+                value = context.symbol_table.load(depth, slot, var_name)
+                if not value:
+                    raise RTException(RTError(pos_start, pos_end, f"{var_name} is not defined", context))
+                return value
+
+        return var_access
+
+    def compile_VarAssignNode(self, node):
+        var_name = node.var_name
+        slot = node.slot
+        value_code = self.compile(node.value_node)
+
+        if slot is None:
+            def var_assign(context):
+                value = value_code(context)
+                context.symbol_table.set_val(var_name, value)
+                return value
+
+        else:
+            def var_assign(context):
+                value = value_code(context)
+                context.symbol_table.slots[slot] = value
+                return value
+
+        return var_assign
+
+    def compile_IfNode(self, node):
+        cases = [
+            (self.compile(condition), self.compile(case), should_return_null)
+            for condition, case, should_return_null in node.cases
+        ]
+        else_case = None
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            else_case = (self.compile(expr), should_return_null)
+
+        def if_(context):
+            for condition_code, case_code, should_return_null in cases:
+                if condition_code(context).is_true():
+                    case_value = case_code(context)
+                    return None if should_return_null else case_value
+
+            if else_case:
+                else_code, should_return_null = else_case
+                else_value = else_code(context)
+                return None if should_return_null else else_value
+
+            return None
+
+        return if_
+
+    def compile_ForNode(self, node):
+        var_name = node.var_name
+        start_code = self.compile(node.start_value_node)
+        end_code = self.compile(node.end_value_node)
+        step_code = self.compile(node.step_value_node) if node.step_value_node else None
+        body_code = self.compile(node.body_node)
+        should_return_null = node.should_return_null
+
+        def for_(context):
+            elements = []
+
+            start_value = start_code(context)
+            end_value = end_code(context)
+            step_value = step_code(context) if step_code else number(1)
+
+            stepper = start_value.value
+            # the direction is picked from the sign of the start value
+            ascending = stepper >= 0
+            end = end_value.value
+            symbol_table = context.symbol_table
+            reset_invariants(node, symbol_table)
+
+            while (stepper <= end) if ascending else (stepper >= end):
+                symbol_table.set_val(var_name, number(stepper))
+                stepper = stepper + step_value.value
+                elements.append(body_code(context))
+
+            if should_return_null:
+                return None
+            return List(elements)
+
+        return for_
+
+    def compile_InvariantNode(self, node):
+        code = self.compile(node.node)
+
+        def invariant(context):
+            value = cached_invariant(node, context.symbol_table)
+            if value is not None:
+                return value
+            value = code(context)
+            save_invariant(node, value, context.symbol_table)
+            return value
+
+        return invariant
+
+    def compile_InductionNode(self, node):
+        code = self.compile(node.node)
+
+        def induction(context):
+            value = induction_value(node, context.symbol_table)
+            if value is None:
+                return code(context)
+            return number(value)
+
+        return induction
+
+    def compile_NumericNode(self, node):
+        code = numeric_code(node)
+        leaf_codes = [self.compile(leaf) for leaf in node.leaves]
+
+        if len(leaf_codes) == 1:
+            leaf_code, = leaf_codes
+
+            def numeric(context):
+                try:
+                    return code(leaf_code(context))
+                except DivisionByZero as e:
+                    raise RTException(division_error(e, context))
+
+        elif len(leaf_codes) == 2:
+            left_code, right_code = leaf_codes
+
+            def numeric(context):
+                try:
+                    return code(left_code(context), right_code(context))
+                except DivisionByZero as e:
+                    raise RTException(division_error(e, context))
+
+        else:
+            def numeric(context):
+                try:
+                    return code(*[leaf_code(context) for leaf_code in leaf_codes])
+                except DivisionByZero as e:
+                    raise RTException(division_error(e, context))
+
+        return numeric
+
+    def compile_SpecialCallNode(self, node):
+        return self.compile_CallNode(node.call, node)
+
+    def compile_InlineCallNode(self, node):
+        from core.types.procedure import inlined_callee, inline_frame, release, execute_inline_fast
+
+        call_code = self.compile(node.call)
+        arg_codes = [self.compile(arg_node) for arg_node in node.call.arg_nodes]
+        body_code = self.compile(node.body_node)
+        should_return_null = node.should_return_null
+
+        def inline_call(context):
+            if not inlined_callee(node, context):
+                return call_code(context)
+
+            args = [arg_code(context) for arg_code in arg_codes]
+
+            value = execute_inline_fast(node, context, args)
+            if value is GUARD_FAILED:
+                new_context = inline_frame(node, context, args)
+                value = body_code(new_context)
+                release(new_context)
+                if should_return_null:
+                    value = None
+            return value
+
+        return inline_call
+
+    def compile_ProcNode(self, node):
+        from core.types.procedure import Procedure
+
+        proc_name = node.var_name
+
+        def proc(context):
+            proc_value = Procedure(proc_name, node, self, context.symbol_table)
+            if proc_name:
+                context.symbol_table.set_val(proc_name, proc_value)
+            return proc_value
+
+        return proc
+
+    def compile_CallNode(self, node, special=None):
+        from core.types.procedure import specialized_callee
+
+        call_code = self.compile(node.node_to_call)
+        arg_codes = [self.compile(arg_node) for arg_node in node.arg_nodes]
+
+        if special is None:
+            def call(context):
+                value_to_call = call_code(context)
+                args = [arg_code(context) for arg_code in arg_codes]
+                return value_to_call.execute(args, context, node)
+
+        else:
+            def call(context):
+                value_to_call = specialized_callee(special, call_code(context))
+                args = [arg_code(context) for arg_code in arg_codes]
+                return value_to_call.execute(args, context, node)
+
+        return call
@@ -12,31 +12,60 @@ DIGITS = string.digits
 LETTERS = string.ascii_letters
 LETTERS_DIGITS = DIGITS + LETTERS
 
-TT_IDENTIFIER = "IDENTIFIER"
-TT_KEYWORD = "KEYWORD"
-TT_INT = "INT"
-TT_FLOAT = "FLOAT"
-TT_STRING = "STRING"
-TT_PLUS = "PLUS"
-TT_MINUS = "MINUS"
-TT_MUL = "MUL"
-TT_DIV = "DIV"
-TT_LPAREN = "LPAREN"
-TT_RPAREN = "RPAREN"
-TT_LCURLY = "LCURLY"
-TT_RCURLY = "RCURLY"
-TT_POW = "POWER"
-TT_EQ = "EQ"
-TT_EE = "EE"  # double equal - comparison
-TT_NE = "NE"
-TT_LT = "LT"
-TT_LTE = "LTE"
-TT_GT = "GT"
-TT_GTE = "GTE"
-TT_COMMA = "COMMA"
-TT_COLON = "COLON"
-TT_NEWLINE = "NEWLINE"
-TT_EOF = "EOF"
+TT_IDENTIFIER = 0
+TT_KEYWORD = 1
+TT_INT = 2
+TT_FLOAT = 3
+TT_STRING = 4
+TT_PLUS = 5
+TT_MINUS = 6
+TT_MUL = 7
+TT_DIV = 8
+TT_LPAREN = 9
+TT_RPAREN = 10
+TT_LCURLY = 11
+TT_RCURLY = 12
+TT_POW = 13
+TT_EQ = 14
+TT_EE = 15  # double equal - comparison
+TT_NE = 16
+TT_LT = 17
+TT_LTE = 18
+TT_GT = 19
+TT_GTE = 20
+TT_COMMA = 21
+TT_COLON = 22
+TT_NEWLINE = 23
+TT_EOF = 24
+
+# token kinds are small ints so a token stream can keep them in a byte array
+TT_NAMES = (
+    "IDENTIFIER",
+    "KEYWORD",
+    "INT",
+    "FLOAT",
+    "STRING",
+    "PLUS",
+    "MINUS",
+    "MUL",
+    "DIV",
+    "LPAREN",
+    "RPAREN",
+    "LCURLY",
+    "RCURLY",
+    "POWER",
+    "EQ",
+    "EE",
+    "NE",
+    "LT",
+    "LTE",
+    "GT",
+    "GTE",
+    "COMMA",
+    "COLON",
+    "NEWLINE",
+    "EOF",
+)
 
 KEYWORDS = [
     "BUCKET",
@@ -1,6 +1,39 @@
+from core.position import Position
+
+
 class Context:
+    """
+    The program, a PROC call or a built-in call running. entry is where the
+    call was made, a Position or the node of the call whose Position is only
+    made once a traceback asks for it. A PROC call context comes from the
+    pool of its body and goes back to it once the call returned.
+    """
+
+    __slots__ = ("display_name", "parent_context", "entry", "symbol_table", "pool")
+
     def __init__(self, display_name, parent_context=None, parent_entry_pos=None):
         self.display_name = display_name
         self.parent_context = parent_context
-        self.parent_entry_pos = parent_entry_pos
+        self.entry = parent_entry_pos
         self.symbol_table = None
+        self.pool = None
+
+    @property
+    def parent_entry_pos(self):
+        return entry_pos(self.entry)
+
+
+def entry_pos(entry):
+    """The Position of the entry of a context"""
+    if entry is None or type(entry) is Position:
+        return entry
+    return entry.pos_start
+
+
+def call_chain(context):
+    """(display name, entry) of context and of every context it was called from"""
+    chain = []
+    while context:
+        chain.append((context.display_name, context.entry))
+        context = context.parent_context
+    return chain
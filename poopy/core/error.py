@@ -1,3 +1,6 @@
+from core.context import call_chain, entry_pos
+
+
 class Error:
     """
     This is the base class for defining Exceptions and Errors
@@ -42,7 +45,7 @@ class NotDefined(Error):
         super().__init__(pos_start, pos_end, "Not Defined", 2, details)
 
 
-class ExpectedCharError:
+class ExpectedCharError(Error):
     def __init__(self, pos_start, pos_end, details):
         super().__init__(pos_start, pos_end, "Unexpected Character", 3, details)
 
@@ -62,9 +65,15 @@ class ValError(Error):
         super().__init__(pos_start, pos_end, "Value Error", 3, details)
 
 class RTError(Error):
+    """
+    Keeps the chain of calls it happened in when it is made, the contexts of
+    PROC calls are reused once the calls return
+    """
+
     def __init__(self, pos_start, pos_end, details, context):
         super().__init__(pos_start, pos_end, "RunTime Error", 3, details)
         self.context = context
+        self.chain = call_chain(context)
 
     def as_string(self):
         tracer = self.generate_traceback()
@@ -74,14 +83,12 @@ class RTError(Error):
     def generate_traceback(self):
         tracer = ""
         pos = self.pos_start
-        ctx = self.context
 
-        while ctx:
+        for display_name, entry in self.chain:
             tracer = (
-                f" File {pos.fname}, line {str(pos.ln + 1)}, in {ctx.display_name}\n"
+                f" File {pos.fname}, line {str(pos.ln + 1)}, in {display_name}\n"
                 + tracer
             )
-            pos = ctx.parent_entry_pos
-            ctx = ctx.parent_context
+            pos = entry_pos(entry)
 
         return "Traceback (most recent call last):\n" + tracer
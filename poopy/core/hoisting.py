@@ -0,0 +1,185 @@
+import math
+
+import core.constant as cc
+from core.types.number import Number
+from core.nodes import (
+    NumberNode,
+    BinOpNode,
+    UnaryOpNode,
+    VarAccessNode,
+    InvariantNode,
+    NumericNode,
+)
+
+# Run time side of the loop optimizations. A hoisted invariant keeps its
+# value in the symbol table of the running loop under its slot, a name no
+# identifier can have. The loop clears its slots every time it starts.
+
+# exponents a cached value is checked up to, bigger powers are not cached
+MAX_CHECKED_EXPONENT = 64
+
+
+def plain_number(value):
+    """A value a NumberNode can hold that noice stays quiet on"""
+    value_type = type(value)
+    if value_type is float:
+        if not math.isfinite(value):
+            return False
+    elif value_type is not int:
+        return False
+    return not 69420 <= value < 69421
+
+
+def reset_invariants(node, symbol_table):
+    """Forgets the invariants a previous run of the loop cached"""
+    symbols = symbol_table.symbols
+    for slot in node.hoisted:
+        symbols.pop(slot, None)
+
+
+def cached_invariant(node, symbol_table):
+    """The cached value of an invariant, None when not cached"""
+    return symbol_table.symbols.get(node.slot)
+
+
+def save_invariant(node, value, symbol_table):
+    """
+    Caches the value an invariant just evaluated to. Only a number whose
+    evaluation printed no noice along the way is kept, anything else is
+    evaluated again on every iteration.
+    """
+    if type(value) is Number and checked_value(node.node, symbol_table) is not None:
+        symbol_table.symbols[node.slot] = value
+
+
+def checked_value(node, symbol_table):
+    """
+    Plain value of an invariant expression, None if any step of it is not
+    a plain number, would fail or would print a noice
+    """
+    node_type = type(node)
+
+    if node_type is NumberNode:
+        return node.value if plain_number(node.value) else None
+
+    if node_type is VarAccessNode:
+        value = symbol_table.get(node.var_name)
+        if type(value) is not Number or type(value.value) not in (int, float):
+            return None
+        return value.value
+
+    if node_type is InvariantNode:
+        value = symbol_table.symbols.get(node.slot)
+        if value is not None:
+            return value.value
+        return checked_value(node.node, symbol_table)
+
+    if node_type is NumericNode:
+        return checked_value(node.node, symbol_table)
+
+    if node_type is UnaryOpNode:
+        operand = checked_value(node.node, symbol_table)
+        if operand is None:
+            return None
+        if node.op == cc.TT_MINUS:
+            value = operand * -1
+        elif node.op == "NOT":
+            return 1 if operand == 0 else 0
+        else:
+            return operand
+        return value if plain_number(value) else None
+
+    if node_type is BinOpNode:
+        left = checked_value(node.left_node, symbol_table)
+        if left is None:
+            return None
+        right = checked_value(node.right_node, symbol_table)
+        if right is None:
+            return None
+        return checked_binary(node.op, left, right)
+
+    return None
+
+
+def checked_binary(op, left, right):
+    try:
+        if op == cc.TT_PLUS:
+            value = left + right
+        elif op == cc.TT_MINUS:
+            value = left - right
+        elif op == cc.TT_MUL:
+            value = left * right
+        elif op == cc.TT_DIV:
+            if right == 0:
+                return None
+            value = left / right
+        elif op == cc.TT_POW:
+            if abs(right) > MAX_CHECKED_EXPONENT:
+                return None
+            value = left**right
+        elif op == cc.TT_EE:
+            return int(left == right)
+        elif op == cc.TT_NE:
+            return int(left != right)
+        elif op == cc.TT_LT:
+            return int(left < right)
+        elif op == cc.TT_GT:
+            return int(left > right)
+        elif op == cc.TT_LTE:
+            return int(left <= right)
+        elif op == cc.TT_GTE:
+            return int(left >= right)
+        elif op == "AND":
+            return int(left and right)
+        elif op == "OR":
+            return int(left or right)
+        elif type(left) is int and type(right) is int:
+            return int(left ^ right)
+        else:
+            # XOR of a float crashes
+            return None
+    except (ArithmeticError, ValueError):
+        return None
+    return value if plain_number(value) else None
+
+
+def induction_value(node, symbol_table):
+    """
+    Value of an induction expression computed straight from the int value
+    of the loop variable, None when the operands are not plain ints or the
+    result is a noice and the expression has to be evaluated as written
+    """
+    counter = symbol_table.get(node.var_name)
+    if type(counter) is not Number or type(counter.value) is not int:
+        return None
+    counter = counter.value
+
+    binop = node.node
+    other = binop.right_node if node.var_left else binop.left_node
+    other_type = type(other)
+    if other_type is NumberNode:
+        factor = other.value
+    elif other_type is InvariantNode:
+        value = symbol_table.symbols.get(other.slot)
+        if value is None:
+            return None
+        factor = value.value
+    else:
+        value = symbol_table.get(other.var_name)
+        if type(value) is not Number:
+            return None
+        factor = value.value
+    if type(factor) is not int:
+        return None
+
+    op = binop.op
+    if op == cc.TT_MUL:
+        value = counter * factor
+    elif op == cc.TT_POW:
+        # i ^ 2
+        value = counter * counter
+    elif op == cc.TT_PLUS:
+        value = counter + factor
+    else:
+        value = counter - factor if node.var_left else factor - counter
+    return None if value == 69420 else value
@@ -0,0 +1,385 @@
+import core.constant as cc
+from core.nodes import (
+    NumberNode,
+    StringNode,
+    BinOpNode,
+    UnaryOpNode,
+    VarAssignNode,
+    VarAccessNode,
+    ListNode,
+    IfNode,
+    ForNode,
+    ProcNode,
+    CallNode,
+    InvariantNode,
+    InductionNode,
+    NumericNode,
+    InlineCallNode,
+    SpecialCallNode,
+)
+from core.cache import children
+
+# Static types of a scope, the top level, a PROC body or an inlined body.
+# A name the scope binds is numeric when every assignment to it in the
+# scope is a number, the variable of a LOOP always is, and a read of it is
+# typed when the name is assigned on every path that gets to the read, so
+# its value is a Number. The args of a PROC are typed only in the copies
+# the optimizer makes for calls passing numbers, and in inlined bodies.
+# A list keeps going after an element fails, the names an element that can
+# fail assigns count for the elements after it only once the list is done.
+# At the top level a call may be POOP_RUN, which can assign any global, so
+# nothing is typed there when a program can reach it.
+#
+# The expressions made of typed reads, number literals and operators are
+# evaluated on plain values as a NumericNode, they make a single Number.
+
+# nodes a NumericNode is made for, a lone literal or read is left alone
+OPERATORS = (BinOpNode, UnaryOpNode, IfNode)
+
+# values that are never a number
+NOT_NUMERIC = (StringNode, ListNode, ForNode, ProcNode, CallNode, InlineCallNode, SpecialCallNode)
+
+
+def typed_args(arg_names, numeric_args):
+    """The arg names bound to a number, a repeated name binds the last arg"""
+    names = dict(zip(arg_names, numeric_args))
+    return frozenset(name for name, numeric in names.items() if numeric)
+
+
+def infer(node, runs_files=True, specialize=None):
+    """
+    Types the top level of a program. specialize(node, numeric_args) is
+    given every call with the args that are numbers and returns the node
+    the call is replaced with.
+    """
+    names = () if runs_files else numeric_names(node)
+    return Inference(names, (), specialize).infer(node)
+
+
+def infer_body(node, arg_names, numeric_args=frozenset()):
+    """Types a PROC or inlined body whose args in numeric_args are numbers"""
+    names = (numeric_names(node) | numeric_args) - (set(arg_names) - numeric_args)
+    if not names:
+        return node
+    return Inference(names, numeric_args).infer(node)
+
+
+def numeric_names(node):
+    """The names a scope assigns, less those it assigns what is never a number"""
+    names = set()
+    mixed = set()
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type is VarAssignNode:
+            names.add(node.var_name)
+            if type(node.value_node) in NOT_NUMERIC:
+                mixed.add(node.var_name)
+        elif node_type is ForNode:
+            names.add(node.var_name)
+        elif node_type is ProcNode:
+            if node.var_name:
+                mixed.add(node.var_name)
+            continue
+        elif node_type is InlineCallNode:
+            nodes.append(node.call)
+            continue
+        nodes.extend(children(node))
+    return names - mixed
+
+
+def plain(node):
+    """
+    An expression of a NumericNode without the loop rewrites in it, a hoisted
+    invariant or an induction expression is as cheap as the operator itself
+    on plain values and its value is the same
+    """
+    node_type = type(node)
+    if node_type in (InvariantNode, InductionNode):
+        return plain(node.node)
+    if node_type is BinOpNode:
+        node.left_node = plain(node.left_node)
+        node.right_node = plain(node.right_node)
+    elif node_type is UnaryOpNode:
+        node.node = plain(node.node)
+    elif node_type is IfNode:
+        node.cases = [(plain(condition), plain(case), False) for condition, case, _ in node.cases]
+        node.else_case = (plain(node.else_case[0]), False)
+    return node
+
+
+def leaves(node):
+    """A read of every variable an expression reads, by name"""
+    reads = {}
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is VarAccessNode:
+            reads.setdefault(node.var_name, node)
+        else:
+            nodes.extend(children(node))
+    return tuple(reads.values())
+
+
+class Inference:
+    """
+    Types the expressions of a scope and wraps the biggest ones working on
+    numbers only in a NumericNode. names are the names of the scope that
+    may be numeric, those in entry hold a number when the scope starts.
+    """
+
+    def __init__(self, names, entry, specialize=None):
+        self.names = set(names)
+        self.entry = entry
+        self.specialize = specialize
+        # ids of the typed reads
+        self.typed = set()
+        # names assigned something that may not be a number
+        self.mixed = set()
+        # whether each arg of a call is a number, by id of the call
+        self.numeric_args = {}
+
+    def infer(self, node):
+        while True:
+            self.typed = set()
+            self.mixed = set()
+            self.numeric_args = {}
+            self.scan(node, set(self.entry) & self.names)
+            if not self.mixed & self.names:
+                break
+            # reads of those names may have typed others, start over
+            self.names -= self.mixed
+        return self.expression(node)
+
+    def scan(self, node, assigned):
+        """
+        Types node run with the names in assigned set, adding the names it
+        sets on the way. Returns the names it added, whether its value is a
+        number and whether it can fail.
+        """
+        node_type = type(node)
+
+        if node_type is NumberNode:
+            return [], True, False
+        if node_type is StringNode:
+            return [], False, False
+
+        if node_type is VarAccessNode:
+            # only a read of a set name is sure to find a value
+            typed = node.var_name in assigned and node.var_name in self.names
+            if typed:
+                self.typed.add(id(node))
+            return [], typed, not typed
+
+        if node_type is BinOpNode:
+            added, left, fails = self.scan(node.left_node, assigned)
+            right_added, right, right_fails = self.scan(node.right_node, assigned)
+            numeric = left and right
+            # numbers fail to divide by zero only
+            fails = fails or right_fails or not numeric or node.op == cc.TT_DIV
+            return added + right_added, numeric, fails
+
+        if node_type is UnaryOpNode:
+            added, numeric, fails = self.scan(node.node, assigned)
+            return added, numeric, fails or not numeric
+
+        if node_type is VarAssignNode:
+            added, numeric, fails = self.scan(node.value_node, assigned)
+            if not numeric:
+                self.mixed.add(node.var_name)
+            self.assign(node.var_name, assigned, added)
+            return added, numeric, fails
+
+        if node_type is ListNode:
+            added, fails = [], False
+            # set by elements that can fail, once every element got to run
+            pending = []
+            for element in node.element_nodes:
+                element_added, _, element_fails = self.scan(element, assigned)
+                if element_fails:
+                    assigned.difference_update(element_added)
+                    pending.extend(element_added)
+                    fails = True
+                else:
+                    added.extend(element_added)
+            pending = [name for name in pending if name not in assigned]
+            assigned.update(pending)
+            return added + pending, False, fails
+
+        if node_type is IfNode:
+            return self.scan_if(node, assigned)
+
+        if node_type is ForNode:
+            added, fails = [], False
+            headers = [node.start_value_node, node.end_value_node]
+            if node.step_value_node:
+                headers.append(node.step_value_node)
+            for header in headers:
+                header_added, numeric, header_fails = self.scan(header, assigned)
+                added.extend(header_added)
+                fails = fails or header_fails or not numeric
+            # the body may not run, what it sets is not set after the loop
+            body_added = []
+            self.assign(node.var_name, assigned, body_added)
+            more, _, body_fails = self.scan(node.body_node, assigned)
+            assigned.difference_update(body_added + more)
+            return added, False, fails or body_fails
+
+        if node_type is ProcNode:
+            if node.var_name:
+                self.mixed.add(node.var_name)
+            return [], False, False
+
+        if node_type is CallNode:
+            added, _, _ = self.scan(node.node_to_call, assigned)
+            numeric_args = []
+            for arg_node in node.arg_nodes:
+                arg_added, numeric, _ = self.scan(arg_node, assigned)
+                added.extend(arg_added)
+                numeric_args.append(numeric)
+            self.numeric_args[id(node)] = numeric_args
+            return added, False, True
+
+        if node_type in (InlineCallNode, SpecialCallNode):
+            added, _, _ = self.scan(node.call, assigned)
+            return added, False, True
+
+        if node_type in (InvariantNode, InductionNode):
+            return self.scan(node.node, assigned)
+
+        return [], False, True
+
+    def assign(self, name, assigned, added):
+        if name in self.names and name not in assigned:
+            assigned.add(name)
+            added.append(name)
+
+    def scan_if(self, node, assigned):
+        cases = list(node.cases)
+        if node.else_case:
+            cases.append((None, *node.else_case))
+        numeric, fails = node.else_case is not None, False
+        # names set by the conditions tried so far, and on each way through
+        conditions = []
+        ways = []
+        for condition, case, should_return_null in cases:
+            if condition is not None:
+                added, _, condition_fails = self.scan(condition, assigned)
+                conditions.extend(added)
+                fails = fails or condition_fails
+            added, case_numeric, case_fails = self.scan(case, assigned)
+            assigned.difference_update(added)
+            ways.append(set(conditions).union(added))
+            numeric = numeric and case_numeric and not should_return_null
+            fails = fails or case_fails
+        if not node.else_case:
+            ways.append(set(conditions))
+
+        common = set.intersection(*ways)
+        assigned.difference_update(name for name in conditions if name not in common)
+        assigned.update(common)
+        return list(common), numeric, fails
+
+    def expression(self, node):
+        """Rewrites an expression whose value is not combined by an operator"""
+        node, numeric = self.visit(node)
+        return self.box(node, numeric)
+
+    def box(self, node, numeric):
+        if not numeric:
+            return node
+        node_type = type(node)
+        if node_type is InvariantNode:
+            # still evaluated once, on plain values
+            node.node = self.box(node.node, True)
+            return node
+        if node_type not in OPERATORS:
+            return node
+        node = plain(node)
+        return NumericNode(node, leaves(node))
+
+    def visit(self, node):
+        """Returns the rewritten node and whether it can be a NumericNode"""
+        node_type = type(node)
+
+        if node_type is NumberNode:
+            return node, True
+        if node_type is VarAccessNode:
+            return node, id(node) in self.typed
+
+        if node_type is BinOpNode:
+            left, left_numeric = self.visit(node.left_node)
+            right, right_numeric = self.visit(node.right_node)
+            if left_numeric and right_numeric:
+                node.left_node, node.right_node = left, right
+                return node, True
+            node.left_node = self.box(left, left_numeric)
+            node.right_node = self.box(right, right_numeric)
+            return node, False
+
+        if node_type is UnaryOpNode:
+            node.node, numeric = self.visit(node.node)
+            return node, numeric
+
+        if node_type is IfNode:
+            return self.visit_if(node)
+
+        if node_type is VarAssignNode:
+            node.value_node = self.expression(node.value_node)
+        elif node_type is ListNode:
+            node.element_nodes = [self.expression(element) for element in node.element_nodes]
+        elif node_type is ForNode:
+            node.start_value_node = self.expression(node.start_value_node)
+            node.end_value_node = self.expression(node.end_value_node)
+            if node.step_value_node:
+                node.step_value_node = self.expression(node.step_value_node)
+            node.body_node = self.expression(node.body_node)
+        elif node_type in (InvariantNode, InductionNode):
+            node.node, numeric = self.visit(node.node)
+            return node, numeric
+        elif node_type is CallNode:
+            return self.visit_call(node), False
+        elif node_type is InlineCallNode:
+            numeric_args = self.numeric_args.get(id(node.call), ())
+            self.call_args(node.call)
+            node.body_node = infer_body(node.body_node, node.arg_names, typed_args(node.arg_names, numeric_args))
+        elif node_type is SpecialCallNode:
+            self.call_args(node.call)
+        return node, False
+
+    def visit_if(self, node):
+        cases = []
+        numeric = node.else_case is not None
+        for condition, case, should_return_null in node.cases:
+            condition, condition_numeric = self.visit(condition)
+            case, case_numeric = self.visit(case)
+            cases.append((condition, condition_numeric, case, case_numeric, should_return_null))
+            numeric = numeric and condition_numeric and case_numeric and not should_return_null
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            expr, else_numeric = self.visit(expr)
+            numeric = numeric and else_numeric and not should_return_null
+
+        if numeric:
+            node.cases = [(condition, case, False) for condition, _, case, _, _ in cases]
+            node.else_case = (expr, False)
+            return node, True
+        node.cases = [
+            (self.box(condition, condition_numeric), self.box(case, case_numeric), should_return_null)
+            for condition, condition_numeric, case, case_numeric, should_return_null in cases
+        ]
+        if node.else_case:
+            node.else_case = (self.box(expr, else_numeric), should_return_null)
+        return node, False
+
+    def call_args(self, node):
+        node.node_to_call = self.expression(node.node_to_call)
+        node.arg_nodes = [self.expression(arg_node) for arg_node in node.arg_nodes]
+
+    def visit_call(self, node):
+        numeric_args = self.numeric_args.get(id(node), ())
+        self.call_args(node)
+        if self.specialize is None or not any(numeric_args):
+            return node
+        return self.specialize(node, numeric_args)
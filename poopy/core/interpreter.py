@@ -1,9 +1,9 @@
-from core.types.number import Number
-from core.types.string import String
+from core.types.number import number
 from core.types.list import List
-import core.constant as cc
 from core.error import NotDefined, RTError
-from core.runtime import RTResult
+from core.runtime import RTException, OperationError, operation_error
+from core.transpiler import GUARD_FAILED, numeric_value
+from core.hoisting import reset_invariants, cached_invariant, save_invariant, induction_value
 
 
 class Interpreter:
@@ -15,144 +15,90 @@ class Interpreter:
     def no_visit_method(self, context):
         NotDefined(None, None, f"{self.method_name} is not defined")
 
+    def execute_body(self, node, context):
+        """Runs a PROC body, engines that compile keep its code for the next call"""
+        return self.visit(node, context)
+
     def visit_NumberNode(self, node, context):
-        res = RTResult()
-        return res.success(
-            Number(node.tok.value)
-            .set_context(context)
-            .set_pos(pos_start=node.pos_start, pos_end=node.pos_start)
-        )
+        return node.constant
 
     def visit_BinOpNode(self, node, context):
-        res = RTResult()
-        left = res.register(self.visit(node.left_node, context))
-        if res.error:
-            return res
-        right = res.register(self.visit(node.right_node, context))
-        if res.error:
-            return res
-        if node.op_tok.type == cc.TT_PLUS:
-            result, error = left.added_to(right)
-        elif node.op_tok.type == cc.TT_MINUS:
-            result, error = left.subbed_by(right)
-        elif node.op_tok.type == cc.TT_MUL:
-            result, error = left.multed_by(right)
-        elif node.op_tok.type == cc.TT_DIV:
-            result, error = left.dived_by(right)
-        elif node.op_tok.type == cc.TT_POW:
-            result, error = left.raised_to(right)
-        elif node.op_tok.type == cc.TT_EE:
-            result, error = left.get_comparison_eq(right)
-        elif node.op_tok.type == cc.TT_NE:
-            result, error = left.get_comparison_ne(right)
-        elif node.op_tok.type == cc.TT_LT:
-            result, error = left.get_comparison_lt(right)
-        elif node.op_tok.type == cc.TT_GT:
-            result, error = left.get_comparison_gt(right)
-        elif node.op_tok.type == cc.TT_LTE:
-            result, error = left.get_comparison_lte(right)
-        elif node.op_tok.type == cc.TT_GTE:
-            result, error = left.get_comparison_gte(right)
-        elif node.op_tok.matches(cc.TT_KEYWORD, "AND"):
-            result, error = left.anded_by(right)
-        elif node.op_tok.matches(cc.TT_KEYWORD, "OR"):
-            result, error = left.ored_by(right)
-        elif node.op_tok.matches(cc.TT_KEYWORD, "XOR"):
-            result, error = left.xored_by(right)
-
-        if error:
-            return res.failure(error)
-        else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+        left = self.visit(node.left_node, context)
+        right = self.visit(node.right_node, context)
+        try:
+            return node.operation[left.__class__, right.__class__](left, right)
+        except OperationError as e:
+            raise RTException(operation_error(e, node, context))
 
     def visit_UnaryOpNode(self, node, context):
-        res = RTResult()
-        number = res.register(self.visit(node.node, context))
-        if res.error:
-            return res
-
-        error = None
-
-        if node.op_tok.type == cc.TT_MINUS:
-            number, error = number.multed_by(Number(-1))
-        elif node.op_tok.matches(cc.TT_KEYWORD, "NOT"):
-            number, error = number.notted()
-
-        if error:
-            return res.failure(error)
-        else:
-            return res.success(number.set_pos(node.pos_start, node.pos_end))
+        operand = self.visit(node.node, context)
+        try:
+            return node.operation[operand.__class__](operand)
+        except OperationError as e:
+            raise RTException(operation_error(e, node, context))
 
     def visit_VarAccessNode(self, node, context):
-        res = RTResult()
-        var_name = node.var_name_tok.value
-        value = context.symbol_table.get(var_name)
+        var_name = node.var_name
+        depth = node.depth
+        if depth is None:
+            cache = node.cache
+            if cache is None:
+                value = context.symbol_table.get(var_name)
+            elif cache.version == context.symbol_table.root.version:
+                cache.hits += 1
+                value = cache.value
+            else:
+                value = cache.lookup(context.symbol_table, var_name)
+        elif depth == 0:
+            value = context.symbol_table.slots[node.slot]
+            if value is None:
+                value = context.symbol_table.get(var_name)
+        else:
+            value = context.symbol_table.load(depth, node.slot, var_name)
 
         if not value:
-            return res.failure(
+            raise RTException(
                 RTError(
                     node.pos_start, node.pos_end, f"{var_name} is not defined", context
                 )
             )
 
-        value = value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
-        return res.success(value)
+        return value
 
     def visit_VarAssignNode(self, node, context):
-        res = RTResult()
-        var_name = node.var_name_tok.value
-        value = res.register(self.visit(node.value_node, context))
+        value = self.visit(node.value_node, context)
 
-        if res.error:
-            return res
-
-        context.symbol_table.set_val(var_name, value)
-        return res.success(value)
+        if node.slot is None:
+            context.symbol_table.set_val(node.var_name, value)
+        else:
+            context.symbol_table.slots[node.slot] = value
+        return value
 
     def visit_IfNode(self, node, context):
-        res = RTResult()
-
         for condition, case, should_return_null in node.cases:
-            condition_value = res.register(self.visit(condition, context))
-            if res.error:
-                return res
-
-            if condition_value.is_true():
-                case_value = res.register(self.visit(case, context))
-                if res.error:
-                    return res
-                return res.success(None if should_return_null else case_value)
+            if self.visit(condition, context).is_true():
+                case_value = self.visit(case, context)
+                return None if should_return_null else case_value
 
         if node.else_case:
             expr, should_return_null = node.else_case
-            else_value = res.register(self.visit(expr, context))
-            if res.error:
-                return res
-            return res.success(None if should_return_null else else_value)
+            else_value = self.visit(expr, context)
+            return None if should_return_null else else_value
 
-        return res.success(None)
+        return None
 
     def visit_ForNode(self, node, context):
-        res = RTResult()
         elements = []
 
-        start_value = res.register(self.visit(node.start_value_node, context))
-        if res.error:
-            return res
-
-        end_value = res.register(self.visit(node.end_value_node, context))
-        if res.error:
-            return res
-
+        start_value = self.visit(node.start_value_node, context)
+        end_value = self.visit(node.end_value_node, context)
         if node.step_value_node:
-            step_value = res.register(self.visit(node.step_value_node, context))
-
-            if res.error:
-                return res
+            step_value = self.visit(node.step_value_node, context)
         else:
-            step_value = Number(1)
+            step_value = number(1)
 
         stepper = start_value.value
+        reset_invariants(node, context.symbol_table)
 
         if stepper >= 0:
             condition = lambda: stepper <= end_value.value
@@ -160,80 +106,87 @@ class Interpreter:
             condition = lambda: stepper >= end_value.value
 
         while condition():
-            context.symbol_table.set_val(node.var_name_tok.value, Number(stepper))
+            context.symbol_table.set_val(node.var_name, number(stepper))
             stepper = stepper + step_value.value
 
-            elements.append(res.register(self.visit(node.body_node, context)))
-            if res.error:
-                return res
+            elements.append(self.visit(node.body_node, context))
+
+        return None if node.should_return_null else List(elements)
+
+    def visit_InvariantNode(self, node, context):
+        value = cached_invariant(node, context.symbol_table)
+        if value is not None:
+            return value
 
-        return res.success( 
-            None if node.should_return_null else 
-            List(elements)
-            .set_context(context)
-            .set_pos(node.pos_start, node.pos_end)
-        )
+        value = self.visit(node.node, context)
+        save_invariant(node, value, context.symbol_table)
+        return value
+
+    def visit_InductionNode(self, node, context):
+        value = induction_value(node, context.symbol_table)
+        if value is None:
+            return self.visit(node.node, context)
+        return number(value)
+
+    def visit_NumericNode(self, node, context):
+        args = [self.visit(leaf, context) for leaf in node.leaves]
+        return numeric_value(node, args, context)
 
     def visit_ProcNode(self, node, context):
         from core.types.procedure import Procedure
 
-        res = RTResult()
-        proc_name = node.var_name_tok.value
-        body_node = node.body_node
-        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
-        proc_value = (
-            Procedure(proc_name, body_node, arg_names, node.should_return_null)
-            .set_context(context)
-            .set_pos(node.pos_start, node.pos_end)
-        )
-
-        if node.var_name_tok:
+        proc_name = node.var_name
+        proc_value = Procedure(proc_name, node, self, context.symbol_table)
+
+        if node.var_name:
             context.symbol_table.set_val(proc_name, proc_value)
 
-        return res.success(proc_value)
+        return proc_value
 
-    def visit_CallNode(self, node, context):
-        res = RTResult()
-        args = []
+    def visit_CallNode(self, node, context, special=None):
+        value_to_call = self.visit(node.node_to_call, context)
 
-        value_to_call = res.register(self.visit(node.node_to_call, context))
+        if special is not None:
+            from core.types.procedure import specialized_callee
+            value_to_call = specialized_callee(special, value_to_call)
 
-        if res.error:
-            return res
-        value_to_call = value_to_call.copy().set_pos(node.pos_start, node.pos_end)
+        args = [self.visit(arg_node, context) for arg_node in node.arg_nodes]
 
-        for arg_node in node.arg_nodes:
-            args.append(res.register(self.visit(arg_node, context)))
-            if res.error:
-                return res
+        return value_to_call.execute(args, context, node)
 
-        return_value = res.register(value_to_call.execute(args))
-        if res.error:
-            return res
-        try:
-            return_value = return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
-        except:
-            pass
-        return res.success(return_value)
+    def visit_SpecialCallNode(self, node, context):
+        return self.visit_CallNode(node.call, context, node)
 
-    def visit_StringNode(self, node, context):
-        res = RTResult()
-        return res.success(
-            String(node.tok.value)
-            .set_context(context)
-            .set_pos(node.pos_start, node.pos_end)
-        )
+    def visit_InlineCallNode(self, node, context):
+        from core.types.procedure import inlined_callee, inline_frame, release, execute_inline_fast
 
-    def visit_ListNode(self, node, context):
-        res = RTResult()
-        elements = [
-            res.register(self.visit(ele, context)) for ele in node.element_nodes
-        ]
+        if not inlined_callee(node, context):
+            return self.visit(node.call, context)
 
-        return res.success(
-            List(elements)
-            .set_context(context)
-            .set_pos(node.pos_start, node.pos_end)
-        )
+        args = [self.visit(arg_node, context) for arg_node in node.call.arg_nodes]
 
+        value = execute_inline_fast(node, context, args)
+        if value is GUARD_FAILED:
+            new_context = inline_frame(node, context, args)
+            value = self.visit(node.body_node, new_context)
+            release(new_context)
+            if node.should_return_null:
+                value = None
+        return value
 
+    def visit_StringNode(self, node, context):
+        return node.constant
+
+    def visit_ListNode(self, node, context):
+        # every element is evaluated, the last error wins
+        elements = []
+        list_error = None
+        for ele in node.element_nodes:
+            try:
+                elements.append(self.visit(ele, context))
+            except RTException as e:
+                list_error = e
+        if list_error:
+            raise list_error
+
+        return List(elements)
@@ -1,196 +1,175 @@
+import re
+import sys
+
 import core.constant as cc
-from core.token import Token
-from core.position import Position
+from core.token import TokenStream
+from core.position import Position, Source
 from core.error import IllegalCharError, ExpectedCharError
 
 
+# One alternative per lexeme class, tried left to right at the current offset.
+# Lexemes are sliced straight out of the source instead of being built up
+# character by character.
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<skip>[ \t]+)
+    |(?P<newline>[;\n])
+    |(?P<comment>@[^\n]*\n?)
+    |(?P<number>[0-9]+(?:\.[0-9]*)?)
+    |(?P<identifier>[A-Za-z][A-Za-z0-9_]*)
+    |(?P<string>"[^"]*"?)
+    |(?P<op>==|!=|<=|>=|[-+*/^(){}=<>,:])
+    |(?P<bang>!)
+    """,
+    re.VERBOSE,
+)
+
+OPERATORS = {
+    "+": cc.TT_PLUS,
+    "-": cc.TT_MINUS,
+    "*": cc.TT_MUL,
+    "/": cc.TT_DIV,
+    "^": cc.TT_POW,
+    "(": cc.TT_LPAREN,
+    ")": cc.TT_RPAREN,
+    "{": cc.TT_LCURLY,
+    "}": cc.TT_RCURLY,
+    "=": cc.TT_EQ,
+    "==": cc.TT_EE,
+    "!=": cc.TT_NE,
+    "<": cc.TT_LT,
+    "<=": cc.TT_LTE,
+    ">": cc.TT_GT,
+    ">=": cc.TT_GTE,
+    ",": cc.TT_COMMA,
+    ":": cc.TT_COLON,
+}
+
+KEYWORDS = frozenset(cc.KEYWORDS)
+
+
 class Lexer:
     def __init__(self, fn, text):
         self.fn = fn
         self.text = text
-        self.pos = Position(-1, 0, -1, fn, text)
-        self.current_char = None
-        self.advance()
-
-    def advance(self):
-        self.pos.advance(self.current_char)
-        self.current_char = (
-            self.text[self.pos.idx] if self.pos.idx < len(self.text) else None
-        )
+        self.source = Source(fn, text)
 
     def make_tokens(self):
-        tokens = []
-
-        while self.current_char != None:
-            if self.current_char in " \t":
-                self.advance()
-            elif self.current_char == "@":
-                self.comment()
-            elif self.current_char in ";\n":
-                tokens.append(Token(cc.TT_NEWLINE, pos_start = self.pos))
-                self.advance()
-            elif self.current_char in cc.DIGITS:
-                tokens.append(self.make_number())
-            elif self.current_char in cc.LETTERS:
-                tokens.append(self.make_identifier())
-            elif self.current_char == "+":
-                tokens.append(Token(cc.TT_PLUS, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "-":
-                tokens.append(Token(cc.TT_MINUS, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "*":
-                tokens.append(Token(cc.TT_MUL, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "^":
-                tokens.append(Token(cc.TT_POW, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "/":
-                tokens.append(Token(cc.TT_DIV, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "(":
-                tokens.append(Token(cc.TT_LPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ")":
-                tokens.append(Token(cc.TT_RPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "{":
-                tokens.append(Token(cc.TT_LCURLY, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "}":
-                tokens.append(Token(cc.TT_RCURLY, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "!":
-                tok, error = self.make_not_equals()
-                if error:
-                    return [], error
-                tokens.append(tok)
-            elif self.current_char == "=":
-                tokens.append(self.make_equals())
-            elif self.current_char == ">":
-                tokens.append(self.make_greater_than())
-            elif self.current_char == "<":
-                tokens.append(self.make_less_than())
-            elif self.current_char == "~":
-                tokens.append(self.make_xor())
-            elif self.current_char == ",":
-                tokens.append(Token(cc.TT_COMMA, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ":":
-                tokens.append(Token(cc.TT_COLON, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '"':
-                tokens.append(self.make_string())
-            else:
-                pos_start = self.pos.copy()
-                char = self.current_char
-                self.advance()
-                return [], IllegalCharError(pos_start, self.pos, "'" + char + "'")
-
-        tokens.append(Token(cc.TT_EOF, pos_start=self.pos))
-        return tokens, None
+        tokens = TokenStream(self.source)
+        idx, error = self.scan(self.text, 0, tokens, final=True)
+        if error:
+            return None, error
 
-    def make_number(self):
-        num_str = ""
-        dot_count = 0
-        pos_start = self.pos.copy()
-        while self.current_char != None and self.current_char in cc.DIGITS + ".":
-            if self.current_char == ".":
-                if dot_count == 1:
-                    break
-                dot_count += 1
-                num_str += "."
-            else:
-                num_str += self.current_char
-            self.advance()
-
-        if dot_count == 0:
-            return Token(cc.TT_INT, int(num_str), pos_start, self.pos)
-        else:
-            return Token(cc.TT_FLOAT, float(num_str), pos_start, self.pos)
-
-    def make_identifier(self):
-        id_str = ""
-        pos_start = self.pos.copy()
-
-        while (
-            self.current_char is not None
-            and self.current_char in cc.LETTERS_DIGITS + "_"
-        ):
-            id_str += self.current_char
-            self.advance()
-
-        tok_type = cc.TT_KEYWORD if id_str in cc.KEYWORDS else cc.TT_IDENTIFIER
-
-        return Token(tok_type, id_str, pos_start, self.pos)
-
-    def make_not_equals(self):
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            return Token(cc.TT_NE, pos_start=pos_start, pos_end=self.pos), None
-
-        self.advance()
-        return None, ExpectedCharError(pos_start, self.pos, "expected '=' after '!'")
-
-    def make_equals(self):
-        """
-        Checks for both = and == and returns TokenType accordingly
-        """
-        tok_type = cc.TT_EQ
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            tok_type = cc.TT_EE
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_less_than(self):
-        """
-        Checks for both < and <= and returns TokenType accordingly
-        """
-        tok_type = cc.TT_LT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            tok_type = cc.TT_LTE
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
+        tokens.append(cc.TT_EOF, idx, idx + 1)
+        return tokens, None
 
-    def make_greater_than(self):
+    def scan(self, text, base, tokens, final):
         """
-        Checks for both > and >= and returns TokenType accordingly
+        Appends the tokens of text to the stream, offsets are shifted by base.
+        Unless final, a lexeme touching the end of text may still grow and is
+        left unlexed. Returns the global offset lexed up to and an error if any.
         """
-        tok_type = cc.TT_GT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            tok_type = cc.TT_GTE
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_string(self):
-        _string = ""
-        pos_start = self.pos.copy()
-        self.advance()
-
-        while self.current_char is not None and self.current_char != '"':
-            _string += self.current_char
-            self.advance()
-
-        self.advance()
-
-        return Token(cc.TT_STRING, _string, pos_start=pos_start, pos_end=self.pos)
-
-    def comment(self):
-        self.advance() #advance past the @ symbol
-
-        while self.current_char != "\n": #skip till new line char is detected
-            self.advance()
-
-        self.advance() #advance past the new line too
\ No newline at end of file
+        match = TOKEN_PATTERN.match
+        intern = sys.intern
+        kinds = tokens.kinds
+        starts = tokens.starts
+        ends = tokens.ends
+        values = tokens.values
+
+        idx = 0
+        end = len(text)
+
+        while idx < end:
+            m = match(text, idx)
+
+            if m is None:
+                return base + idx, IllegalCharError(
+                    Position(base + idx, self.source),
+                    Position(base + idx + 1, self.source),
+                    "'" + text[idx] + "'",
+                )
+
+            kind = m.lastgroup
+            nxt = m.end()
+
+            if nxt == end and not final:
+                break
+
+            if kind == "skip" or kind == "comment":
+                # the comment swallows its terminating new line as well
+                idx = nxt
+                continue
+
+            if kind == "newline":
+                kinds.append(cc.TT_NEWLINE)
+                values.append(None)
+            elif kind == "identifier":
+                id_str = intern(m.group())
+                kinds.append(cc.TT_KEYWORD if id_str in KEYWORDS else cc.TT_IDENTIFIER)
+                values.append(id_str)
+            elif kind == "op":
+                kinds.append(OPERATORS[m.group()])
+                values.append(None)
+            elif kind == "number":
+                num_str = m.group()
+                if "." in num_str:
+                    kinds.append(cc.TT_FLOAT)
+                    values.append(float(num_str))
+                else:
+                    kinds.append(cc.TT_INT)
+                    values.append(int(num_str))
+            elif kind == "string":
+                lexeme = m.group()
+                closed = len(lexeme) > 1 and lexeme[-1] == '"'
+                kinds.append(cc.TT_STRING)
+                values.append(lexeme[1:-1] if closed else lexeme[1:])
+            else:  # a lone '!'
+                return base + idx, ExpectedCharError(
+                    Position(base + idx, self.source),
+                    Position(base + min(nxt + 1, end), self.source),
+                    "expected '=' after '!'",
+                )
+
+            starts.append(base + idx)
+            ends.append(base + nxt)
+            idx = nxt
+
+        return base + idx, None
+
+
+class StreamLexer(Lexer):
+    """
+    Lexes a source arriving as an iterable of text chunks. Tokens are pulled
+    by the parser as it needs them, so only the unlexed tail of the current
+    chunk and the tokens not yet released are ever held in memory.
+    """
+
+    def __init__(self, fn, chunks):
+        super().__init__(fn, None)
+        self.source = Source.incremental(fn)
+        self.chunks = iter(chunks)
+        self.pending = ""
+        self.offset = 0
+        self.error = None
+        self.tokens = TokenStream(self.source)
+        self.tokens.pull = self.pull
+
+    def pull(self, count):
+        tokens = self.tokens
+        while len(tokens) < count and tokens.pull:
+            chunk = next(self.chunks, None)
+            final = chunk is None
+            text = self.pending
+            if chunk:
+                self.source.add_lines(chunk, self.offset + len(text))
+                text += chunk
+
+            idx, error = self.scan(text, self.offset, tokens, final)
+            self.pending = text[idx - self.offset:]
+            self.offset = idx
+
+            if error or final:
+                # end the stream so the parser stops at the lexing error
+                self.error = error
+                tokens.append(cc.TT_EOF, idx, idx + 1)
+                tokens.pull = None
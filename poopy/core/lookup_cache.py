@@ -0,0 +1,82 @@
+from itertools import count
+
+from core.nodes import VarAccessNode
+from core.cache import children
+
+# Run time side of the global lookup caches. Every global table has a
+# version, a LookupCache holds the value a global read found and the
+# version of the table it was found at. Assigning or removing a name some
+# cache holds moves the table to a new version, so a read at the version
+# it cached at is a hit and needs no lookup.
+
+# one counter for every table, a version a cache saw never matches another
+# table or an older state of the same one
+VERSIONS = count()
+
+# a cache keeps caching a name that changed no more than this many times,
+# or no more than once every CACHE_CHANGE_RATIO hits
+MAX_CACHE_CHANGES = 4
+CACHE_CHANGE_RATIO = 16
+
+
+class LookupCache:
+    """
+    Inline cache of the global a read site looks up. It keeps the value the
+    name had and the version of the root table it was read at, a read at
+    the same version is a hit. A name that keeps changing is no longer
+    cached, so its assignments stop invalidating every other cache.
+    """
+
+    __slots__ = ("version", "value", "hits", "misses", "changes")
+
+    def __init__(self):
+        self.version = -1
+        self.value = None
+        self.hits = 0
+        self.misses = 0
+        self.changes = 0
+
+    def lookup(self, symbol_table, name):
+        """Looks name up on a miss and caches its value"""
+        self.misses += 1
+        value = symbol_table.get(name)
+        if self.value is not None and value is not self.value:
+            self.changes += 1
+        self.value = value
+        if value is not None and (
+            self.changes <= MAX_CACHE_CHANGES
+            or self.changes * CACHE_CHANGE_RATIO <= self.hits
+        ):
+            root = symbol_table.root
+            root.watched.add(name)
+            self.version = root.version
+        else:
+            self.version = -1
+        return value
+
+
+def cached_global(node, symbol_table):
+    """Value of the global a VarAccessNode reads, through its cache if any"""
+    cache = node.cache
+    if cache is None:
+        return symbol_table.get(node.var_name)
+    if cache.version == symbol_table.root.version:
+        cache.hits += 1
+        return cache.value
+    return cache.lookup(symbol_table, node.var_name)
+
+
+def lookup_cache_stats(node):
+    """(sites, hits, misses) of the LookupCaches in a tree"""
+    sites = hits = misses = 0
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is VarAccessNode:
+            if node.cache is not None:
+                sites += 1
+                hits += node.cache.hits
+                misses += node.cache.misses
+            continue
+        nodes.extend(children(node))
+    return sites, hits, misses
@@ -1,125 +1,396 @@
-class NumberNode:
+import core.constant as cc
+from core.position import Position
+from core.types.number import number
+from core.types.string import String
+from core.operators import BINARY_TABLES, UNARY_TABLES
+
+
+class Node:
+    """
+    Nodes keep what the interpreter needs and no tokens. A node spans the
+    source offsets start to end, positions are only built when asked for.
+    """
+
+    __slots__ = ("source", "start", "end")
+
+    @property
+    def pos_start(self):
+        return Position(self.start, self.source)
+
+    @property
+    def pos_end(self):
+        return Position(self.end, self.source)
+
+
+def constant(source, value_type, value):
+    """
+    Value of a literal from the constant pool of its file, every literal
+    with the same value shares one. A file read in chunks has no pool and
+    each literal gets its own.
     """
-    Will take in corresponding number token either INT or FLOAT
+    pool = source.constants
+    if pool is None:
+        return value_type(value)
+    # repr keeps 0.0 and -0.0 apart
+    key = (type(value), repr(value))
+    value_object = pool.get(key)
+    if value_object is None:
+        value_object = pool[key] = value_type(value)
+    return value_object
+
+
+def op_name(op):
+    # keyword operators are kept as the keyword itself
+    return op if isinstance(op, str) else cc.TT_NAMES[op]
+
+
+class NumberNode(Node):
+    """
+    Will take in the value of the corresponding number token either INT or FLOAT
     """
 
-    def __init__(self, tok):
-        self.tok = tok
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+    __slots__ = ("value", "constant")
+
+    def __init__(self, value, source, start, end):
+        self.value = value
+        # the Number every evaluation of the literal returns
+        self.constant = constant(source, number, value)
+        self.source = source
+        self.start = start
+        self.end = end
 
     def __repr__(self):
-        return f"{self.tok}"
+        return f"{self.value}"
+
 
+class StringNode(Node):
+    __slots__ = ("value", "constant")
 
-class StringNode:
-    def __init__(self, tok):
-        self.tok = tok
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+    def __init__(self, value, source, start, end):
+        self.value = value
+        self.constant = constant(source, String, value)
+        self.source = source
+        self.start = start
+        self.end = end
 
     def __repr__(self):
-        return f"{self.tok}"
+        return f'"{self.value}"'
 
 
-class BinOpNode:
+class BinOpNode(Node):
     """
-    for addition, sub, multiple and divide operation
+    for addition, sub, multiple and divide operation, operation is the
+    table of core.operators running op by the types of the operands
     """
 
-    def __init__(self, left_node, op_tok, right_node):
+    __slots__ = ("left_node", "op", "right_node", "operation")
+
+    def __init__(self, left_node, op, right_node):
         self.left_node = left_node
-        self.op_tok = op_tok
+        self.op = op
+        self.operation = BINARY_TABLES[op]
         self.right_node = right_node
-        self.pos_start = self.left_node.pos_start
-        self.pos_end = self.right_node.pos_end
+        self.source = left_node.source
+        self.start = left_node.start
+        self.end = right_node.end
 
     def __repr__(self):
-        return f"({self.left_node}, {self.op_tok}, {self.right_node})"
+        return f"({self.left_node}, {op_name(self.op)}, {self.right_node})"
 
 
-class UnaryOpNode:
+class UnaryOpNode(Node):
     """
-    For uniary operations like negative or postive of a number
+    For uniary operations like negative or postive of a number, operation
+    runs op by the type of the operand
     """
 
-    def __init__(self, op_tok, node):
-        self.op_tok = op_tok
+    __slots__ = ("op", "node", "operation")
+
+    def __init__(self, op, node, source, start):
+        self.op = op
+        self.operation = UNARY_TABLES[op]
         self.node = node
-        self.pos_start = self.op_tok.pos_start
-        self.pos_end = self.node.pos_end
+        self.source = source
+        self.start = start
+        self.end = node.end
 
     def __repr__(self):
-        return f"({self.op_tok}, {self.node})"
+        return f"({op_name(self.op)}, {self.node})"
+
 
+class VarAssignNode(Node):
+    """slot is the frame slot core.resolver gave the name, None for a global"""
 
-class VarAssignNode:
-    def __init__(self, var_name_tok, value_node):
-        self.var_name_tok = var_name_tok
+    __slots__ = ("var_name", "value_node", "slot")
+
+    def __init__(self, var_name, value_node, source, start):
+        self.var_name = var_name
         self.value_node = value_node
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.value_node.pos_end
+        self.slot = None
+        self.source = source
+        self.start = start
+        self.end = value_node.end
+
+
+class VarAccessNode(Node):
+    """
+    depth and slot are where core.resolver found the name, the frame that
+    many PROC scopes out and its slot there, None for a global. A resolved
+    global read gets the LookupCache of its site.
+    """
 
+    __slots__ = ("var_name", "depth", "slot", "cache")
 
-class VarAccessNode:
-    def __init__(self, var_name_tok):
-        self.var_name_tok = var_name_tok
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.var_name_tok.pos_end
+    def __init__(self, var_name, source, start, end):
+        self.var_name = var_name
+        self.depth = None
+        self.slot = None
+        self.cache = None
+        self.source = source
+        self.start = start
+        self.end = end
 
-class ListNode:
-  def __init__(self, element_nodes, pos_start, pos_end):
-    self.element_nodes = element_nodes
 
-    self.pos_start = pos_start
-    self.pos_end = pos_end
+class ListNode(Node):
+    __slots__ = ("element_nodes",)
+
+    def __init__(self, element_nodes, source, start, end):
+        self.element_nodes = element_nodes
+        self.source = source
+        self.start = start
+        self.end = end
+
+
+class IfNode(Node):
+    __slots__ = ("cases", "else_case")
 
-class IfNode:
     def __init__(self, cases, else_case):
         self.cases = cases
         self.else_case = else_case
 
-        self.pos_start = self.cases[0][0].pos_start
-        self.pos_end = (self.else_case or self.cases[-1])[0].pos_end
+        first = cases[0][0]
+        self.source = first.source
+        self.start = first.start
+        self.end = (else_case or cases[-1])[0].end
+
+
+class ForNode(Node):
+    """
+    hoisted holds the slots of the invariants the optimizer moved out of
+    the body, they are cleared every time the loop starts
+    """
 
+    __slots__ = (
+        "var_name",
+        "start_value_node",
+        "end_value_node",
+        "step_value_node",
+        "body_node",
+        "should_return_null",
+        "hoisted",
+    )
 
-class ForNode:
     def __init__(
-        self, var_name_tok, start_value_node, end_value_node, step_value_node, body_node, should_return_null
+        self, var_name, start_value_node, end_value_node, step_value_node, body_node, should_return_null, source, start
     ):
-        self.var_name_tok = var_name_tok
+        self.var_name = var_name
         self.start_value_node = start_value_node
         self.end_value_node = end_value_node
         self.step_value_node = step_value_node
         self.body_node = body_node
         self.should_return_null = should_return_null
+        self.hoisted = ()
+
+        self.source = source
+        self.start = start
+        self.end = body_node.end
 
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.body_node.pos_end
 
+class ProcNode(Node):
+    """
+    A lazily parsed PROC has no body_node yet, only the tokens of its body
+    ending with an EOF. The body is parsed on first call and kept, and run
+    through the optimizer that met the deferred body if there was one.
+    calls and fast_call are the tiering state of core.transpiler and scope
+    the core.resolver Scope of the body.
+    """
+
+    __slots__ = (
+        "var_name",
+        "arg_names",
+        "body_node",
+        "body_tokens",
+        "should_return_null",
+        "optimizer",
+        "calls",
+        "fast_call",
+        "scope",
+    )
 
-class ProcNode:
-    def __init__(self, var_name_tok, arg_name_toks, body_node, should_return_null):
-        self.var_name_tok = var_name_tok
-        self.arg_name_toks = arg_name_toks
+    def __init__(self, var_name, arg_names, body_node, should_return_null, source, start, body_tokens=None):
+        self.var_name = var_name
+        self.arg_names = arg_names
         self.body_node = body_node
+        self.body_tokens = body_tokens
         self.should_return_null = should_return_null
-        if var_name_tok:
-            self.pos_start = self.var_name_tok.pos_start
+        self.optimizer = None
+        self.calls = 0
+        self.fast_call = None
+        self.scope = None
+
+        self.source = source
+        self.start = start
+        if body_node is not None:
+            self.end = body_node.end
         else:
-            self.pos_start = self.body_node.pos_start
+            # the last body token, the one before the EOF
+            self.end = body_tokens.ends[-2]
+
+    def parse_body(self):
+        """Parses a deferred body, returns the syntax error if there is one"""
+        if self.body_node is not None:
+            return None
+
+        from core.parser import Parser
+
+        ast = Parser(self.body_tokens).proc_body(multi_line=self.should_return_null)
+        if ast.error:
+            return ast.error
+        self.body_node = ast.node
+        self.body_tokens = None
+        if self.optimizer is not None:
+            self.body_node = self.optimizer.optimize_body(self)
+            self.optimizer = None
+        if self.scope is not None:
+            from core.resolver import resolve_proc
 
-        self.pos_end = self.body_node.pos_end
+            resolve_proc(self)
+        return None
 
 
-class CallNode:
+class CallNode(Node):
+    __slots__ = ("node_to_call", "arg_nodes")
+
     def __init__(self, node_to_call, arg_nodes):
         self.node_to_call = node_to_call
         self.arg_nodes = arg_nodes
 
-        self.pos_start = self.node_to_call.pos_start
+        self.source = node_to_call.source
+        self.start = node_to_call.start
+        self.end = (arg_nodes[-1] if arg_nodes else node_to_call).end
 
-        if len(self.arg_nodes) > 0:
-            self.pos_end = self.arg_nodes[-1].pos_end
-        else:
-            self.pos_end = self.node_to_call.pos_end
+
+class InvariantNode(Node):
+    """
+    An expression of a loop body that does not change while the loop runs.
+    Its first plain number value is kept under slot and reused by the
+    following iterations, see core.hoisting.
+    """
+
+    __slots__ = ("node", "slot")
+
+    def __init__(self, node, slot):
+        self.node = node
+        self.slot = slot
+
+        self.source = node.source
+        self.start = node.start
+        self.end = node.end
+
+
+class InductionNode(Node):
+    """
+    A BinOpNode combining the loop variable var_name with an int, worked
+    out from the plain value of the loop variable when it is an int. The
+    loop variable is the left operand when var_left.
+    """
+
+    __slots__ = ("node", "var_name", "var_left")
+
+    def __init__(self, node, var_name, var_left):
+        self.node = node
+        self.var_name = var_name
+        self.var_left = var_left
+
+        self.source = node.source
+        self.start = node.start
+        self.end = node.end
+
+
+class NumericNode(Node):
+    """
+    An expression core.inference proved to work on numbers only, made of
+    operators, number literals and reads of the variables in leaves. It is
+    evaluated on the plain values of its leaves by code, the function
+    core.transpiler writes for it on first use, and its result is the only
+    Number it makes.
+    """
+
+    __slots__ = ("node", "leaves", "code")
+
+    def __init__(self, node, leaves):
+        self.node = node
+        self.leaves = leaves
+        self.code = None
+
+        self.source = node.source
+        self.start = node.start
+        self.end = node.end
+
+
+class InlineCallNode(Node):
+    """
+    A call of the top level PROC proc_node with its body copied in as
+    body_node. While the name still holds that PROC the body runs in a
+    frame of its own without a Procedure, otherwise call runs as written.
+    Like a ProcNode it is tiered by core.transpiler on its own and has the
+    core.resolver Scope of its body.
+    """
+
+    __slots__ = (
+        "call",
+        "proc_node",
+        "var_name",
+        "arg_names",
+        "body_node",
+        "should_return_null",
+        "calls",
+        "fast_call",
+        "scope",
+    )
+
+    def __init__(self, call, proc_node, body_node):
+        self.call = call
+        self.proc_node = proc_node
+        self.var_name = proc_node.var_name
+        self.arg_names = proc_node.arg_names
+        self.body_node = body_node
+        self.should_return_null = proc_node.should_return_null
+        self.calls = 0
+        self.fast_call = None
+        self.scope = None
+
+        self.source = call.source
+        self.start = call.start
+        self.end = call.end
+
+
+class SpecialCallNode(Node):
+    """
+    A call of the top level PROC proc_node with literal or numeric args,
+    special is a copy of the PROC with the literal args folded into its body
+    or with the numeric ones typed by core.inference. While the name still
+    holds that PROC the call runs special, otherwise the PROC itself.
+    """
+
+    __slots__ = ("call", "proc_node", "var_name", "special")
+
+    def __init__(self, call, proc_node, special):
+        self.call = call
+        self.proc_node = proc_node
+        self.var_name = proc_node.var_name
+        self.special = special
+
+        self.source = call.source
+        self.start = call.start
+        self.end = call.end
@@ -0,0 +1,172 @@
+import core.constant as cc
+from core.types.number import (
+    Number,
+    TRUE,
+    FALSE,
+    MINUS_ONE,
+    number,
+    add,
+    subtract,
+    multiply,
+    divide,
+    power,
+    negate,
+)
+from core.types.string import String
+from core.types.list import List
+
+# Every BinOpNode and UnaryOpNode is given the table of its operator when it
+# is built. A binary table maps the types of the two operands to the function
+# running the operator on them, a unary one the type of the operand. A pair
+# nothing is registered for calls the method of the left value like values
+# always did, so every error and crash stays the one the method makes.
+
+# Value method behind every binary operator, by token kind or keyword
+BINARY_METHODS = {
+    cc.TT_PLUS: "added_to",
+    cc.TT_MINUS: "subbed_by",
+    cc.TT_MUL: "multed_by",
+    cc.TT_DIV: "dived_by",
+    cc.TT_POW: "raised_to",
+    cc.TT_EE: "get_comparison_eq",
+    cc.TT_NE: "get_comparison_ne",
+    cc.TT_LT: "get_comparison_lt",
+    cc.TT_GT: "get_comparison_gt",
+    cc.TT_LTE: "get_comparison_lte",
+    cc.TT_GTE: "get_comparison_gte",
+    "AND": "anded_by",
+    "OR": "ored_by",
+    "XOR": "xored_by",
+}
+
+
+class BinaryTable(dict):
+    """Implementations of a binary operator by (left type, right type)"""
+
+    def __init__(self, method_name, implementations):
+        super().__init__(implementations)
+        self.method_name = method_name
+
+    def __missing__(self, types):
+        method_name = self.method_name
+
+        def method(left, right):
+            return getattr(left, method_name)(right)
+
+        self[types] = method
+        return method
+
+
+class UnaryTable(dict):
+    """Implementations of a unary operator by operand type"""
+
+    def __init__(self, fallback, implementations):
+        super().__init__(implementations)
+        self.fallback = fallback
+
+    def __missing__(self, operand_type):
+        self[operand_type] = self.fallback
+        return self.fallback
+
+
+def equal(left, right):
+    return TRUE if left.value == right.value else FALSE
+
+
+def not_equal(left, right):
+    return TRUE if left.value != right.value else FALSE
+
+
+def less(left, right):
+    return TRUE if left.value < right.value else FALSE
+
+
+def greater(left, right):
+    return TRUE if left.value > right.value else FALSE
+
+
+def less_equal(left, right):
+    return TRUE if left.value <= right.value else FALSE
+
+
+def greater_equal(left, right):
+    return TRUE if left.value >= right.value else FALSE
+
+
+def and_(left, right):
+    return number(int(left.value and right.value))
+
+
+def or_(left, right):
+    return number(int(left.value or right.value))
+
+
+def xor(left, right):
+    return number(int(left.value ^ right.value))
+
+
+def concatenate(left, right):
+    return String(left.value + right.value)
+
+
+def repeat(left, right):
+    return String(left.value * right.value)
+
+
+def append(left, right):
+    return List(left.elements + [right])
+
+
+NUMBERS = (Number, Number)
+
+BINARY_IMPLEMENTATIONS = {
+    cc.TT_PLUS: {
+        NUMBERS: add,
+        (String, String): concatenate,
+        (List, Number): append,
+        (List, String): append,
+        (List, List): append,
+    },
+    cc.TT_MINUS: {NUMBERS: subtract},
+    cc.TT_MUL: {NUMBERS: multiply, (String, Number): repeat},
+    cc.TT_DIV: {NUMBERS: divide},
+    cc.TT_POW: {NUMBERS: power},
+    cc.TT_EE: {NUMBERS: equal},
+    cc.TT_NE: {NUMBERS: not_equal},
+    cc.TT_LT: {NUMBERS: less},
+    cc.TT_GT: {NUMBERS: greater},
+    cc.TT_LTE: {NUMBERS: less_equal},
+    cc.TT_GTE: {NUMBERS: greater_equal},
+    "AND": {NUMBERS: and_},
+    "OR": {NUMBERS: or_},
+    "XOR": {NUMBERS: xor},
+}
+
+BINARY_TABLES = {
+    op: BinaryTable(BINARY_METHODS[op], implementations)
+    for op, implementations in BINARY_IMPLEMENTATIONS.items()
+}
+
+
+def minus(operand):
+    return operand.multed_by(MINUS_ONE)
+
+
+def not_(operand):
+    return operand.notted()
+
+
+def identity(operand):
+    return operand
+
+
+def logical_not(operand):
+    return TRUE if operand.value == 0 else FALSE
+
+
+UNARY_TABLES = {
+    cc.TT_MINUS: UnaryTable(minus, {Number: negate}),
+    "NOT": UnaryTable(not_, {Number: logical_not}),
+    # +x is x
+    cc.TT_PLUS: UnaryTable(identity, {}),
+}
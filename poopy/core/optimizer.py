@@ -0,0 +1,831 @@
+import itertools
+import operator
+
+import core.constant as cc
+from core.types.number import Number
+from core.types.string import String
+from core.nodes import (
+    NumberNode,
+    StringNode,
+    BinOpNode,
+    UnaryOpNode,
+    VarAssignNode,
+    VarAccessNode,
+    ListNode,
+    IfNode,
+    ForNode,
+    ProcNode,
+    CallNode,
+    InvariantNode,
+    InductionNode,
+    NumericNode,
+    InlineCallNode,
+    SpecialCallNode,
+    op_name,
+)
+from core.cache import children, copy_tree
+from core.parser import Parser
+from core.hoisting import plain_number
+from core.resolver import resolve, bound_names
+from core.inference import infer, infer_body, typed_args
+
+# 0 runs the tree as parsed, 1 folds constants, prunes IF branches, drops
+# statements without effect and resolves PROC locals to slots, 2 also hoists loop invariants, reduces
+# induction expressions, inlines small PROCs, specialises the others on
+# literal or numeric args and evaluates the expressions core.inference
+# proves numeric on plain values
+OPT_LEVELS = (0, 1, 2)
+DEFAULT_OPT_LEVEL = 2
+
+# operators whose result goes through core.types.number.noice
+ARITHMETIC = {
+    cc.TT_PLUS: operator.add,
+    cc.TT_MINUS: operator.sub,
+    cc.TT_MUL: operator.mul,
+    cc.TT_DIV: operator.truediv,
+    cc.TT_POW: operator.pow,
+}
+
+# folds that would build huge values are left to run time
+MAX_FOLDED_EXPONENT = 64
+MAX_FOLDED_STRING = 4096
+
+LITERALS = (NumberNode, StringNode)
+
+# slots of hoisted invariants, unique across every tree of the process
+INVARIANT_SLOTS = itertools.count()
+
+# PROC bodies up to this many nodes are inlined, deferred bodies are only
+# parsed for it up to this many tokens
+INLINE_MAX_NODES = 16
+INLINE_MAX_TOKENS = 40
+
+# specialised copies a PROC gets at most, calls with other args run the
+# PROC as written
+SPECIALIZE_MAX = 4
+
+
+def global_constants(node, symbol_table):
+    """
+    Values of the globals a program only reads, by name. A program that
+    can reach POOP_RUN has none, the file it runs may assign any global.
+    """
+    assigned = set()
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type is VarAccessNode and node.var_name == "POOP_RUN":
+            return {}
+        if node_type in (VarAssignNode, ForNode) or (node_type is ProcNode and node.var_name):
+            assigned.add(node.var_name)
+        if node_type is ProcNode:
+            if node.body_node is None:
+                if "POOP_RUN" in node.body_tokens.values:
+                    return {}
+            # a PROC body assigns into its own symbol table
+            elif reaches_poop_run(node.body_node):
+                return {}
+            continue
+        nodes.extend(children(node))
+
+    constants = {}
+    for name, value in symbol_table.symbols.items():
+        if name in assigned:
+            continue
+        if type(value) is Number and plain_number(value.value):
+            constants[name] = value.value
+        elif type(value) is String and type(value.value) is str:
+            constants[name] = value.value
+    return constants
+
+
+def reaches_poop_run(node):
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is VarAccessNode and node.var_name == "POOP_RUN":
+            return True
+        if type(node) is ProcNode and node.body_node is None:
+            if "POOP_RUN" in node.body_tokens.values:
+                return True
+        nodes.extend(children(node))
+    return False
+
+
+def assigned_names(node):
+    """Names a body assigns in its own scope, PROC bodies have their own"""
+    names = set()
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type in (VarAssignNode, ForNode):
+            names.add(node.var_name)
+        elif node_type is ProcNode:
+            if node.var_name:
+                names.add(node.var_name)
+            continue
+        nodes.extend(children(node))
+    return names
+
+
+def enclosing_names(scope):
+    """Names bound by the scopes around a resolved Scope, innermost last"""
+    names = []
+    scope = scope.parent if scope is not None else None
+    while scope is not None:
+        names.append(scope.names)
+        scope = scope.parent
+    return names[::-1]
+
+
+def has_calls(node):
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type is CallNode:
+            return True
+        if node_type is not ProcNode:
+            nodes.extend(children(node))
+    return False
+
+
+def map_children(node, func):
+    """
+    Replaces every child of a statement like node that runs in its scope
+    by func(child), a PROC body or an inlined body is not one of them
+    """
+    node_type = type(node)
+    if node_type is VarAssignNode:
+        node.value_node = func(node.value_node)
+    elif node_type is ListNode:
+        node.element_nodes = [func(element) for element in node.element_nodes]
+    elif node_type is IfNode:
+        node.cases = [
+            (func(condition), func(case), should_return_null)
+            for condition, case, should_return_null in node.cases
+        ]
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            node.else_case = (func(expr), should_return_null)
+    elif node_type is ForNode:
+        node.start_value_node = func(node.start_value_node)
+        node.end_value_node = func(node.end_value_node)
+        if node.step_value_node:
+            node.step_value_node = func(node.step_value_node)
+        node.body_node = func(node.body_node)
+    elif node_type is CallNode:
+        node.node_to_call = func(node.node_to_call)
+        node.arg_nodes = [func(arg_node) for arg_node in node.arg_nodes]
+    elif node_type in (InlineCallNode, SpecialCallNode):
+        node.call.arg_nodes = [func(arg_node) for arg_node in node.call.arg_nodes]
+
+
+def count_nodes(node):
+    count = 0
+    nodes = [node]
+    while nodes:
+        count += 1
+        nodes.extend(children(nodes.pop()))
+    return count
+
+
+def top_level_procs(node):
+    """
+    The top level PROCs of a program whose calls the optimizer may rewrite,
+    by name, those whose name nothing else assigns
+    """
+    definitions = {}
+    assigned = set()
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type is ProcNode:
+            if node.var_name:
+                definitions.setdefault(node.var_name, []).append(node)
+            continue
+        if node_type in (VarAssignNode, ForNode):
+            assigned.add(node.var_name)
+        nodes.extend(children(node))
+
+    return {
+        name: procs[0]
+        for name, procs in definitions.items()
+        if len(procs) == 1 and name not in assigned
+    }
+
+
+def inline_candidates(procs):
+    """
+    The PROCs of top_level_procs that are inlined, with a small body that
+    does not call them. The body is a fresh copy, calls get their own copy.
+    """
+    candidates = {}
+    for name, proc_node in procs.items():
+        body = body_copy(proc_node, INLINE_MAX_TOKENS)
+        if body is not None and count_nodes(body) <= INLINE_MAX_NODES and not calls_name(body, name):
+            candidates[name] = (proc_node, body)
+    return candidates
+
+
+def body_copy(proc_node, max_tokens=None):
+    """
+    A copy of the body of a PROC, None when it does not parse or a deferred
+    body has more than max_tokens tokens
+    """
+    if proc_node.body_node is not None:
+        return copy_tree(proc_node.body_node)
+    if max_tokens is not None and len(proc_node.body_tokens) > max_tokens:
+        return None
+    # the PROC itself stays deferred, its calls parse it as usual
+    ast = Parser(proc_node.body_tokens).proc_body(multi_line=proc_node.should_return_null)
+    return None if ast.error else ast.node
+
+
+def calls_name(node, name):
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is CallNode:
+            callee = node.node_to_call
+            if type(callee) is VarAccessNode and callee.var_name == name:
+                return True
+        nodes.extend(children(node))
+    return False
+
+
+def read_names(node):
+    """Names a body reads in its own scope"""
+    names = set()
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type is VarAccessNode:
+            names.add(node.var_name)
+        elif node_type is not ProcNode:
+            nodes.extend(children(node))
+    return names
+
+
+def literal_args(arg_names, arg_nodes, body):
+    """
+    The literal args of a call the body reads and never assigns, by name,
+    those its reads can be replaced with
+    """
+    assigned = assigned_names(body)
+    read = read_names(body)
+    literals = {}
+    for arg_name, arg_node in zip(arg_names, arg_nodes):
+        if type(arg_node) in LITERALS and arg_name in read and arg_name not in assigned:
+            literals[arg_name] = arg_node
+        else:
+            # a repeated arg name binds the last arg
+            literals.pop(arg_name, None)
+    return literals
+
+
+def substitute(node, literals):
+    """Replaces the reads of the args in literals by their literal value"""
+    node_type = type(node)
+    if node_type is VarAccessNode:
+        literal = literals.get(node.var_name)
+        if literal is None:
+            return node
+        return type(literal)(literal.value, node.source, node.start, node.end)
+    if node_type is BinOpNode:
+        node.left_node = substitute(node.left_node, literals)
+        node.right_node = substitute(node.right_node, literals)
+    elif node_type is UnaryOpNode:
+        node.node = substitute(node.node, literals)
+    else:
+        map_children(node, lambda child: substitute(child, literals))
+    return node
+
+
+def is_pure(node):
+    """Evaluating node can neither fail nor change anything"""
+    node_type = type(node)
+    if node_type in LITERALS:
+        return True
+    if node_type is ProcNode:
+        return not node.var_name
+    if node_type is ListNode:
+        return all(is_pure(element) for element in node.element_nodes)
+    if node_type is IfNode:
+        return not node.cases and (node.else_case is None or is_pure(node.else_case[0]))
+    return False
+
+
+def literal_node(value, node):
+    """A literal spanning node for a folded value, None if there is none"""
+    if type(value) is Number and plain_number(value.value):
+        return NumberNode(value.value, node.source, node.start, node.end)
+    if type(value) is String and len(str(value.value)) <= MAX_FOLDED_STRING:
+        return StringNode(value.value, node.source, node.start, node.end)
+    return None
+
+
+class Optimizer:
+    """
+    Rewrites a tree before it runs without changing what it prints, returns
+    or fails with. Literal operations and reads of the globals in constants
+    are folded, IF cases with a literal condition are pruned and literal
+    statements are dropped from bodies whose value is thrown away. Nothing
+    that errors, crashes or prints is folded, it is left for run time.
+    """
+
+    def __init__(self, level=DEFAULT_OPT_LEVEL, constants=None, keep_result=True, runs_files=True, whole_program=True):
+        self.level = level
+        self.constants = constants or {}
+        # whether nothing runs after the program, in the REPL a later line
+        # may assign a global a PROC body of this one reads
+        self.whole_program = whole_program
+        # whether the value of the program is used, the REPL prints it
+        self.keep_result = keep_result
+        # whether a call may be POOP_RUN, the file it runs may assign any global
+        self.runs_files = runs_files
+        # PROCs whose calls are inlined or specialised, see top_level_procs
+        self.procs = {}
+        self.inlinable = {}
+        # specialised ProcNode by (PROC, literal args), None if it has none
+        self.specialized = {}
+        self.specializations = {}
+        # top level PROC bodies by ProcNode before they were optimized
+        self.parsed_bodies = {}
+        # names bound by each PROC body the visited node is in, innermost
+        # last. A read of a name one of them binds is not a global, it is
+        # not folded and a call through it is not rewritten.
+        self.scopes = []
+
+    def optimize(self, node):
+        if not self.level:
+            return node
+        if self.level >= 2:
+            self.procs = top_level_procs(node)
+            self.inlinable = inline_candidates(self.procs)
+        if type(node) is ListNode and not self.keep_result:
+            node = self.statements(node)
+        else:
+            node = self.visit(node)
+        if self.level >= 2:
+            node = infer(node, self.runs_files, self.typed_call)
+        resolve(node)
+        return node
+
+    def optimize_body(self, proc_node, numeric_args=frozenset(), enclosing=None):
+        """
+        Optimizes a PROC body, used once a deferred body is parsed. The args
+        in numeric_args are typed as numbers. enclosing are the names bound
+        by the bodies the PROC is defined in, by default those of the scopes
+        around its Scope, a deferred body is resolved before it is parsed.
+        """
+        if enclosing is None:
+            enclosing = enclosing_names(proc_node.scope)
+        body = self.scoped_body(proc_node.body_node, proc_node.arg_names, proc_node.should_return_null, enclosing)
+        if self.level >= 2:
+            body = infer_body(body, proc_node.arg_names, numeric_args)
+        return body
+
+    def scoped_body(self, body, arg_names, should_return_null, enclosing):
+        """Optimizes a body binding arg_names in the scopes enclosing"""
+        names, _ = bound_names(body, arg_names)
+        scopes, self.scopes = self.scopes, enclosing + [names]
+        try:
+            return self.body(body, should_return_null)
+        finally:
+            self.scopes = scopes
+
+    def is_bound(self, name):
+        """Whether a PROC body the visited node is in binds name"""
+        return any(name in names for names in self.scopes)
+
+    def visit(self, node):
+        return getattr(self, f"visit_{type(node).__name__}")(node)
+
+    def body(self, node, should_return_null):
+        # a body that returns null throws the value of its statements away
+        if should_return_null and type(node) is ListNode:
+            return self.statements(node)
+        return self.visit(node)
+
+    def statements(self, node):
+        elements = [self.visit(element) for element in node.element_nodes]
+        node.element_nodes = [element for element in elements if not is_pure(element)]
+        return node
+
+    def visit_NumberNode(self, node):
+        return node
+
+    visit_StringNode = visit_NumberNode
+
+    def visit_VarAccessNode(self, node):
+        if node.var_name not in self.constants:
+            return node
+        if self.scopes and (not self.whole_program or self.is_bound(node.var_name)):
+            return node
+        value = self.constants[node.var_name]
+        literal = NumberNode if type(value) is not str else StringNode
+        return literal(value, node.source, node.start, node.end)
+
+    def visit_ListNode(self, node):
+        node.element_nodes = [self.visit(element) for element in node.element_nodes]
+        return node
+
+    def visit_BinOpNode(self, node):
+        node.left_node = self.visit(node.left_node)
+        node.right_node = self.visit(node.right_node)
+        if type(node.left_node) not in LITERALS or type(node.right_node) not in LITERALS:
+            return node
+        return self.fold_binary(node) or node
+
+    def fold_binary(self, node):
+        left = node.left_node.constant
+        right = node.right_node.constant
+        op = node.op
+
+        if type(left) is Number and type(right) is Number and op in ARITHMETIC:
+            l, r = left.value, right.value
+            if op == cc.TT_DIV and r == 0:
+                return None
+            if op == cc.TT_POW and abs(r) > MAX_FOLDED_EXPONENT:
+                return None
+            try:
+                value = ARITHMETIC[op](l, r)
+            except (ArithmeticError, ValueError):
+                return None
+            if not plain_number(value):
+                return None
+        elif type(left) is String and op == cc.TT_MUL:
+            if type(left.value) is not str or type(right) is not Number or type(right.value) is not int:
+                return None
+            if len(left.value) * right.value > MAX_FOLDED_STRING:
+                return None
+
+        try:
+            result = node.operation[type(left), type(right)](left, right)
+        except Exception:
+            # an error or a crash, it has to happen when the program runs
+            return None
+        return literal_node(result, node)
+
+    def visit_UnaryOpNode(self, node):
+        node.node = self.visit(node.node)
+        operand = node.node
+        if type(operand) is not NumberNode:
+            return node
+
+        if node.op == cc.TT_MINUS:
+            value = operand.value * -1
+        elif node.op == "NOT":
+            value = 1 if operand.value == 0 else 0
+        else:
+            value = operand.value
+        if not plain_number(value):
+            return node
+        return NumberNode(value, node.source, node.start, node.end)
+
+    def visit_VarAssignNode(self, node):
+        node.value_node = self.visit(node.value_node)
+        return node
+
+    def visit_IfNode(self, node):
+        cases = []
+        else_case = node.else_case
+        for condition, case, should_return_null in node.cases:
+            condition = self.visit(condition)
+            case = self.body(case, should_return_null)
+            truth = self.truth(condition)
+            if truth is None:
+                cases.append((condition, case, should_return_null))
+            elif truth:
+                # the remaining cases can never be reached
+                else_case = (case, should_return_null)
+                break
+        else:
+            if else_case:
+                expr, should_return_null = else_case
+                else_case = (self.body(expr, should_return_null), should_return_null)
+
+        if not cases and else_case and not else_case[1]:
+            return else_case[0]
+        node.cases = cases
+        node.else_case = else_case
+        return node
+
+    def truth(self, node):
+        """is_true of a literal condition, None when it is only known at run time"""
+        if type(node) is NumberNode:
+            return node.value != 0
+        if type(node) is StringNode and type(node.value) is str:
+            return len(node.value) > 0
+        return None
+
+    def visit_ForNode(self, node):
+        node.start_value_node = self.visit(node.start_value_node)
+        node.end_value_node = self.visit(node.end_value_node)
+        if node.step_value_node:
+            node.step_value_node = self.visit(node.step_value_node)
+        node.body_node = self.body(node.body_node, node.should_return_null)
+        if self.level >= 2 and (not self.runs_files or not has_calls(node.body_node)):
+            LoopOptimizer(node).optimize()
+        return node
+
+    def visit_ProcNode(self, node):
+        if node.body_node is None:
+            # optimized by parse_body once the PROC is first called
+            node.optimizer = self
+            return node
+        if self.procs.get(node.var_name) is node:
+            # specialised copies start from the body as parsed
+            self.parsed_bodies[node] = copy_tree(node.body_node)
+        node.body_node = self.optimize_body(node, enclosing=self.scopes)
+        return node
+
+    def visit_CallNode(self, node):
+        node.node_to_call = self.visit(node.node_to_call)
+        node.arg_nodes = [self.visit(arg_node) for arg_node in node.arg_nodes]
+
+        # a body binding the name calls its own value, not the top level PROC
+        callee = node.node_to_call
+        if type(callee) is not VarAccessNode or callee.var_name not in self.procs or self.is_bound(callee.var_name):
+            return node
+        proc_node = self.procs[callee.var_name]
+        if len(node.arg_nodes) != len(proc_node.arg_names):
+            # the call fails, it is left to report that
+            return node
+        if callee.var_name in self.inlinable:
+            return self.inline(node)
+        return self.specialize(node, proc_node)
+
+    def inline(self, node):
+        """
+        Copies the body of the called PROC into the call, reads of args that
+        are passed a literal and never assigned become that literal
+        """
+        proc_node, body = self.inlinable[node.node_to_call.var_name]
+        body = copy_tree(body)
+        literals = literal_args(proc_node.arg_names, node.arg_nodes, body)
+        if literals:
+            body = substitute(body, literals)
+
+        # the PROC is defined at the top level, wherever it is called
+        body = self.scoped_body(body, proc_node.arg_names, proc_node.should_return_null, [])
+        return InlineCallNode(node, proc_node, body)
+
+    def specialize(self, node, proc_node):
+        """
+        Points a call with literal args to a copy of the PROC with those args
+        folded in. Calls with the same literal args share the copy.
+        """
+        signature = tuple(
+            (type(arg_node.value), arg_node.value) if type(arg_node) in LITERALS else None
+            for arg_node in node.arg_nodes
+        )
+        if signature.count(None) == len(signature):
+            return node
+
+        return self.special_call(node, proc_node, signature)
+
+    def typed_call(self, node, numeric_args):
+        """
+        Points a call passing numbers to a copy of the PROC whose body is
+        typed with those args numeric. Calls passing numbers as the same
+        args share the copy.
+        """
+        callee = node.node_to_call
+        if type(callee) is not VarAccessNode or callee.var_name not in self.procs:
+            return node
+        proc_node = self.procs[callee.var_name]
+        if callee.var_name in self.inlinable or len(node.arg_nodes) != len(proc_node.arg_names):
+            return node
+        return self.special_call(node, proc_node, typed_args(proc_node.arg_names, numeric_args))
+
+    def special_call(self, node, proc_node, signature):
+        """
+        The SpecialCallNode of a call with the specialised copy of the PROC
+        for signature, a tuple of literal args or a frozenset of numeric
+        arg names. node when the PROC gets no copy for it.
+        """
+        key = (proc_node, signature)
+        if key not in self.specialized:
+            count = self.specializations.get(proc_node, 0)
+            if count >= SPECIALIZE_MAX:
+                return node
+            self.specializations[proc_node] = count + 1
+            # a call in the copy with the same args calls the PROC as written
+            self.specialized[key] = None
+            self.specialized[key] = self.specialization(proc_node, node.arg_nodes, signature)
+
+        special = self.specialized[key]
+        if special is None:
+            return node
+        return SpecialCallNode(node, proc_node, special)
+
+    def specialization(self, proc_node, arg_nodes, signature):
+        if proc_node in self.parsed_bodies:
+            body = copy_tree(self.parsed_bodies[proc_node])
+        else:
+            body = body_copy(proc_node)
+        if body is None:
+            return None
+        numeric_args = frozenset()
+        if type(signature) is frozenset:
+            # the args are only known to be numbers, the body stays as written
+            numeric_args = signature & read_names(body)
+            if not numeric_args:
+                return None
+        else:
+            literals = literal_args(proc_node.arg_names, arg_nodes, body)
+            if not literals:
+                return None
+            body = substitute(body, literals)
+        special = ProcNode(
+            proc_node.var_name,
+            proc_node.arg_names,
+            body,
+            proc_node.should_return_null,
+            proc_node.source,
+            proc_node.start,
+        )
+        special.body_node = self.optimize_body(special, numeric_args, [])
+        return special
+
+
+# expressions worth caching, a lone literal or variable read is not
+HOISTABLE = (BinOpNode, UnaryOpNode, InvariantNode)
+INDUCTION_OPS = (cc.TT_PLUS, cc.TT_MINUS, cc.TT_MUL, cc.TT_POW)
+
+
+class LoopOptimizer:
+    """
+    Hoists the invariant expressions of a loop body and reduces the
+    expressions on its loop variable. An invariant is made of numbers and
+    variables the body never assigns. It is still evaluated where it is
+    written, by the first iteration that gets there, and only its value is
+    reused afterwards, so a loop that never reaches it evaluates nothing
+    and every error and noice happens where it always did.
+
+    An induction expression combines the loop variable with an int, as in
+    i * k, i + 1 or i ^ 2. It is worked out from the plain value of the loop
+    variable, i ^ 2 as i * i, without evaluating its operands.
+    """
+
+    def __init__(self, node):
+        self.loop = node
+        self.var_name = node.var_name
+        assigned = assigned_names(node.body_node)
+        # the body may set the loop variable to anything
+        self.counter_assigned = node.var_name in assigned
+        # names whose value may differ between iterations
+        self.assigned = assigned | {node.var_name}
+        self.slots = []
+
+    def optimize(self):
+        loop = self.loop
+        loop.body_node = self.expression(loop.body_node)
+        loop.hoisted = tuple(self.slots)
+
+    def expression(self, node):
+        """Rewrites an expression whose value is not combined by an operator"""
+        node, invariant = self.visit(node)
+        return self.hoist(node, invariant)
+
+    def hoist(self, node, invariant):
+        if not invariant or type(node) not in HOISTABLE:
+            return node
+        slot = f"${next(INVARIANT_SLOTS)}"
+        self.slots.append(slot)
+        return InvariantNode(node, slot)
+
+    def visit(self, node):
+        """Returns the rewritten node and whether it is invariant"""
+        node_type = type(node)
+
+        if node_type is NumberNode:
+            return node, True
+        if node_type is VarAccessNode:
+            return node, node.var_name not in self.assigned
+        if node_type is BinOpNode:
+            if self.operands(node):
+                return node, True
+            return self.induction(node), False
+        if node_type in (UnaryOpNode, InvariantNode):
+            node.node, invariant = self.visit(node.node)
+            return node, invariant
+        if node_type is InductionNode:
+            self.operands(node.node)
+            return node, False
+
+        # a PROC body runs in a scope of its own, strings are never cached
+        map_children(node, self.expression)
+        return node, False
+
+    def operands(self, node):
+        """
+        Rewrites the operands of a BinOpNode, hoisting the invariant one when
+        the other is not. Returns whether both are invariant.
+        """
+        left, left_invariant = self.visit(node.left_node)
+        right, right_invariant = self.visit(node.right_node)
+        if left_invariant and right_invariant:
+            node.left_node, node.right_node = left, right
+            return True
+        node.left_node = self.hoist(left, left_invariant)
+        node.right_node = self.hoist(right, right_invariant)
+        return False
+
+    def is_counter(self, node):
+        return type(node) is VarAccessNode and node.var_name == self.var_name
+
+    def induction(self, node):
+        if node.op not in INDUCTION_OPS or self.counter_assigned:
+            return node
+
+        if self.is_counter(node.left_node):
+            var_left, other = True, node.right_node
+        elif self.is_counter(node.right_node) and node.op != cc.TT_POW:
+            var_left, other = False, node.left_node
+        else:
+            return node
+
+        other_type = type(other)
+        if node.op == cc.TT_POW:
+            if other_type is not NumberNode or other.value != 2 or type(other.value) is not int:
+                return node
+        elif other_type is NumberNode:
+            if type(other.value) is not int:
+                return node
+        elif other_type is VarAccessNode:
+            if other.var_name in self.assigned:
+                return node
+        elif other_type is not InvariantNode:
+            return node
+        return InductionNode(node, self.var_name, var_left)
+
+
+def dump_ast(node, indent=0):
+    """Indented listing of a tree, one node per line"""
+    pad = "  " * indent
+    node_type = type(node)
+    name = node_type.__name__
+
+    if node_type in LITERALS:
+        return f"{pad}{name} {node!r}"
+    if node_type is VarAccessNode:
+        if node.depth is None:
+            return f"{pad}{name} {node.var_name}"
+        if node.depth == 0:
+            return f"{pad}{name} {node.var_name} (slot {node.slot})"
+        return f"{pad}{name} {node.var_name} (slot {node.slot}, {node.depth} out)"
+    if node_type is InvariantNode:
+        head = f"{pad}{name} {node.slot}"
+    elif node_type is InductionNode:
+        head = f"{pad}{name} {node.var_name}"
+    elif node_type is NumericNode:
+        head = f"{pad}{name} ({', '.join(leaf.var_name for leaf in node.leaves)})"
+    elif node_type is BinOpNode:
+        head = f"{pad}{name} {op_name(node.op)}"
+    elif node_type is UnaryOpNode:
+        head = f"{pad}{name} {op_name(node.op)}"
+    elif node_type is VarAssignNode:
+        head = f"{pad}{name} {node.var_name}"
+        if node.slot is not None:
+            head += f" (slot {node.slot})"
+    elif node_type is InlineCallNode:
+        lines = [f"{pad}{name} {node.var_name}"]
+        lines.extend(dump_ast(arg_node, indent + 1) for arg_node in node.call.arg_nodes)
+        lines.append(f"{pad}  body")
+        lines.append(dump_ast(node.body_node, indent + 2))
+        return "\n".join(lines)
+    elif node_type is SpecialCallNode:
+        lines = [f"{pad}{name} {node.var_name}"]
+        lines.extend(dump_ast(arg_node, indent + 1) for arg_node in node.call.arg_nodes)
+        lines.append(f"{pad}  specialized")
+        lines.append(dump_ast(node.special, indent + 2))
+        return "\n".join(lines)
+    elif node_type is ForNode:
+        head = f"{pad}{name} {node.var_name}"
+        if node.hoisted:
+            head += f" (hoisted: {', '.join(node.hoisted)})"
+    elif node_type is ProcNode:
+        head = f"{pad}{name} {node.var_name or '<anonymous>'}({', '.join(node.arg_names)})"
+        if node.body_node is None:
+            return f"{head}\n{pad}  <deferred body>"
+    elif node_type is IfNode:
+        lines = [f"{pad}{name}"]
+        for condition, case, _ in node.cases:
+            lines.append(f"{pad}  case")
+            lines.append(dump_ast(condition, indent + 2))
+            lines.append(dump_ast(case, indent + 2))
+        if node.else_case:
+            lines.append(f"{pad}  else")
+            lines.append(dump_ast(node.else_case[0], indent + 2))
+        return "\n".join(lines)
+    else:
+        head = f"{pad}{name}"
+
+    return "\n".join([head] + [dump_ast(child, indent + 1) for child in children(node)])
@@ -1,5 +1,8 @@
+import gc
+
 import core.constant as cc
 from core.nodes import (
+    Node,
     NumberNode,
     BinOpNode,
     UnaryOpNode,
@@ -13,6 +16,45 @@ from core.nodes import (
     ListNode,
 )
 from core.error import InvalidSyntaxError, FeatureInProgress
+from core.position import Position
+
+# Binding power of every binary operator, indexed by token kind (0 = not one)
+PREC_COMPARISON = 1
+PREC_ARITH = 2
+PREC_TERM = 3
+PREC_POWER = 4
+
+BINARY_PRECEDENCE = [0] * len(cc.TT_NAMES)
+for _kind in (cc.TT_EE, cc.TT_NE, cc.TT_LT, cc.TT_LTE, cc.TT_GT, cc.TT_GTE):
+    BINARY_PRECEDENCE[_kind] = PREC_COMPARISON
+for _kind in (cc.TT_PLUS, cc.TT_MINUS):
+    BINARY_PRECEDENCE[_kind] = PREC_ARITH
+for _kind in (cc.TT_MUL, cc.TT_DIV):
+    BINARY_PRECEDENCE[_kind] = PREC_TERM
+BINARY_PRECEDENCE[cc.TT_POW] = PREC_POWER
+BINARY_PRECEDENCE = tuple(BINARY_PRECEDENCE)
+
+# Tokens an expression can start with, so statements are parsed predictively
+EXPR_START_TYPES = frozenset(
+    (
+        cc.TT_INT,
+        cc.TT_FLOAT,
+        cc.TT_STRING,
+        cc.TT_IDENTIFIER,
+        cc.TT_LPAREN,
+        cc.TT_LCURLY,
+        cc.TT_PLUS,
+        cc.TT_MINUS,
+    )
+)
+EXPR_START_KEYWORDS = frozenset(("BUCKET", "NOT", "IF", "LOOP", "PROC"))
+
+# Tokens that can only follow a complete expression, used when skimming
+EXPR_END_TYPES = frozenset(
+    (cc.TT_NEWLINE, cc.TT_EOF, cc.TT_COMMA, cc.TT_RPAREN, cc.TT_RCURLY)
+)
+EXPR_END_KEYWORDS = frozenset(("THEN", "ALTER", "ELSE", "TILL", "STEP", "DO", "END"))
+
 
 class ParseResult:
     """to add errors if any to Parser this would link to the Error class"""
@@ -20,764 +62,561 @@ class ParseResult:
     def __init__(self):
         self.error = None
         self.node = None
-        self.advance_count = 0
-        self.to_reverse_count = 0
-
-    def register_advancement(self):
-        self.advance_count += 1
-
-    def register(self, res):
-        self.advance_count += res.advance_count
-        if res.error:
-            self.error = res.error
-
-        return res.node
 
     def success(self, node):
         self.node = node
         return self
 
     def failure(self, error):
-        if not self.error or self.advance_count == 0:
-            self.error = error
+        self.error = error
         return self
 
-    def try_register(self, res):
-        if res.error:
-            self.to_reverse_count = res.advance_count
-            return None
-        return self.register(res)
+
+class ParseError(Exception):
+    """Unwinds the parser on the first syntax error, carries the Error"""
+
+    def __init__(self, error):
+        super().__init__(error.details)
+        self.error = error
+
 
 class Parser:
-    def __init__(self, tokens):
+    """
+    Precedence climbing (Pratt) parser over a TokenStream.
+    Statements are chosen by looking at the current token only, nothing is
+    ever parsed twice. Nodes are built straight from the token arrays, no
+    Token object is materialised.
+    """
+
+    def __init__(self, tokens, strict=False):
         self.tokens = tokens
+        # PROC bodies are only skimmed and parsed on first call, unless strict
+        self.lazy = not strict
+        self.source = tokens.source
+        self.kinds = tokens.kinds
+        self.values = tokens.values
         self.tok_idx = -1
         self.advance()
 
     def advance(self):
-        self.tok_idx += 1
-        if self.tok_idx < len(self.tokens):
-            self.current_tok = self.tokens[self.tok_idx]
-        return self.current_tok
-
-    def reverse(self, rev_amount = 1):
-        self.tok_idx -= rev_amount
-        if self.tok_idx < len(self.tokens):
-            self.current_tok = self.tokens[self.tok_idx]
-        return self.current_tok
-
-    def parse(self):
-        res = self.stmts()
-        if not res.error and self.current_tok.value in cc.WORK_IN_PROGRESS:
-            return res.failure(
-                FeatureInProgress(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Will shortly be available for you ;)",
-                )
-            )
-        if not res.error and self.current_tok.type not in (
-            cc.TT_EOF,
-            # cc.TT_RPAREN,
-        ): 
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected '+', '-', '*', or '/'",
-                )
-            )
-        return res
-
-    def atom(self):
-        res = ParseResult()
-        tok = self.current_tok
-
-        if tok.type in (cc.TT_INT, cc.TT_FLOAT):
-            res.register_advancement()
-            self.advance()
-            return res.success(NumberNode(tok))
-        elif tok.type == cc.TT_IDENTIFIER:
-            res.register_advancement()
-            self.advance()
-            return res.success(VarAccessNode(tok))
-        elif tok.type == cc.TT_STRING:
-            res.register_advancement()
-            self.advance()
-            return res.success(StringNode(tok))
-        elif tok.type == cc.TT_LPAREN:
-            res.register_advancement()
-            self.advance()
-            expr = res.register(self.expr())
-            if res.error:
-                return res
-            if self.current_tok.type == cc.TT_RPAREN:
-                res.register_advancement()
-                self.advance()
-                return res.success(expr)
-            else:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected ')'",
-                    )
-                )
+        idx = self.tok_idx + 1
+        self.tok_idx = idx
+        if idx < len(self.kinds):
+            self.tok_type = self.kinds[idx]
+            self.tok_value = self.values[idx]
+        else:
+            self.sync()
 
-        elif tok.type == cc.TT_LCURLY:
-            list_expr = res.register(self.list_expr())
-            if res.error:
-                return res
-            return res.success(list_expr)
-            
-        elif tok.matches(cc.TT_KEYWORD, "IF"):
-            if_expr = res.register(self.if_expr())
-            if res.error:
-                return res
-            return res.success(if_expr)
-
-        elif tok.matches(cc.TT_KEYWORD, "LOOP"):
-            for_expr = res.register(self.for_expr())
-            if res.error:
-                return res
-            return res.success(for_expr)
-
-        elif tok.matches(cc.TT_KEYWORD, "PROC"):
-            proc_def = res.register(self.proc_def())
-            if res.error:
-                return res
-            return res.success(proc_def)
-
-        res.failure(
-            InvalidSyntaxError(
-                self.current_tok.pos_start,
-                self.current_tok.pos_end,
-                "Expected int, float, identifier, '+', '-',or '('",
-            )
-        )
+    def sync(self):
+        if self.tok_idx >= len(self.kinds) and self.tokens.pull:
+            self.tokens.pull(self.tok_idx + 1)
+        # past the end the parser keeps looking at the EOF token
+        idx = min(self.tok_idx, len(self.kinds) - 1)
+        self.tok_type = self.kinds[idx]
+        self.tok_value = self.values[idx]
 
-    def power(self):
-        return self.bin_op(self.call, (cc.TT_POW), self.factor)
+    def tok_matches(self, type_, value):
+        return self.tok_type == type_ and self.tok_value == value
 
-    def call(self):
-        res = ParseResult()
-        atom = res.register(self.atom())
+    def tok_start(self):
+        return self.tokens.starts[min(self.tok_idx, len(self.kinds) - 1)]
 
-        if res.error:
-            return res
+    def tok_end(self):
+        return self.tokens.ends[min(self.tok_idx, len(self.kinds) - 1)]
 
-        if self.current_tok.type == cc.TT_LPAREN:
-            res.register_advancement()
-            self.advance()
-            arg_nodes = []
+    def tok_pos_start(self):
+        return Position(self.tok_start(), self.source)
 
-            if self.current_tok.type == cc.TT_RPAREN:
-                res.register_advancement()
-                self.advance()
-            else:
-                arg_nodes.append(res.register(self.expr()))
-                if res.error:
-                    return res.failure(
-                        InvalidSyntaxError(
-                            self.current_tok.pos_start,
-                            self.current_tok.pos_end,
-                            "Expected ')', 'BUCKET', int, float, identifier",
-                        )
-                    )
-
-                while self.current_tok.type == cc.TT_COMMA:
-                    res.register_advancement()
-                    self.advance()
+    def tok_pos_end(self):
+        return Position(self.tok_end(), self.source)
 
-                    arg_nodes.append(res.register(self.expr()))
+    def can_start_expr(self):
+        if self.tok_type == cc.TT_KEYWORD:
+            return self.tok_value in EXPR_START_KEYWORDS
+        return self.tok_type in EXPR_START_TYPES
 
-                    if res.error:
-                        return res
+    def fail(self, details):
+        raise ParseError(
+            InvalidSyntaxError(self.tok_pos_start(), self.tok_pos_end(), details)
+        )
 
-                if self.current_tok.type != cc.TT_RPAREN:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        f"Expected ',' or ')'"
-                    ))
+    def expect(self, type_, details):
+        if self.tok_type != type_:
+            self.fail(details)
+        self.advance()
 
-                res.register_advancement()
-                self.advance()
+    def expect_keyword(self, keyword):
+        if not self.tok_matches(cc.TT_KEYWORD, keyword):
+            self.fail(f"Expected '{keyword}'")
+        self.advance()
 
-            return res.success(CallNode(atom, arg_nodes))
+    def skip_newlines(self):
+        while self.tok_type == cc.TT_NEWLINE:
+            self.advance()
 
-        return res.success(atom)
+    def release(self):
+        """Forgets every token before the current one"""
+        count = min(self.tok_idx, len(self.kinds) - 1)
+        self.tokens.discard(count)
+        self.tok_idx -= count
 
-    def factor(self):
+    def parse(self):
         res = ParseResult()
-        tok = self.current_tok
+        # the tree is many small acyclic objects, collecting while it grows
+        # only costs time
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            node = self.stmts(top_level=True)
+            self.expect_statement_end(cc.TT_EOF)
+        except ParseError as e:
+            return res.failure(e.error)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return res.success(node)
 
-        if tok.type in (cc.TT_PLUS, cc.TT_MINUS):
-            res.register_advancement()
-            self.advance()
-            factor = res.register(self.factor())
+    def next_statement(self):
+        """
+        Parses a single top level statement for the streaming runner, the
+        node is None once the stream is exhausted
+        """
+        res = ParseResult()
+        try:
+            self.skip_newlines()
+            if self.tok_type == cc.TT_EOF:
+                return res.success(None)
+            self.expect_statement_end(None)
+
+            stmt = self.expr()
+            self.expect_statement_end(cc.TT_NEWLINE)
+        except ParseError as e:
+            return res.failure(e.error)
+        return res.success(stmt)
+
+    def expect_statement_end(self, allowed):
+        if self.tok_type == allowed or self.tok_type == cc.TT_EOF:
+            return
+        if self.tok_value in cc.WORK_IN_PROGRESS:
+            raise ParseError(
+                FeatureInProgress(
+                    self.tok_pos_start(),
+                    self.tok_pos_end(),
+                    "Will shortly be available for you ;)",
+                )
+            )
+        if allowed is None and self.can_start_expr():
+            return
+        self.fail("Expected '+', '-', '*', or '/'")
 
-            if res.error:
-                return res
+    def stmts(self, top_level=False):
+        start = self.tok_start()
+        stmts = []
+        self.skip_newlines()
 
-            return res.success(UnaryOpNode(tok, factor))
+        if not top_level and not self.can_start_expr():
+            self.fail("Expected 'BUCKET', int, float, identifier, '+', '-', 'NOT',or '('")
 
-        return self.power()
+        while self.can_start_expr():
+            stmts.append(self.expr())
+            if self.tok_type != cc.TT_NEWLINE:
+                break
+            self.skip_newlines()
 
-    def term(self):
-        return self.bin_op(self.factor, (cc.TT_MUL, cc.TT_DIV))
+        return ListNode(stmts, self.source, start, self.tok_end())
 
-    def stmts(self):  # sourcery skip
-        res = ParseResult()
-        stmts = []
-        pos_start = self.current_tok.pos_start.copy()
-        while self.current_tok.type == cc.TT_NEWLINE:
-            res.register_advancement()
+    def expr(self):
+        if self.tok_matches(cc.TT_KEYWORD, "BUCKET"):
             self.advance()
-        
-        stmt = res.register(self.expr())
-        if res.error:
-            return res
-        stmts.append(stmt)
-
-        more_stmts = True
+            if self.tok_type != cc.TT_IDENTIFIER:
+                self.fail("Expected 'identifier'")
+            var_name = self.tok_value
+            start = self.tok_start()
+            self.advance()
+            self.expect(cc.TT_EQ, "Expected '='")
+            return VarAssignNode(var_name, self.expr(), self.source, start)
+
+        if not self.can_start_expr():
+            self.fail("Expected 'BUCKET', int, float, identifier, '+', '-', 'NOT',or '('")
+
+        # AND, OR and XOR are keywords without a binding power for now, the
+        # top level reports them as a feature in progress
+        return self.binary(PREC_COMPARISON)
+
+    def binary(self, min_prec):
+        # Prefix operators and left operands waiting for their operand are
+        # kept on an explicit stack instead of a call per operand, so a long
+        # run of '^' or of prefix operators can't exhaust the Python stack.
+        # A prefix entry is (min_prec, op, start), a binary one is
+        # (min_prec, op, left). min_prec is the one to go on with once the
+        # entry has its operand.
+        pending = []
+        precedence = BINARY_PRECEDENCE
 
         while True:
-            newline_count = 0
-            while self.current_tok.type == cc.TT_NEWLINE:
-                res.register_advancement()
+            if self.tok_matches(cc.TT_KEYWORD, "NOT") and min_prec <= PREC_COMPARISON:
+                pending.append((min_prec, "NOT", self.tok_start()))
                 self.advance()
-                newline_count +=1
-            
-            if newline_count == 0:
-                more_stmts = False
-
-            if not more_stmts:
-                break
-
-            stmt = res.try_register(self.expr())
-            if not stmt:
-                self.reverse(res.to_reverse_count)
-                more_stmts = False
+                min_prec = PREC_COMPARISON
+                continue
+            if self.tok_type == cc.TT_PLUS or self.tok_type == cc.TT_MINUS:
+                pending.append((min_prec, self.tok_type, self.tok_start()))
+                self.advance()
+                min_prec = PREC_POWER
                 continue
-            stmts.append(stmt)
-        return res.success(ListNode(stmts, pos_start, self.current_tok.pos_end.copy()))
 
-    def expr(self):
-        res = ParseResult()
+            operand = self.call()
 
-        if self.current_tok.matches(cc.TT_KEYWORD, "BUCKET"):
-            res.register_advancement()
-            self.advance()
-            if self.current_tok.type != cc.TT_IDENTIFIER:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected 'identifier'",
-                    )
-                )
+            while True:
+                prec = precedence[self.tok_type]
+                if prec >= min_prec and prec != 0:
+                    pending.append((min_prec, self.tok_type, operand))
+                    self.advance()
+                    # '^' is right associative, everything else associates left
+                    min_prec = prec if prec == PREC_POWER else prec + 1
+                    break
+                if not pending:
+                    return operand
+                min_prec, op, other = pending.pop()
+                if isinstance(other, Node):
+                    operand = BinOpNode(other, op, operand)
+                else:
+                    operand = UnaryOpNode(op, operand, self.source, other)
 
-            var_name = self.current_tok
-            res.register_advancement()
-            self.advance()
+    def call(self):
+        atom = self.atom()
 
-            if self.current_tok.type != cc.TT_EQ:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected '='",
-                    )
-                )
+        if self.tok_type != cc.TT_LPAREN:
+            return atom
 
-            res.register_advancement()
-            self.advance()
+        self.advance()
+        arg_nodes = []
 
-            expr = res.register(self.expr())
+        if self.tok_type == cc.TT_RPAREN:
+            self.advance()
+            return CallNode(atom, arg_nodes)
 
-            if res.error:
-                return res
+        if not self.can_start_expr():
+            self.fail("Expected ')', 'BUCKET', int, float, identifier")
 
-            return res.success(VarAssignNode(var_name, expr))
+        arg_nodes.append(self.expr())
+        while self.tok_type == cc.TT_COMMA:
+            self.advance()
+            arg_nodes.append(self.expr())
 
-        node = res.register(
-            self.bin_op(
-                self.comp_expr,
-                ((cc.TT_KEYWORD, "AND"), (cc.TT_KEYWORD, "OR"), (cc.TT_KEYWORD, "XOR")),
-            )
-        )
+        self.expect(cc.TT_RPAREN, "Expected ',' or ')'")
+        return CallNode(atom, arg_nodes)
 
-        if res.error:
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'BUCKET', int, float, identifier, '+', '-', 'NOT',or '('",
-                )
-            )
+    def atom(self):
+        tok_type = self.tok_type
 
-        return res.success(node)
+        if tok_type == cc.TT_INT or tok_type == cc.TT_FLOAT:
+            node = NumberNode(self.tok_value, self.source, self.tok_start(), self.tok_end())
+            self.advance()
+            return node
+        elif tok_type == cc.TT_IDENTIFIER:
+            node = VarAccessNode(self.tok_value, self.source, self.tok_start(), self.tok_end())
+            self.advance()
+            return node
+        elif tok_type == cc.TT_STRING:
+            node = StringNode(self.tok_value, self.source, self.tok_start(), self.tok_end())
+            self.advance()
+            return node
+        elif tok_type == cc.TT_LPAREN:
+            self.advance()
+            expr = self.expr()
+            self.expect(cc.TT_RPAREN, "Expected ')'")
+            return expr
+        elif tok_type == cc.TT_LCURLY:
+            return self.list_expr()
+        elif tok_type == cc.TT_KEYWORD:
+            if self.tok_value == "IF":
+                return self.if_expr()
+            elif self.tok_value == "LOOP":
+                return self.for_expr()
+            elif self.tok_value == "PROC":
+                return self.proc_def()
+
+        self.fail("Expected int, float, identifier, '+', '-',or '('")
 
     def list_expr(self):
-        res = ParseResult()
         element_nodes = []
-        pos_start = self.current_tok.pos_start.copy()
-        
-        if self.current_tok.type != cc.TT_LCURLY:
-            return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected '{'",
-                    )
-                )
-        res.register_advancement()
-        self.advance()
+        start = self.tok_start()
+        self.expect(cc.TT_LCURLY, "Expected '{'")
 
-        if self.current_tok.type == cc.TT_RCURLY:
-            res.register_advancement()
+        if self.tok_type == cc.TT_RCURLY:
             self.advance()
         else:
-            element_nodes.append(res.register(self.expr()))
-            if res.error:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected '}', 'BUCKET', int, float, identifier",
-                    )
-                )
+            if not self.can_start_expr():
+                self.fail("Expected '}', 'BUCKET', int, float, identifier")
 
-            while self.current_tok.type == cc.TT_COMMA:
-                res.register_advancement()
+            element_nodes.append(self.expr())
+            while self.tok_type == cc.TT_COMMA:
                 self.advance()
+                element_nodes.append(self.expr())
 
-                element_nodes.append(res.register(self.expr()))
+            self.expect(cc.TT_RCURLY, "Expected ',' or '}'")
 
-                if res.error:
-                    return res
+        return ListNode(element_nodes, self.source, start, self.tok_end())
 
-            if self.current_tok.type != cc.TT_RCURLY:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected ',' or '}'",
-                    )
-                )
-            res.register_advancement()
-            self.advance()
-
-        return res.success(ListNode(element_nodes, pos_start, self.current_tok.pos_end.copy()))
+    def block(self):
+        """NEWLINE already consumed, statements up to and including END"""
+        body = self.stmts()
+        self.expect_keyword("END")
+        return body
 
-    def comp_expr(self):
-        res = ParseResult()
-
-        if self.current_tok.matches(cc.TT_KEYWORD, "NOT"):
-            op_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-
-            node = res.register(self.comp_expr())
-            if res.error:
-                return res
-            return res.success(UnaryOpNode(op_tok, node))
+    def if_expr(self):
+        cases = []
+        else_case = None
+        case_keyword = "IF"
 
-        node = res.register(
-            self.bin_op(
-                self.arth_expr,
-                (cc.TT_EE, cc.TT_NE, cc.TT_GT, cc.TT_GTE, cc.TT_LT, cc.TT_LTE),
-            )
-        )
+        while True:
+            self.expect_keyword(case_keyword)
+            condition = self.expr()
+            self.expect_keyword("THEN")
 
-        if res.error:
-            res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected int, float, identifier, '+', '-','NOT', '('",
-                )
-            )
+            if self.tok_type == cc.TT_NEWLINE:
+                self.advance()
+                cases.append((condition, self.stmts(), True))
 
-        return res.success(node)
+                if self.tok_matches(cc.TT_KEYWORD, "END"):
+                    self.advance()
+                    return IfNode(cases, else_case)
+            else:
+                cases.append((condition, self.expr(), False))
 
-    def if_expr(self):
-        res = ParseResult()
-        all_cases = res.register(self.if_expr_cases("IF"))
+            if self.tok_matches(cc.TT_KEYWORD, "ALTER"):
+                case_keyword = "ALTER"
+                continue
 
-        if res.error: return res
-        cases, else_case = all_cases
+            if self.tok_matches(cc.TT_KEYWORD, "ELSE"):
+                self.advance()
+                if self.tok_type == cc.TT_NEWLINE:
+                    self.advance()
+                    else_case = (self.block(), True)
+                else:
+                    else_case = (self.expr(), False)
 
-        return res.success(IfNode(cases, else_case))
+            return IfNode(cases, else_case)
 
-    def if_expr_cases(self, case_keyword):
-        res = ParseResult()
-        cases = []
-        else_case = None
+    def for_expr(self):
+        self.expect_keyword("LOOP")
 
-        if not self.current_tok.matches(cc.TT_KEYWORD, case_keyword):
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    f"Expected '{case_keyword}'",
-                )
-            )
-        res.register_advancement()
+        if self.tok_type != cc.TT_IDENTIFIER:
+            self.fail("Expected 'identifier'")
+        var_name = self.tok_value
+        start = self.tok_start()
         self.advance()
 
-        condition = res.register(self.expr())
-        if res.error:
-            return res
+        self.expect(cc.TT_EQ, "Expected '='")
+        start_value = self.expr()
 
-        if not self.current_tok.matches(cc.TT_KEYWORD, "THEN"):
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'THEN'",
-                )
-            )
-
-        res.register_advancement()
-        self.advance()
+        self.expect_keyword("TILL")
+        end_value = self.expr()
 
-        #newline in if cases
-        if self.current_tok.type == cc.TT_NEWLINE:
-            res.register_advancement()
+        step_value = None
+        if self.tok_matches(cc.TT_KEYWORD, "STEP"):
             self.advance()
+            step_value = self.expr()
 
-            stmts = res.register(self.stmts())  # append to cases list
-            if res.error:
-                return res
-            cases.append((condition, stmts, True))
+        self.expect_keyword("DO")
 
-            if self.current_tok.matches(cc.TT_KEYWORD, "END"):
-                res.register_advancement()
-                self.advance()
-            else:
-                all_cases = res.register(self.if_expr_b_or_c())
-                if res.error: 
-                    return res
-                new_cases, else_case = all_cases
-                cases.extend(new_cases)
-        else:
-            expr = res.register(self.expr())
-            if res.error: 
-                return res
-            cases.append((condition, expr, False))
+        if self.tok_type == cc.TT_NEWLINE:
+            self.advance()
+            body = self.block()
+            return ForNode(var_name, start_value, end_value, step_value, body, True, self.source, start)
 
-            all_cases = res.register(self.if_expr_b_or_c())
-            if res.error: 
-                return res
-            new_cases, else_case = all_cases
-            cases.extend(new_cases)
+        body = self.expr()
+        return ForNode(var_name, start_value, end_value, step_value, body, False, self.source, start)
 
-        return res.success((cases, else_case))
+    def proc_header(self):
+        """PROC name(args) up to the ':' or NEWLINE, returns the multi line flag"""
+        self.expect_keyword("PROC")
 
-    def if_expr_b(self):
-        return self.if_expr_cases("ALTER")
+        if self.tok_type != cc.TT_IDENTIFIER:
+            self.fail("Expected 'identifier'")
+        var_name = self.tok_value
+        start = self.tok_start()
+        self.advance()
 
-    def if_expr_c(self):
-        res = ParseResult()
-        else_case = None
+        self.expect(cc.TT_LPAREN, "Expected '('")
 
-        if self.current_tok.matches(cc.TT_KEYWORD, "ELSE"):
-            res.register_advancement()
+        arg_names = []
+        if self.tok_type == cc.TT_IDENTIFIER:
+            arg_names.append(self.tok_value)
             self.advance()
 
-            if self.current_tok.type == cc.TT_NEWLINE:
-                res.register_advancement()
+            while self.tok_type == cc.TT_COMMA:
                 self.advance()
-
-                stmts = res.register(self.stmts())
-
-                if res.error:
-                    return res
-
-                else_case = (stmts, True)
-
-                if not self.current_tok.matches(cc.TT_KEYWORD, "END"):
-                    return res.failure(
-                        InvalidSyntaxError(
-                            self.current_tok.pos_start,
-                            self.current_tok.pos_end,
-                            "Expected 'THEN'",
-                        )
-                    )
-
-                res.register_advancement()
+                if self.tok_type != cc.TT_IDENTIFIER:
+                    self.fail("Expected 'identifier'")
+                arg_names.append(self.tok_value)
                 self.advance()
-            else:
-                expr = res.register(self.expr())
-                if res.error:
-                    return res
-                else_case = (expr, False)
-
-        return res.success(else_case)
-    
-    def if_expr_b_or_c(self):
-        res = ParseResult()
-
-        cases = []
-        else_case = None
-
-        if self.current_tok.matches(cc.TT_KEYWORD, "ALTER"):
-            all_cases = res.register(self.if_expr_b())
-
-            if res.error: 
-                return res
-            
-            cases, else_case = all_cases
 
+            self.expect(cc.TT_RPAREN, "Expected ')'")
         else:
-            else_case = res.register(self.if_expr_c())
-
-            if res.error: return res
-        
-        return res.success((cases, else_case))
-
-
-    def for_expr(self):
-        res = ParseResult()
+            self.expect(cc.TT_RPAREN, "Expected identifier or ')'")
 
-        if not self.current_tok.matches(cc.TT_KEYWORD, "LOOP"):
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'LOOP'",
-                )
-            )
-        res.register_advancement()
-        self.advance()
-
-        if self.current_tok.type != cc.TT_IDENTIFIER:
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'identifier'",
-                )
-            )
-
-        var_name = self.current_tok
-        res.register_advancement()
-        self.advance()
+        if self.tok_type == cc.TT_COLON:
+            self.advance()
+            return var_name, arg_names, start, False
 
-        if self.current_tok.type != cc.TT_EQ:
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected '='",
-                )
-            )
+        self.expect(cc.TT_NEWLINE, "Expected ':' or NEWLINE")
+        return var_name, arg_names, start, True
 
-        res.register_advancement()
-        self.advance()
+    def proc_def(self):
+        var_name, arg_names, start, multi_line = self.proc_header()
 
-        start_value = res.register(self.expr())
-        if res.error:
-            return res
+        if self.lazy:
+            body_tokens = self.skim_body(multi_line)
+            if body_tokens is not None:
+                return ProcNode(var_name, arg_names, None, multi_line, self.source, start, body_tokens)
 
-        if not self.current_tok.matches(cc.TT_KEYWORD, "TILL"):
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'TILL'",
-                )
-            )
-        res.register_advancement()
-        self.advance()
+        body = self.block() if multi_line else self.expr()
+        return ProcNode(var_name, arg_names, body, multi_line, self.source, start)
 
-        end_value = res.register(self.expr())
-        if res.error:
-            return res
+    def proc_body(self, multi_line):
+        """Parses the tokens of a deferred PROC body"""
+        res = ParseResult()
+        try:
+            node = self.block() if multi_line else self.expr()
+            if self.tok_type != cc.TT_EOF:
+                self.fail("Expected '+', '-', '*', or '/'")
+        except ParseError as e:
+            return res.failure(e.error)
+        return res.success(node)
 
-        if self.current_tok.matches(cc.TT_KEYWORD, "STEP"):
-            res.register_advancement()
+    # Skimming finds where a PROC body ends without building it. It follows
+    # the same grammar as the parser for blocks, while an expression is just
+    # a run of tokens up to one that can only come after an expression.
+
+    def skim_body(self, multi_line):
+        """
+        Returns the body tokens ending with an EOF, None if the body does not
+        skim cleanly. The parser then parses it on the spot so the syntax
+        error is reported exactly where it always was.
+        """
+        body_idx = self.tok_idx
+        try:
+            if multi_line:
+                self.skim_block()
+            else:
+                self.skim_expr()
+        except ParseError:
+            self.tok_idx = body_idx - 1
             self.advance()
-            step_value = res.register(self.expr())
-        else:
-            step_value = None
-
-        if not self.current_tok.matches(cc.TT_KEYWORD, "DO"):
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'DO'",
-                )
-            )
-        res.register_advancement()
-        self.advance()
+            return None
 
-        #newline in loop
-        if self.current_tok.type == cc.TT_NEWLINE:
-            res.register_advancement()
-            self.advance()
+        body_tokens = self.tokens.slice(body_idx, self.tok_idx)
+        end = body_tokens.ends[-1]
+        body_tokens.append(cc.TT_EOF, end, end + 1)
+        return body_tokens
 
-            body = res.register(self.stmts())
-            if res.error:
-                return res
-
-            if not self.current_tok.matches(cc.TT_KEYWORD, "END"):
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected 'THEN'",
-                    )
-                )
+    def skim_expr(self):
+        if not self.can_start_expr():
+            self.fail("Expected 'BUCKET', int, float, identifier, '+', '-', 'NOT',or '('")
 
-            res.register_advancement()
+        while True:
+            tok_type = self.tok_type
+            if tok_type in EXPR_END_TYPES:
+                return
+            if tok_type == cc.TT_KEYWORD:
+                keyword = self.tok_value
+                if keyword in EXPR_END_KEYWORDS:
+                    return
+                if keyword == "IF":
+                    self.skim_if()
+                    continue
+                if keyword == "LOOP":
+                    self.skim_for()
+                    continue
+                if keyword == "PROC":
+                    self.skim_proc()
+                    continue
+            elif tok_type == cc.TT_LPAREN:
+                self.skim_group(cc.TT_RPAREN)
+                continue
+            elif tok_type == cc.TT_LCURLY:
+                self.skim_group(cc.TT_RCURLY)
+                continue
             self.advance()
 
-            return res.success(ForNode(var_name, start_value, end_value, step_value, body, True))
-        
-        body = res.register(self.expr())
-        if res.error:
-            return res
-
-        return res.success(ForNode(var_name, start_value, end_value, step_value, body, False))
-
-    def arth_expr(self):
-        return self.bin_op(self.term, (cc.TT_PLUS, cc.TT_MINUS))
-
-    def proc_def(self):
-        res = ParseResult()
-        if not self.current_tok.matches(cc.TT_KEYWORD, "PROC"):
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'PROC'",
-                )
-            )
-        res.register_advancement()
+    def skim_group(self, closer):
+        """( ... ) or { ... } holding comma separated expressions"""
         self.advance()
-        if self.current_tok.type == cc.TT_IDENTIFIER:
-            var_name_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-            if self.current_tok.type != cc.TT_LPAREN:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected '('",
-                    )
-                )
-        else:
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected 'identifier'",
-                )
-            )
+        if self.tok_type != closer:
+            self.skim_expr()
+            while self.tok_type == cc.TT_COMMA:
+                self.advance()
+                self.skim_expr()
+        self.expect(closer, "Expected ',' or ')'" if closer == cc.TT_RPAREN else "Expected ',' or '}'")
 
-        res.register_advancement()
-        self.advance()
+    def skim_stmts(self):
+        self.skip_newlines()
+        if not self.can_start_expr():
+            self.fail("Expected 'BUCKET', int, float, identifier, '+', '-', 'NOT',or '('")
 
-        arg_name_tok = []
-        if self.current_tok.type == cc.TT_IDENTIFIER:
-            arg_name_tok.append(self.current_tok)
-            res.register_advancement()
-            self.advance()
-            while self.current_tok.type == cc.TT_COMMA:
-                res.register_advancement()
-                self.advance()
-                if self.current_tok.type != cc.TT_IDENTIFIER:
-                    return res.failure(
-                        InvalidSyntaxError(
-                            self.current_tok.pos_start,
-                            self.current_tok.pos_end,
-                            "Expected 'identifier'",
-                        )
-                    )
-
-                arg_name_tok.append(self.current_tok)
-                res.register_advancement()
-                self.advance()
-            if self.current_tok.type != cc.TT_RPAREN:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected ')'",
-                    )
-                )
-        else:
-            if self.current_tok.type != cc.TT_RPAREN:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected identifier or ')'",
-                    )
-                )
+        while self.can_start_expr():
+            self.skim_expr()
+            if self.tok_type != cc.TT_NEWLINE:
+                break
+            self.skip_newlines()
 
-        res.register_advancement()
-        self.advance()
+    def skim_block(self):
+        self.skim_stmts()
+        self.expect_keyword("END")
 
-        if self.current_tok.type == cc.TT_COLON:
-            res.register_advancement()
-            self.advance()
-            node_to_return = res.register(self.expr())
-            if res.error:
-                return res
-
-            return res.success(ProcNode(var_name_tok, arg_name_tok, node_to_return, False))
-
-        if self.current_tok.type != cc.TT_NEWLINE:
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected ':' or NEWLINE",
-                    )
-                )
+    def skim_if(self):
+        case_keyword = "IF"
 
-        res.register_advancement()
-        self.advance()
+        while True:
+            self.expect_keyword(case_keyword)
+            self.skim_expr()
+            self.expect_keyword("THEN")
 
-        body = res.register(self.stmts())
-        if res.error:
-            return res
-
-        if not self.current_tok.matches(cc.TT_KEYWORD, "END"):
-                return res.failure(
-                    InvalidSyntaxError(
-                        self.current_tok.pos_start,
-                        self.current_tok.pos_end,
-                        "Expected 'THEN'",
-                    )
-                )
+            if self.tok_type == cc.TT_NEWLINE:
+                self.advance()
+                self.skim_stmts()
+                if self.tok_matches(cc.TT_KEYWORD, "END"):
+                    self.advance()
+                    return
+            else:
+                self.skim_expr()
 
-        res.register_advancement()
-        self.advance()
+            if self.tok_matches(cc.TT_KEYWORD, "ALTER"):
+                case_keyword = "ALTER"
+                continue
 
-        return res.success(ProcNode(var_name_tok, arg_name_tok, body, True))
+            if self.tok_matches(cc.TT_KEYWORD, "ELSE"):
+                self.advance()
+                if self.tok_type == cc.TT_NEWLINE:
+                    self.advance()
+                    self.skim_block()
+                else:
+                    self.skim_expr()
+            return
+
+    def skim_for(self):
+        self.expect_keyword("LOOP")
+        self.expect(cc.TT_IDENTIFIER, "Expected 'identifier'")
+        self.expect(cc.TT_EQ, "Expected '='")
+        self.skim_expr()
+        self.expect_keyword("TILL")
+        self.skim_expr()
+        if self.tok_matches(cc.TT_KEYWORD, "STEP"):
+            self.advance()
+            self.skim_expr()
+        self.expect_keyword("DO")
 
-    def bin_op(self, func_a, ops, func_b=None):
-        if func_b is None:
-            func_b = func_a
-        res = ParseResult()
-        left = res.register(func_a())
-        if res.error:
-            return res
-        # TODO: Ops Operation as TUPLE - Breaking my head over below line in ep5
-        # while self.current_tok.type in ops or (self.current_tok.type, self.current_tok.value) in ops:
-        while self.current_tok.type in ops:
-            op_tok = self.current_tok
-            res.register_advancement()
+        if self.tok_type == cc.TT_NEWLINE:
             self.advance()
-            right = res.register(func_b())
-            if res.error:
-                return res
-            left = BinOpNode(left, op_tok, right)
+            self.skim_block()
+        else:
+            self.skim_expr()
 
-        return res.success(left)
+    def skim_proc(self):
+        multi_line = self.proc_header()[3]
+        if multi_line:
+            self.skim_block()
+        else:
+            self.skim_expr()
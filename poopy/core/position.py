@@ -1,25 +1,94 @@
+from array import array
+from bisect import bisect_right
+
+
+class Source:
+
+    """
+    File name and content shared by every position in a file.
+    The line index is only built once an error actually asks for a line.
+    constants is the pool of the values of the literals in the file, None
+    for a file read in chunks.
+    """
+
+    __slots__ = ("fname", "text", "_line_starts", "constants")
+
+    def __init__(self, fname, text):
+        self.fname = fname
+        self.text = text
+        self._line_starts = None
+        self.constants = {}
+
+    @classmethod
+    def incremental(cls, fname):
+        """
+        Source of a file read in chunks, the text is never kept and the
+        line index is grown with add_lines instead. Its literals are not
+        pooled, a pool would keep every value of the file alive after the
+        statements holding them are released.
+        """
+        source = cls(fname, None)
+        source._line_starts = array("I", [0])
+        source.constants = None
+        return source
+
+    def add_lines(self, chunk, offset):
+        starts = self._line_starts
+        find = chunk.find
+        idx = find("\n")
+        while idx != -1:
+            starts.append(offset + idx + 1)
+            idx = find("\n", idx + 1)
+
+    def line_starts(self):
+        if self._line_starts is None:
+            starts = array("I", [0])
+            find = self.text.find
+            idx = find("\n")
+            while idx != -1:
+                starts.append(idx + 1)
+                idx = find("\n", idx + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def line_of(self, idx):
+        return bisect_right(self.line_starts(), idx) - 1
+
+    def column_of(self, idx):
+        return idx - self.line_starts()[self.line_of(idx)]
+
+
 class Position:
 
     """
     To track position ( line number and col number of the exception position)
     """
 
-    def __init__(self, idx, ln, col, fname, fcontent):
+    __slots__ = ("idx", "source")
+
+    def __init__(self, idx, source):
         self.idx = idx
-        self.ln = ln
-        self.col = col
-        self.fname = fname
-        self.fcontent = fcontent
+        self.source = source
 
-    def advance(self, current_char=None):
-        self.idx += 1
-        self.col += 1
+    @property
+    def ln(self):
+        return self.source.line_of(self.idx)
+
+    @property
+    def col(self):
+        return self.source.column_of(self.idx)
+
+    @property
+    def fname(self):
+        return self.source.fname
 
-        if current_char == "\n":
-            self.ln += 1
-            self.col += 0
+    @property
+    def fcontent(self):
+        return self.source.text
 
+    def advance(self, current_char=None):
+        self.idx += 1
         return self
 
     def copy(self):
-        return Position(self.idx, self.ln, self.col, self.fname, self.fcontent)
+        return Position(self.idx, self.source)
@@ -0,0 +1,31 @@
+import codecs
+import mmap
+import os
+
+CHUNK_SIZE = 1 << 16
+MMAP_THRESHOLD = 1 << 22  # files of 4 MB and more are memory mapped
+
+
+def read_chunks(fname, chunk_size=CHUNK_SIZE):
+    """
+    Yields the decoded text of a file chunk by chunk, multi byte characters
+    split across chunks are stitched back together by the decoder
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    with open(fname, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, size, chunk_size):
+                    yield decoder.decode(mapped[start : start + chunk_size])
+        else:
+            chunk = f.read(chunk_size)
+            while chunk:
+                yield decoder.decode(chunk)
+                chunk = f.read(chunk_size)
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
@@ -0,0 +1,135 @@
+from core.nodes import (
+    VarAssignNode,
+    VarAccessNode,
+    ForNode,
+    ProcNode,
+    InlineCallNode,
+    SpecialCallNode,
+)
+from core.cache import children
+from core.lookup_cache import LookupCache
+
+# Lexical addressing. A PROC body sees the names of the scopes it is
+# defined in, out to the globals. Every name a body binds, its args and
+# whatever it assigns, gets a slot in the list a call of the body keeps
+# its locals in. A read is resolved to the slot of the closest scope that
+# binds its name and how many scopes out that is, a read no PROC binds is
+# a global and is still looked up by name. A slot that was never set in a
+# call falls back to the scopes further out by name, like a missing name.
+# Every global read gets a LookupCache, so a read of a global nothing
+# assigned since is one compare of the version of the global table.
+
+
+class Scope:
+    """
+    Slots of the names a PROC body binds and the scope the PROC is defined
+    in, None for the globals. names stays None until a deferred body is
+    parsed. frames is the pool of call contexts of the body, None when the
+    body defines a PROC, which keeps the symbol table of the call defining
+    it. locals is what follows the args in the slots of a call, None when
+    an arg name is repeated.
+    """
+
+    __slots__ = ("names", "parent", "frames", "locals")
+
+    def __init__(self, parent=None):
+        self.names = None
+        self.parent = parent
+        self.frames = None
+        self.locals = None
+
+
+def lookup(scope, name):
+    """(depth, slot) of a name read in scope, (None, None) for a global"""
+    depth = 0
+    while scope is not None:
+        slot = scope.names.get(name)
+        if slot is not None:
+            return depth, slot
+        scope = scope.parent
+        depth += 1
+    return None, None
+
+
+def bound_names(node, arg_names):
+    """
+    Slots of the args and of the names a body assigns in its own scope, and
+    whether it defines a PROC
+    """
+    names = {}
+    for name in arg_names:
+        names.setdefault(name, len(names))
+    defines_proc = False
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        node_type = type(node)
+        if node_type in (VarAssignNode, ForNode):
+            names.setdefault(node.var_name, len(names))
+        elif node_type is ProcNode:
+            if node.var_name:
+                names.setdefault(node.var_name, len(names))
+            defines_proc = True
+            continue
+        elif node_type is InlineCallNode:
+            nodes.append(node.call)
+            continue
+        nodes.extend(children(node))
+    return names, defines_proc
+
+
+def resolve_proc(node):
+    """Resolves a parsed PROC or inlined body into the Scope it was given"""
+    scope = node.scope
+    scope.names, defines_proc = bound_names(node.body_node, node.arg_names)
+    scope.frames = None if defines_proc else []
+    arity = len(node.arg_names)
+    if len(set(node.arg_names)) == arity:
+        scope.locals = [None] * (len(scope.names) - arity)
+    resolve(node.body_node, scope)
+
+
+def resolve(node, scope=None):
+    """
+    Resolves the reads and assignments of a tree running in scope, None at
+    the top level, and of every PROC body in it. A PROC is resolved once,
+    a deferred body when it is parsed.
+    """
+    nodes = [(node, scope)]
+    while nodes:
+        node, scope = nodes.pop()
+        node_type = type(node)
+
+        if node_type is VarAccessNode:
+            if scope is not None:
+                node.depth, node.slot = lookup(scope, node.var_name)
+            if node.depth is None and node.cache is None:
+                node.cache = LookupCache()
+            continue
+        if node_type is VarAssignNode:
+            if scope is not None:
+                node.slot = scope.names.get(node.var_name)
+        elif node_type is ProcNode:
+            if node.scope is None:
+                node.scope = Scope(scope)
+                if node.body_node is not None:
+                    resolve_proc(node)
+            continue
+        elif node_type is InlineCallNode:
+            nodes.append((node.call, scope))
+            if node.scope is None:
+                # only top level PROCs are inlined, their body sees the globals
+                node.scope = Scope()
+                resolve_proc(node)
+            continue
+        elif node_type is SpecialCallNode:
+            nodes.append((node.call, scope))
+            special = node.special
+            if special.scope is None:
+                # a copy of a top level PROC, wherever it is called from
+                special.scope = Scope()
+                resolve_proc(special)
+            continue
+
+        nodes.extend((child, scope) for child in children(node))
+
@@ -1,39 +1,136 @@
-from core.lexer import Lexer
+from core.lexer import Lexer, StreamLexer
 from core.parser import Parser
 from core.interpreter import Interpreter
+from core.compiler import ClosureCompiler
+from core.vm import VM
+from core.bytecode import disassemble_program
 from core.context import Context
+from core.runtime import RTException
 from core.symbol_table import GlobalSymbolTable
+from core.reader import read_chunks
+from core.cache import ast_cache
+from core.optimizer import Optimizer, DEFAULT_OPT_LEVEL, global_constants, reaches_poop_run, dump_ast
 
 global_symbol_table = GlobalSymbolTable()
 
+# execution engines, all take (node, context) to visit, return the value of
+# the node and raise an RTException when the program fails
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureCompiler,
+    "vm": VM,
+}
+
 class Run:
     def __init__(self, fname=None, text=None):
         self.fname = fname
         self.text = text
+        # tree of the last program run, for its lookup cache stats
+        self.node = None
+
+    def build_ast(self, fname, text, strict=False):
+        """
+        Returns (node, error) for a program, files are looked up in the AST
+        cache first so a warm start skips the Lexer and the Parser. A strict
+        build parses every PROC body up front, so it skips cached trees that
+        may hold deferred bodies.
+        """
+        if not strict:
+            node = ast_cache.load(fname, text)
+            if node is not None:
+                return node, None
 
-    def run(self, fname, text, mode = "File"):
         lexers = Lexer(fname, text)
         tokens, error = lexers.make_tokens()
         if error:
             return None, error
 
         # generate AST
-        parser = Parser(tokens)
+        parser = Parser(tokens, strict)
         ast = parser.parse()
 
         if ast.error:
             return None, ast.error
 
+        ast_cache.store(fname, text, ast.node)
+        return ast.node, None
+
+    def optimize(self, node, opt_level, keep_result=True, whole_program=True):
+        """
+        Runs the optimizer over a whole program, whole_program is False when
+        more programs run on the same globals afterwards, like in the REPL
+        """
+        if not opt_level:
+            return node
+        constants = global_constants(node, global_symbol_table)
+        return Optimizer(opt_level, constants, keep_result, reaches_poop_run(node), whole_program).optimize(node)
+
+    def disassemble(self, fname, text, opt_level=DEFAULT_OPT_LEVEL):
+        """Returns (listing, error), the bytecode of a program and its PROCs"""
+        node, error = self.build_ast(fname, text, strict=True)
+        if error:
+            return None, error
+        return disassemble_program(self.optimize(node, opt_level, False)), None
+
+    def dump_ast(self, fname, text, opt_level=DEFAULT_OPT_LEVEL):
+        """Returns (listing, error), the tree of a program as it would run"""
+        node, error = self.build_ast(fname, text, strict=True)
+        if error:
+            return None, error
+        return dump_ast(self.optimize(node, opt_level, False)), None
+
+    def run(self, fname, text, mode = "File", strict=False, engine="tree", opt_level=DEFAULT_OPT_LEVEL):
+        node, error = self.build_ast(fname, text, strict)
+        if error:
+            return None, error
+        # the REPL prints the value of the program, a file throws it away
+        node = self.node = self.optimize(node, opt_level, keep_result=mode == "Terminal", whole_program=mode == "File")
+
         # Run Program
-        interpreter = Interpreter()
+        interpreter = ENGINES[engine]()
         root_context = Context("<program>")
         root_context.symbol_table = global_symbol_table
 
-        result = interpreter.visit(ast.node, root_context)
+        try:
+            value, error = interpreter.visit(node, root_context), None
+        except RTException as e:
+            value, error = None, e.error
         if mode == "Terminal":
-            result.value = str(result.value)
-            if "NULL" in result.value: 
-                result.value = result.value.replace("NULL", "")
-            return result.value, result.error
+            value = str(value)
+            if "NULL" in value: 
+                value = value.replace("NULL", "")
+            return value, error
         else:
-            return " ", result.error
+            return " ", error
+
+    def run_stream(self, fname, strict=False, engine="tree", opt_level=DEFAULT_OPT_LEVEL):
+        """
+        Lexes, parses and executes one top level statement at a time, each
+        statement is released once it ran. Statements before a syntax error
+        have already been executed when the error is reported. A runtime
+        error does not stop the run, as in file mode the remaining
+        statements still run and the last error is returned.
+        """
+        lexer = StreamLexer(fname, read_chunks(fname))
+        parser = Parser(lexer.tokens, strict)
+        interpreter = ENGINES[engine]()
+        root_context = Context("<program>")
+        root_context.symbol_table = global_symbol_table
+        # a later statement may assign any global, so none are folded
+        optimizer = Optimizer(opt_level)
+        error = None
+
+        while True:
+            stmt = parser.next_statement()
+            if lexer.error:
+                return None, lexer.error
+            if stmt.error:
+                return None, stmt.error
+            if stmt.node is None:
+                return " ", error
+
+            try:
+                interpreter.visit(optimizer.optimize(stmt.node), root_context)
+            except RTException as e:
+                error = e.error
+            parser.release()
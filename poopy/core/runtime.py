@@ -1,17 +1,51 @@
-class RTResult:
-    def __init__(self):
-        self.value = None
-        self.error = None
+from core.error import RTError, IllegalOperationError
 
-    def register(self, res):
-        if res.error:
-            self.error = res.error
-        return res.value
 
-    def success(self, value):
-        self.value = value
-        return self
+class RTException(Exception):
+    """
+    Raised by the engines, PROCs and built-ins when a program fails, error
+    is the Error it failed with. Run.run hands it back as (result, error).
+    """
 
-    def failure(self, error):
+    def __init__(self, error):
         self.error = error
-        return self
+
+
+class OperationError(Exception):
+    """
+    Raised by an operation of a value. Values carry no positions, so the
+    engine running the operation turns it into the Error with the position
+    of the operand it blames, the right one or the left one.
+    """
+
+    def __init__(self, details, right=False, runtime=True):
+        self.details = details
+        self.right = right
+        # an RTError with the traceback, else an IllegalOperationError
+        self.runtime = runtime
+
+
+def value_pos(node):
+    """
+    (pos_start, pos_end) an error about the value of node points at, the
+    expression the value came from
+    """
+    # the nodes keep the values of their literals, they import the values
+    from core.nodes import NumberNode, VarAssignNode
+
+    while type(node) is VarAssignNode:
+        node = node.value_node
+    if type(node) is NumberNode:
+        return node.pos_start, node.pos_start
+    return node.pos_start, node.pos_end
+
+
+def operation_error(e, node, context):
+    """The Error of an OperationError raised running the operator node"""
+    if e.right:
+        pos_start, pos_end = value_pos(node.right_node)
+    else:
+        pos_start, pos_end = value_pos(node.left_node if hasattr(node, "left_node") else node.node)
+    if e.runtime:
+        return RTError(pos_start, pos_end, e.details, context)
+    return IllegalOperationError(pos_start, pos_end, e.details)
@@ -1,31 +1,51 @@
-from core.types.number import Number
-from core.types.string import String
+from core.types.number import Number, TRUE, FALSE
+from core.types.string import String, NULL
 import core.types.built_in as BultIns
 
 import os
 from enum import Enum
 import math
 
+from core.lookup_cache import VERSIONS
+
 class SymbolTable:
     """
     To keep track of all running variable name and their values
     """
 
+    # names some LookupCache holds the value of, only ever set on a root
+    watched = frozenset()
+
     def __init__(self, parent=None):
         self.symbols = {}
         self.parent = parent
+        if parent is None:
+            self.root = self
+            self.version = next(VERSIONS)
+            self.watched = set()
+        else:
+            self.root = parent.root
 
     def get(self, name):
         value = self.symbols.get(name, None)
         if value is None and self.parent:
-            self.parent.get(name)
+            return self.parent.get(name)
         return value
 
     def set_val(self, name, value):
         self.symbols[name] = value
+        if name in self.watched:
+            self.invalidate()
 
     def remove(self, name):
         del self.symbols[name]
+        if name in self.watched:
+            self.invalidate()
+
+    def invalidate(self):
+        """Moves the table to a new version every LookupCache misses on"""
+        self.version = next(VERSIONS)
+        self.watched.clear()
 
     # TODO: Implement a nice looking table format here
     def __repr__(self):
@@ -33,12 +53,62 @@ class SymbolTable:
         return str(self.symbols)
 
 
+class LocalTable(SymbolTable):
+    """
+    Symbol table of a call of a resolved PROC body. The names of its
+    core.resolver Scope live in a list indexed by their slot, an empty slot
+    falls back to the parent like a missing name does. symbols only holds
+    what the optimizer keeps under names no identifier can have.
+    """
+
+    def __init__(self, scope, parent=None):
+        super().__init__(parent)
+        self.names = scope.names
+        self.slots = [None] * len(scope.names)
+
+    def get(self, name):
+        slot = self.names.get(name)
+        value = self.symbols.get(name) if slot is None else self.slots[slot]
+        if value is None and self.parent:
+            return self.parent.get(name)
+        return value
+
+    def load(self, depth, slot, name):
+        """Value of a name resolved to slot of the table depth scopes out"""
+        table = self
+        for _ in range(depth):
+            table = table.parent
+        value = table.slots[slot]
+        if value is None and table.parent:
+            return table.parent.get(name)
+        return value
+
+    def set_val(self, name, value):
+        slot = self.names.get(name)
+        if slot is None:
+            self.symbols[name] = value
+        else:
+            self.slots[slot] = value
+
+    def remove(self, name):
+        slot = self.names.get(name)
+        if slot is None:
+            del self.symbols[name]
+        else:
+            self.slots[slot] = None
+
+    def __repr__(self):
+        symbols = {name: self.slots[slot] for name, slot in self.names.items() if self.slots[slot] is not None}
+        symbols.update(self.symbols)
+        return str(symbols)
+
+
 class GlobalSymbolTable(SymbolTable):
     def __init__(self):
         super().__init__()
-        super().set_val("NULL", String("NULL"))
-        super().set_val("TRUE", Number(1))
-        super().set_val("FALSE", Number(0))
+        super().set_val("NULL", NULL)
+        super().set_val("TRUE", TRUE)
+        super().set_val("FALSE", FALSE)
 
         # TODO: Make poop Clipart
         super().set_val("POOPY", String(list_poopy_available_commands()))
@@ -56,21 +126,9 @@ class GlobalSymbolTable(SymbolTable):
         super().set_val("MATH_TAU", Math.MATH_TAU)
         super().set_val("MATH_INF", Math.MATH_INF)
 
-        #MATH Builtins
-        super().set_val("MATH_SQRT", BultIns.math_sqrt)
-
-        #Built-ins
-        super().set_val("POOP_RUN", BultIns.poop_run)
-        super().set_val("POOP_OUT", BultIns.poop_out)
-        super().set_val("POOP_OUT_RET", BultIns.poop_out_ret)
-        super().set_val("POOP_IN", BultIns.poop_in)
-        super().set_val("POOP_IN_INT", BultIns.poop_in_int)
-        super().set_val("CLEAR", BultIns.clear)
-        super().set_val("IS_NUMBER", BultIns.is_number)
-        super().set_val("IS_STRING", BultIns.is_string)
-        super().set_val("IS_PROC", BultIns.is_proc)
-        super().set_val("IS_BUILTIN", BultIns.is_builtin)
-        super().set_val("IS_LIST", BultIns.is_list)
+        #Built-ins, MATH_SQRT and the POOP_* PROCs
+        for name, built_in in BultIns.BUILT_INS.items():
+            super().set_val(name, built_in)
 
 
 class HelpTable:
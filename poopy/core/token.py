@@ -1,21 +1,89 @@
+from array import array
+
+import core.constant as cc
+from core.position import Position
+
+
 class Token:
+    __slots__ = ("type", "value", "pos_start", "pos_end")
+
     def __init__(self, type_, value=None, pos_start=None, pos_end=None):
         self.type = type_
         self.value = value
 
+        # positions are owned by the token, the lexer hands out fresh ones
         if pos_start:
-            self.pos_start = pos_start.copy()
-            self.pos_end = pos_start.copy()
-            self.pos_end.advance()
+            self.pos_start = pos_start
+            if not pos_end:
+                pos_end = pos_start.copy().advance()
 
         if pos_end:
-            self.pos_end = pos_end.copy()
+            self.pos_end = pos_end
 
     def __repr__(self):
         if self.value is None:
-            return f"Type : {self.type}"
+            return f"Type : {cc.TT_NAMES[self.type]}"
         else:
-            return f"{self.type} : {self.value}"
+            return f"{cc.TT_NAMES[self.type]} : {self.value}"
 
     def matches(self, type_, value):
         return self.type == type_ and self.value == value
+
+
+class TokenStream:
+    """
+    Struct of arrays holding every token of a source file.
+    Kinds and offsets live in typed arrays and values in a side table, a
+    Token object is only built when a caller asks for one.
+    """
+
+    __slots__ = ("source", "kinds", "starts", "ends", "values", "pull")
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.values = []
+        # set by a streaming lexer, pull(n) lexes until n tokens are available
+        self.pull = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, kind, start, end, value=None):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(value)
+
+    def discard(self, count):
+        """Drops the first count tokens, offsets of the rest stay absolute"""
+        del self.kinds[:count]
+        del self.starts[:count]
+        del self.ends[:count]
+        del self.values[:count]
+
+    def slice(self, start, stop):
+        """Copy of the tokens start to stop, sharing the source"""
+        tokens = TokenStream(self.source)
+        tokens.kinds = self.kinds[start:stop]
+        tokens.starts = self.starts[start:stop]
+        tokens.ends = self.ends[start:stop]
+        tokens.values = self.values[start:stop]
+        return tokens
+
+    def pos_start(self, idx):
+        return Position(self.starts[idx], self.source)
+
+    def pos_end(self, idx):
+        return Position(self.ends[idx], self.source)
+
+    def token(self, idx):
+        return Token(
+            self.kinds[idx], self.values[idx], self.pos_start(idx), self.pos_end(idx)
+        )
+
+    def __iter__(self):
+        for idx in range(len(self.kinds)):
+            yield self.token(idx)
@@ -0,0 +1,260 @@
+from core.types.number import Number, number, noice
+from core.error import RTError
+from core.runtime import RTException, value_pos
+from core.nodes import (
+    NumberNode,
+    BinOpNode,
+    UnaryOpNode,
+    VarAccessNode,
+    IfNode,
+    NumericNode,
+)
+import core.constant as cc
+
+# calls a PROC runs through its engine before it is transpiled
+HOT_CALLS = 100
+
+# returned by a transpiled PROC when the args are not the plain numbers
+# the code was written for, the call then takes the engine path
+GUARD_FAILED = object()
+
+# Python operator of every binary operator whose result is a plain value
+ARITHMETIC = {
+    cc.TT_PLUS: "+",
+    cc.TT_MINUS: "-",
+    cc.TT_MUL: "*",
+    cc.TT_POW: "**",
+}
+COMPARISONS = {
+    cc.TT_EE: "==",
+    cc.TT_NE: "!=",
+    cc.TT_LT: "<",
+    cc.TT_GT: ">",
+    cc.TT_LTE: "<=",
+    cc.TT_GTE: ">=",
+}
+LOGICAL = {
+    "AND": "int({} and {})",
+    "OR": "int({} or {})",
+    "XOR": "int({} ^ {})",
+}
+
+
+class NotTranspilable(Exception):
+    """The body uses something the transpiler has no plain value code for"""
+
+
+class DivisionByZero(Exception):
+    """Raised by transpiled code, carries the position of the divisor"""
+
+    def __init__(self, pos_start, pos_end):
+        super().__init__("Division by Zero")
+        self.pos_start = pos_start
+        self.pos_end = pos_end
+
+
+def hot_call(proc_node):
+    """
+    Counts a call of the PROC, returns its transpiled function once it is
+    hot or None while the engine has to run it
+    """
+    fast_call = proc_node.fast_call
+    if fast_call is None:
+        proc_node.calls += 1
+        if proc_node.calls < HOT_CALLS:
+            return None
+        # False marks a body that is not transpilable
+        fast_call = proc_node.fast_call = Transpiler(proc_node).transpile() or False
+    return fast_call or None
+
+
+def numeric_code(node):
+    """The function of a NumericNode, written on first use"""
+    code = node.code
+    if code is None:
+        code = node.code = RegionTranspiler(node).transpile()
+    return code
+
+
+def division_error(e, context):
+    """The Error of a DivisionByZero raised by transpiled code"""
+    return RTError(e.pos_start, e.pos_end, "Division by Zero", context)
+
+
+def numeric_value(node, args, context):
+    """Value of a NumericNode given the values of its leaves"""
+    try:
+        return numeric_code(node)(*args)
+    except DivisionByZero as e:
+        raise RTException(division_error(e, context))
+
+
+class Transpiler:
+    """
+    Translates a single expression PROC body working on numbers into a
+    Python function over the plain values of its args. The function takes
+    the list of arg values and returns a Number, the same value the engines
+    compute, or GUARD_FAILED when an arg is not an int or float Number.
+    Noice checks, division errors and crashes happen in the order the
+    engines would run into them.
+    """
+
+    def __init__(self, proc_node):
+        self.proc_node = proc_node
+        self.lines = []
+        self.temps = 0
+        # the local of every arg name, a repeated name binds the last arg
+        self.locals = {name: f"a{i}" for i, name in enumerate(proc_node.arg_names)}
+        self.used = set()
+        # divisor positions, raised with DivisionByZero
+        self.sites = []
+
+    def transpile(self):
+        node = self.proc_node
+        if node.should_return_null or node.body_node is None:
+            return None
+        try:
+            result = self.expr(node.body_node, 1)
+        except NotTranspilable:
+            return None
+
+        arg_count = len(node.arg_names)
+        # only the args the body reads are guarded
+        used = sorted(int(local[1:]) for local in self.used)
+        header = ["def fast_call(args):", f"    if len(args) != {arg_count}:", "        return GUARD_FAILED"]
+        if used:
+            header.append(f"    if {' or '.join(f'type(args[{i}]) is not Number' for i in used)}:")
+            header.append("        return GUARD_FAILED")
+            for i in used:
+                header.append(f"    a{i} = args[{i}].value")
+            header.append(f"    if {' or '.join(f'type(a{i}) not in NUMERIC' for i in used)}:")
+            header.append("        return GUARD_FAILED")
+        source = "\n".join(header + self.lines + [f"    return number({result})"])
+        return self.function("fast_call", source, f"<PROC {node.var_name or '<anonymous>'}>")
+
+    def function(self, name, source, filename):
+        """Compiles the source of the function name"""
+        namespace = {
+            "Number": Number,
+            "number": number,
+            "GUARD_FAILED": GUARD_FAILED,
+            "NUMERIC": (int, float),
+            "INF": float("inf"),
+            "noice": noice,
+            "DivisionByZero": DivisionByZero,
+            "SITES": self.sites,
+        }
+        exec(compile(source, filename, "exec"), namespace)
+        function = namespace[name]
+        function.source = source
+        return function
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def temp(self):
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def checked(self, indent, temp):
+        # only values in [69420, 69421) are noice, anything int() can not
+        # take goes through noice so it fails the way the Number operations do
+        self.emit(indent, f"if 69420 <= {temp} < 69421 or not -INF < {temp} < INF:")
+        self.emit(indent + 1, f"noice({temp})")
+
+    def expr(self, node, indent):
+        """Emits the statements of node, returns a name or literal holding its value"""
+        node_type = type(node)
+
+        if node_type is NumberNode:
+            return repr(node.value)
+
+        if node_type is VarAccessNode:
+            local = self.locals.get(node.var_name)
+            if local is None:
+                raise NotTranspilable(node.var_name)
+            self.used.add(local)
+            return local
+
+        if node_type is BinOpNode:
+            left = self.expr(node.left_node, indent)
+            right = self.expr(node.right_node, indent)
+            temp = self.temp()
+            op = node.op
+            if op in ARITHMETIC:
+                self.emit(indent, f"{temp} = {left} {ARITHMETIC[op]} {right}")
+                if op == cc.TT_POW:
+                    # a power can turn complex, noice crashes on it
+                    self.emit(indent, f"noice({temp})")
+                else:
+                    self.checked(indent, temp)
+            elif op == cc.TT_DIV:
+                self.sites.append(value_pos(node.right_node))
+                self.emit(indent, f"if {right} == 0:")
+                self.emit(indent + 1, f"raise DivisionByZero(*SITES[{len(self.sites) - 1}])")
+                self.emit(indent, f"{temp} = {left} / {right}")
+                self.checked(indent, temp)
+            elif op in COMPARISONS:
+                self.emit(indent, f"{temp} = 1 if {left} {COMPARISONS[op]} {right} else 0")
+            elif op in LOGICAL:
+                self.emit(indent, f"{temp} = " + LOGICAL[op].format(left, right))
+            else:
+                raise NotTranspilable(op)
+            return temp
+
+        if node_type is UnaryOpNode:
+            operand = self.expr(node.node, indent)
+            if node.op == cc.TT_PLUS:
+                return operand
+            temp = self.temp()
+            if node.op == cc.TT_MINUS:
+                self.emit(indent, f"{temp} = {operand} * -1")
+                self.checked(indent, temp)
+            else:
+                self.emit(indent, f"{temp} = 1 if {operand} == 0 else 0")
+            return temp
+
+        if node_type is NumericNode:
+            return self.expr(node.node, indent)
+
+        if node_type is IfNode:
+            if not node.else_case or node.else_case[1]:
+                raise NotTranspilable("IF without a value")
+            temp = self.temp()
+            for condition, case, should_return_null in node.cases:
+                if should_return_null:
+                    raise NotTranspilable("IF without a value")
+                value = self.expr(condition, indent)
+                self.emit(indent, f"if {value} != 0:")
+                self.emit(indent + 1, f"{temp} = {self.expr(case, indent + 1)}")
+                self.emit(indent, "else:")
+                indent += 1
+            self.emit(indent, f"{temp} = {self.expr(node.else_case[0], indent)}")
+            return temp
+
+        raise NotTranspilable(node_type.__name__)
+
+
+class RegionTranspiler(Transpiler):
+    """
+    Translates the expression of a NumericNode into a Python function taking
+    the values of its leaves. core.inference proved every one of them is a
+    number, so unlike a PROC nothing is guarded.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.lines = []
+        self.temps = 0
+        self.locals = {leaf.var_name: f"a{i}" for i, leaf in enumerate(node.leaves)}
+        self.used = set()
+        self.sites = []
+
+    def transpile(self):
+        node = self.node
+        result = self.expr(node.node, 1)
+        args = [f"a{i}" for i in range(len(node.leaves))]
+        header = [f"def region({', '.join(args)}):"]
+        header.extend(f"    {arg} = {arg}.value" for arg in args)
+        source = "\n".join(header + self.lines + [f"    return number({result})"])
+        return self.function("region", source, f"<expression at line {node.pos_start.ln + 1}>")
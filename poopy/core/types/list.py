@@ -1,13 +1,15 @@
-from core.error import RTError, IllegalOperationError
+from core.runtime import OperationError
 from core.types.number import Number
 
 class List:
     """
-    List class = {}, {1,2,3,4}
+    List class = {}, {1,2,3,4}, never changed like a Number, adding to or
+    removing from a list makes a new one
     """
+
+    __slots__ = ("elements",)
+
     def __init__(self, elements):
-        self.set_context()
-        self.set_pos() 
         self.elements = elements
 
     def __str__(self):
@@ -15,42 +17,19 @@ class List:
 
     def __repr__(self):
         return f"{{{', '.join([repr(x) for x in self.elements])}}}"
-
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
-
-    def set_context(self, context=None):
-        self.context = context
-        return self
     
     def added_to(self, other):
-        temp_list = self.copy()
-        temp_list.elements.append(other)
-        return temp_list, None
+        return List(self.elements + [other])
 
     def subbed_by(self, other):
         if isinstance(other, Number):
-            new_list = self.copy()
+            elements = self.elements[:]
             try:
-                new_list.elements.pop(other.value)
-                return new_list, None
+                elements.pop(other.value)
+                return List(elements)
             except:
-                return None, RTError(
-                    other.pos_start, other.pos_end,
-                    'index is out of bounds',
-                    self.context
-                )
+                raise OperationError('index is out of bounds', right=True)
         else:
-            return None, IllegalOperationError(
-                self.pos_start,
-                self.pos_end,
-                "Operation of incompatible types to List not allowed",
+            raise OperationError(
+                "Operation of incompatible types to List not allowed", runtime=False
             )
-
-    def copy(self):
-        copy = List(self.elements[:])
-        copy.set_pos(self.pos_start, self.pos_end)
-        copy.set_context(self.context)
-        return copy
\ No newline at end of file
@@ -1,15 +1,96 @@
-from core.error import RTError
+from core.runtime import OperationError
+
+INF = float("inf")
+
+# Called with no args when an operation makes a noice value, the easter egg
+# is off until whoever runs the program opts in with set_noice_hook
+noice_hook = None
+
+
+def set_noice_hook(hook):
+    """Installs the function called on every noice value, None turns it off"""
+    global noice_hook
+    noice_hook = hook
+
+
+def print_noice():
+    print("\U0001F609\x1B[3m noice \x1B[0m")
+
+
+def noice(value):
+    """
+    Checks a value the operations only hand over when it is in [69420,
+    69421) or not finite, int() fails on an inf or nan like it always did
+    """
+    if hex(int(value)) == "0x10f2c" and noice_hook is not None:
+        noice_hook()
+
+
+def unsupported(value, other):
+    raise TypeError(
+        f"unsupported operand types {type(value).__name__} and {type(other).__name__}"
+    )
+
+
+# Operations of two Numbers, the operator tables of core.operators call them
+# straight, the Number methods after checking the other operand
+
+
+def add(left, right):
+    value = left.value + right.value
+    if 69420 <= value < 69421 or not -INF < value < INF:
+        noice(value)
+    return Number(value)
+
+
+def subtract(left, right):
+    value = left.value - right.value
+    if 69420 <= value < 69421 or not -INF < value < INF:
+        noice(value)
+    return Number(value)
+
+
+def multiply(left, right):
+    value = left.value * right.value
+    if 69420 <= value < 69421 or not -INF < value < INF:
+        noice(value)
+    return Number(value)
+
+
+def divide(left, right):
+    if right.value == 0:
+        raise OperationError("Division by Zero", right=True)
+    value = left.value / right.value
+    if 69420 <= value < 69421 or not -INF < value < INF:
+        noice(value)
+    return Number(value)
+
+
+def power(left, right):
+    value = left.value**right.value
+    # a power can turn complex, int() fails on it
+    noice(value)
+    return Number(value)
+
+
+def negate(operand):
+    value = operand.value * -1
+    if 69420 <= value < 69421 or not -INF < value < INF:
+        noice(value)
+    return Number(value)
 
 
 class Number:
     """
-    for storing numbers and operating on them
+    for storing numbers and operating on them. A Number is never changed,
+    operations return new ones and errors get their position from the
+    engine, so a value can be shared by every name and list holding it
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
-        self.set_context()
-        self.set_pos()
 
     def __repr__(self):
         return str(self.value)
@@ -17,134 +98,99 @@ class Number:
     def __str__(self):
         return str(self.value)
 
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
-
-    def set_context(self, context=None):
-        self.context = context
-        return self
-
-    def is_noice_num(self):
-        if hex(int(self.value)) == "0x10f2c":
-            print("\U0001F609\x1B[3m noice \x1B[0m")
-        return self
-
     def added_to(self, other):
         if isinstance(other, Number):
-            return (
-                Number(self.value + other.value)
-                .is_noice_num()
-                .set_context(self.context),
-                None,
-            )
+            return add(self, other)
+        unsupported(self, other)
 
     def subbed_by(self, other):
         if isinstance(other, Number):
-            return (
-                Number(self.value - other.value)
-                .is_noice_num()
-                .set_context(self.context),
-                None,
-            )
+            return subtract(self, other)
+        unsupported(self, other)
 
     def multed_by(self, other):
         if isinstance(other, Number):
-            return (
-                Number(self.value * other.value)
-                .is_noice_num()
-                .set_context(self.context),
-                None,
-            )
+            return multiply(self, other)
+        unsupported(self, other)
 
     def dived_by(self, other):
         if isinstance(other, Number):
-            if other.value == 0:
-                return None, RTError(
-                    other.pos_start, other.pos_end, "Division by Zero", self.context
-                )
-            return (
-                Number(self.value / other.value)
-                .is_noice_num()
-                .set_context(self.context),
-                None,
-            )
+            return divide(self, other)
+        unsupported(self, other)
 
     def raised_to(self, other):
         if isinstance(other, Number):
-            return (
-                Number(self.value**other.value)
-                .is_noice_num()
-                .set_context(self.context),
-                None,
-            )
+            return power(self, other)
+        unsupported(self, other)
 
     def get_comparison_eq(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value == other.value)).set_context(self.context),
-                None,
-            )
+            return TRUE if self.value == other.value else FALSE
+        unsupported(self, other)
 
     def get_comparison_ne(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value != other.value)).set_context(self.context),
-                None,
-            )
+            return TRUE if self.value != other.value else FALSE
+        unsupported(self, other)
 
     def get_comparison_lt(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value < other.value)).set_context(self.context), None
+            return TRUE if self.value < other.value else FALSE
+        unsupported(self, other)
 
     def get_comparison_lte(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value <= other.value)).set_context(self.context),
-                None,
-            )
+            return TRUE if self.value <= other.value else FALSE
+        unsupported(self, other)
 
     def get_comparison_gt(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value > other.value)).set_context(self.context), None
+            return TRUE if self.value > other.value else FALSE
+        unsupported(self, other)
 
     def get_comparison_gte(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value >= other.value)).set_context(self.context),
-                None,
-            )
+            return TRUE if self.value >= other.value else FALSE
+        unsupported(self, other)
 
     def notted(self):
-        return Number(1 if self.value == 0 else 0).set_context(self.context), None
+        return TRUE if self.value == 0 else FALSE
 
     def anded_by(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value and other.value)).set_context(self.context),
-                None,
-            )
+            return number(int(self.value and other.value))
+        unsupported(self, other)
 
     def ored_by(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value or other.value)).set_context(self.context),
-                None,
-            )
+            return number(int(self.value or other.value))
+        unsupported(self, other)
 
     def xored_by(self, other):
         """
         Bitwise XR
         """
         if isinstance(other, Number):
-            return Number(int(self.value ^ other.value)).set_context(self.context), None
-
-    def copy(self):
-        copy = Number(self.value)
-        copy.set_pos(self.pos_start, self.pos_end)
-        copy.set_context(self.context)
-        return copy
+            return number(int(self.value ^ other.value))
+        unsupported(self, other)
 
     def is_true(self):
         return self.value != 0
+
+
+# Numbers of the ints MIN_SMALL_INT to MAX_SMALL_INT, made once and shared
+# by every result, counter and literal that has one of those values
+MIN_SMALL_INT = -128
+MAX_SMALL_INT = 1023
+SMALL_INTS = tuple(Number(value) for value in range(MIN_SMALL_INT, MAX_SMALL_INT + 1))
+
+TRUE = SMALL_INTS[1 - MIN_SMALL_INT]
+FALSE = SMALL_INTS[0 - MIN_SMALL_INT]
+MINUS_ONE = SMALL_INTS[-1 - MIN_SMALL_INT]
+
+
+def number(value):
+    """A Number of value, the shared one for a small int"""
+    if value.__class__ is int and MIN_SMALL_INT <= value <= MAX_SMALL_INT:
+        return SMALL_INTS[value - MIN_SMALL_INT]
+    return Number(value)
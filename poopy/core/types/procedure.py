@@ -1,70 +1,180 @@
-from core.runtime import RTResult
+from core.runtime import RTException
 from core.interpreter import Interpreter
 from core.context import Context
 from core.error import RTError
+from core.lookup_cache import cached_global
 from core.types.number import Number
+from core.transpiler import hot_call, GUARD_FAILED, DivisionByZero
+
+# call contexts a body keeps for its next calls, the rest of a deep
+# recursion is left to the garbage collector
+MAX_POOLED_FRAMES = 64
+
+
+def call_frame(node, display_name, context, site, parent, args):
+    """
+    Context of a call of a PROC or inlined body made in context at site,
+    with parent the symbol table the body sees and args bound. A resolved
+    body draws it from the pool of its Scope, release gives it back.
+    """
+    from core.symbol_table import SymbolTable, LocalTable
+
+    scope = node.scope
+    if scope is None or scope.names is None:
+        new_context = Context(display_name, context, site)
+        symbol_table = new_context.symbol_table = SymbolTable(parent)
+        for arg_name, arg_value in zip(node.arg_names, args):
+            symbol_table.set_val(arg_name, arg_value)
+        return new_context
+
+    frames = scope.frames
+    if frames:
+        new_context = frames.pop()
+        new_context.display_name = display_name
+        new_context.parent_context = context
+        new_context.entry = site
+        symbol_table = new_context.symbol_table
+        symbol_table.parent = parent
+        symbol_table.root = parent.root
+    else:
+        new_context = Context(display_name, context, site)
+        symbol_table = new_context.symbol_table = LocalTable(scope, parent)
+        new_context.pool = frames
+
+    if scope.locals is not None:
+        # the args are the first slots
+        symbol_table.slots = args + scope.locals
+    else:
+        slots = symbol_table.slots = [None] * len(scope.names)
+        for arg_name, arg_value in zip(node.arg_names, args):
+            slots[scope.names[arg_name]] = arg_value
+    return new_context
+
+
+def release(context):
+    """
+    Gives the context of a call that returned back to the pool of its body.
+    A call that failed keeps its context, the error points at it.
+    """
+    pool = context.pool
+    if pool is not None and len(pool) < MAX_POOLED_FRAMES:
+        symbol_table = context.symbol_table
+        if symbol_table.symbols:
+            symbol_table.symbols.clear()
+        symbol_table.slots = None
+        context.parent_context = None
+        pool.append(context)
+
+
+def inline_frame(node, context, args):
+    """
+    Context an InlineCallNode runs its body in, the one a call of the PROC
+    would get so tracebacks show the same frames. Only top level PROCs are
+    inlined, the body sees the globals wherever the call is.
+    """
+    return call_frame(node, node.var_name, context, node, context.symbol_table.root, args)
+
+
+def inlined_callee(node, context):
+    """Whether the name called by an InlineCallNode still holds its PROC"""
+    value = cached_global(node.call.node_to_call, context.symbol_table)
+    return type(value) is Procedure and value.proc_node is node.proc_node
+
+
+def execute_inline_fast(node, context, args):
+    """
+    Procedure.execute_fast for an InlineCallNode, returns GUARD_FAILED when
+    the body has to be run by the engine
+    """
+    fast_call = hot_call(node)
+    if fast_call is None:
+        return GUARD_FAILED
+    try:
+        return fast_call(args)
+    except DivisionByZero as e:
+        raise RTException(RTError(e.pos_start, e.pos_end, "Division by Zero", inline_frame(node, context, args)))
+
+
+def specialized_callee(node, value):
+    """
+    The value a SpecialCallNode calls, the called value or its specialised
+    PROC while the name still holds the PROC
+    """
+    if type(value) is Procedure and value.proc_node is node.proc_node:
+        return Procedure(value.name, node.special, value.engine, value.defined_in)
+    return value
+
 
 class Procedure:
-    def __init__(self, name, body_node, arg_names, should_return_null):
-        self.set_pos()
-        self.set_context()
+    """
+    A PROC value. Like every value it has no position or context of its
+    own, a call gets the context of the call site. site is the node of the
+    call, errors and tracebacks point at it.
+    """
+
+    __slots__ = ("name", "proc_node", "engine", "defined_in", "arg_names", "arity", "should_return_null")
+
+    def __init__(self, name, proc_node, engine=None, defined_in=None):
         self.name = name
-        self.body_node = body_node
-        self.arg_names = arg_names
-        self.should_return_null = should_return_null
+        # the ProcNode, its body may still be waiting to be parsed
+        self.proc_node = proc_node
+        # runs the body, the engine that defined the PROC
+        self.engine = engine or Interpreter()
+        # symbol table of the scope the PROC is defined in, the body sees it
+        self.defined_in = defined_in
+        self.arg_names = proc_node.arg_names
+        self.arity = len(proc_node.arg_names)
+        self.should_return_null = proc_node.should_return_null
 
     def __repr__(self):
         return f"<Procedure {self.name}>"
 
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
-
-    def set_context(self, context=None):
-        self.context = context
-        return self
-
-    def execute(self, args):
-        from core.symbol_table import SymbolTable
-        res = RTResult()
-        interpreter = Interpreter()
-        new_context = Context(self.name, self.context, self.pos_start)
-        new_context.symbol_table = SymbolTable(new_context.parent_context.symbol_table)
-
-        if len(args) > len(self.arg_names):
-            return res.failure(
-                RTError(
-                    self.pos_start,
-                    self.pos_end,
-                    f"{len(args) - len(self.arg_names)} too many args passed into '{self.name}'",
-                    self.context,
-                )
-            )
-
-        if len(args) < len(self.arg_names):
-            return res.failure(
-                RTError(
-                    self.pos_start,
-                    self.pos_end,
-                    f"{len(self.arg_names) - len(args)} too few args passed into '{self.name}'",
-                    self.context,
-                )
-            )
-
-        for i in range(len(args)):
-            arg_name = self.arg_names[i]
-            arg_value = args[i]
-            arg_value.set_context(new_context)
-            new_context.symbol_table.set_val(arg_name, arg_value)
-
-        value = res.register(interpreter.visit(self.body_node, new_context))
-        if res.error:
-            return res
-        return res.success((None if self.should_return_null else value))
-
-    def copy(self):
-        copy = Procedure(self.name, self.body_node, self.arg_names, self.should_return_null)
-        copy.set_context(self.context)
-        copy.set_pos(self.pos_start, self.pos_end)
-        return copy
+    def arity_error(self, args, context, site):
+        if len(args) > self.arity:
+            details = f"{len(args) - self.arity} too many args passed into '{self.name}'"
+        else:
+            details = f"{self.arity - len(args)} too few args passed into '{self.name}'"
+        return RTError(site.pos_start, site.pos_end, details, context)
+
+    def prepare(self, args, context, site):
+        """
+        Returns the context of a call made in context at site with the args
+        bound and the body parsed, ready for an engine to run the body.
+        Once the body ran the context goes back through release.
+        """
+        if len(args) != self.arity:
+            raise RTException(self.arity_error(args, context, site))
+
+        proc_node = self.proc_node
+        if proc_node.body_node is None:
+            # the body is resolved to its slots once it is parsed
+            error = proc_node.parse_body()
+            if error:
+                raise RTException(error)
+
+        return call_frame(proc_node, self.name, context, site, self.defined_in, args)
+
+    def execute_fast(self, args, context, site):
+        """
+        Runs a hot PROC through its transpiled function, returns GUARD_FAILED
+        when the call has to go through the engine instead
+        """
+        fast_call = hot_call(self.proc_node)
+        if fast_call is None:
+            return GUARD_FAILED
+        try:
+            return fast_call(args)
+        except DivisionByZero as e:
+            raise RTException(RTError(e.pos_start, e.pos_end, "Division by Zero", self.prepare(args, context, site)))
+
+    def execute(self, args, context, site):
+        # False once the body turned out not to be transpilable
+        if self.proc_node.fast_call is not False:
+            value = self.execute_fast(args, context, site)
+            if value is not GUARD_FAILED:
+                return value
+
+        new_context = self.prepare(args, context, site)
+        value = self.engine.execute_body(self.proc_node.body_node, new_context)
+        release(new_context)
+        return None if self.should_return_null else value
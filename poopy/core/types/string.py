@@ -1,56 +1,38 @@
-from core.error import IllegalOperationError
+from core.runtime import OperationError
 from core.types.number import Number
 
 
 class String:
     """
-    for string operating
+    for string operating, never changed like a Number
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
-        self.set_context()
-        self.set_pos()
 
     def __repr__(self):
         return f"{self.value}"
     
     def __str__(self):
         return self.value
-        
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
-
-    def set_context(self, context=None):
-        self.context = context
-        return self
 
     def added_to(self, other):
         if isinstance(other, String):
-            return (
-                String(self.value + other.value).set_context(self.context),
-                None,
-            )
+            return String(self.value + other.value)
         else:
-            return None, IllegalOperationError(
-                self.pos_start,
-                self.pos_end,
-                "Adding of incompatible types to String not allowed",
+            raise OperationError(
+                "Adding of incompatible types to String not allowed", runtime=False
             )
 
     def multed_by(self, other):
         if isinstance(other, Number):
-            return (
-                String(self.value * other.value).set_context(self.context),
-                None,
-            )
+            return String(self.value * other.value)
         else:
-            return None, IllegalOperationError(
-                self.pos_start,
-                self.pos_end,
+            raise OperationError(
                 "variodic concatenation of incompatible types not allowed",
+                runtime=False,
             )
 
     def is_true(self):
@@ -58,28 +40,20 @@ class String:
 
     def get_comparison_eq(self, other):
         if isinstance(other, String):
-            return (
-                String(self.value == other.value).set_context(self.context),
-                None,
-            )
+            return String(self.value == other.value)
         else:
-            return None, IllegalOperationError(
-                self.pos_start, self.pos_end, "Comparing incompatible types with String"
+            raise OperationError(
+                "Comparing incompatible types with String", runtime=False
             )
 
     def get_comparison_ne(self, other):
         if isinstance(other, String):
-            return (
-                String(self.value != other.value).set_context(self.context),
-                None,
-            )
+            return String(self.value != other.value)
         else:
-            return None, IllegalOperationError(
-                self.pos_start, self.pos_end, "Comparing incompatible types with String"
+            raise OperationError(
+                "Comparing incompatible types with String", runtime=False
             )
 
-    def copy(self):
-        copy = String(self.value)
-        copy.set_pos(self.pos_start, self.pos_end)
-        copy.set_context(self.context)
-        return copy
+
+# the value of NULL and of a POOP_OUT
+NULL = String("NULL")
@@ -0,0 +1,370 @@
+from core.types.number import number
+from core.types.list import List
+from core.error import RTError
+from core.runtime import RTException, OperationError, operation_error
+from core.transpiler import GUARD_FAILED, numeric_value
+from core.hoisting import reset_invariants, save_invariant, induction_value
+from core.bytecode import (
+    BytecodeCompiler,
+    NUMBER, STRING, LOAD, STORE, BINARY, NEGATE, NOT, POP, PUSH_NONE, JUMP,
+    JUMP_IF_FALSE, BEGIN_LIST, ELEMENT, ELEMENT_LIST, BUILD_LIST, FOR_SETUP,
+    FOR_ITER, FOR_APPEND, FOR_END, MAKE_PROC, CALL, RETURN, INVARIANT,
+    SAVE_INVARIANT, INDUCTION, INLINE_CALL, ENTER_INLINE, SPECIALIZE,
+    LOAD_LOCAL, LOAD_OUTER, STORE_LOCAL, LOAD_GLOBAL, NUMERIC, TAIL_CALL,
+)
+
+# frames a run may stack up, about 650 MB of them. Calls never recurse in
+# Python, so this and not the Python stack is how deep a PROC can recurse,
+# a runaway recursion fails before it takes all the memory. Tail calls
+# reuse the frame of their caller and do not count.
+MAX_FRAMES = 1000000
+
+
+class Frame:
+    """
+    A running Code object. blocks holds a handler per list being built,
+    [error slot, element end, keep value, stack depth at the element].
+    """
+
+    __slots__ = ("code", "consts", "ip", "stack", "blocks", "context", "return_null")
+
+    def __init__(self, code, context, return_null=False):
+        self.code = code.code
+        self.consts = code.consts
+        self.ip = 0
+        self.stack = []
+        self.blocks = []
+        self.context = context
+        # should return null of the call that made it
+        self.return_null = return_null
+
+
+class VM:
+    """
+    Execution engine that compiles the tree to bytecode and runs it on a
+    stack machine. A PROC call pushes a Frame onto the frame stack instead
+    of recursing, so a call costs no Python frames. A call in tail position
+    of a body replaces the frame of the body, so a tail recursive PROC runs
+    in constant space and its traceback skips the calls it replaced. Values,
+    errors and the order of side effects are otherwise the ones of the tree
+    walking Interpreter.
+    """
+
+    def __init__(self):
+        # code of the PROC and inlined bodies by body node, compiled on their
+        # first call. A program or streamed statement is compiled for its
+        # run only, so it is freed once it ran.
+        self.compiled = {}
+
+    def visit(self, node, context):
+        """Same contract as Interpreter.visit"""
+        return self.execute(BytecodeCompiler("<program>").compile(node), context)
+
+    def execute_body(self, node, context):
+        """Same contract as Interpreter.execute_body"""
+        return self.execute(self.compile(node, "<PROC>", True), context)
+
+    def execute(self, code, context):
+        value, error = self.run(Frame(code, context))
+        if error:
+            raise RTException(error)
+        return value
+
+    def compile(self, node, name, tail_calls=False):
+        code = self.compiled.get(node)
+        if code is None:
+            code = self.compiled[node] = BytecodeCompiler(name, tail_calls).compile(node)
+        return code
+
+    def run(self, frame):
+        """Runs frame to its RETURN, returns (value, error)"""
+        from core.types.procedure import (
+            Procedure,
+            inlined_callee,
+            inline_frame,
+            release,
+            execute_inline_fast,
+            specialized_callee,
+        )
+
+        frames = [frame]
+        code, consts, stack, context = frame.code, frame.consts, frame.stack, frame.context
+        ip = 0
+
+        while True:
+            op = code[ip]
+            arg = code[ip + 1]
+            ip += 2
+            error = None
+
+            if op == LOAD_LOCAL:
+                slot, var_name, pos_start, pos_end = consts[arg]
+                value = context.symbol_table.slots[slot]
+                if value is None:
+                    value = context.symbol_table.get(var_name)
+                if not value:
+                    error = RTError(pos_start, pos_end, f"{var_name} is not defined", context)
+                else:
+                    stack.append(value)
+
+            elif op == LOAD_GLOBAL:
+                var_name, cache, pos_start, pos_end = consts[arg]
+                if cache.version == context.symbol_table.root.version:
+                    cache.hits += 1
+                    value = cache.value
+                else:
+                    value = cache.lookup(context.symbol_table, var_name)
+                if not value:
+                    error = RTError(pos_start, pos_end, f"{var_name} is not defined", context)
+                else:
+                    stack.append(value)
+
+            elif op == LOAD:
+                var_name, pos_start, pos_end = consts[arg]
+                value = context.symbol_table.get(var_name)
+                if not value:
+                    error = RTError(pos_start, pos_end, f"{var_name} is not defined", context)
+                else:
+                    stack.append(value)
+
+            elif op == NUMBER:
+                stack.append(consts[arg])
+
+            elif op == BINARY:
+                binop_node = consts[arg]
+                right = stack.pop()
+                left = stack.pop()
+                try:
+                    stack.append(binop_node.operation[left.__class__, right.__class__](left, right))
+                except OperationError as e:
+                    error = operation_error(e, binop_node, context)
+
+            elif op == NUMERIC:
+                numeric_node, count = consts[arg]
+                at = len(stack) - count
+                args = stack[at:]
+                del stack[at:]
+                try:
+                    stack.append(numeric_value(numeric_node, args, context))
+                except RTException as e:
+                    error = e.error
+
+            elif op == ELEMENT or op == ELEMENT_LIST:
+                block = frame.blocks[-1]
+                block[1] = arg
+                block[2] = op == ELEMENT_LIST
+                block[3] = len(stack)
+
+            elif op == JUMP_IF_FALSE:
+                if not stack.pop().is_true():
+                    ip = arg
+
+            elif op == JUMP:
+                ip = arg
+
+            elif op == FOR_ITER:
+                loop = stack[-1]
+                stepper = loop[0]
+                if (stepper <= loop[1].value) if loop[3] else (stepper >= loop[1].value):
+                    context.symbol_table.set_val(loop[5], number(stepper))
+                    loop[0] = stepper + loop[2].value
+                else:
+                    ip = arg
+
+            elif op == INVARIANT:
+                slot, end = consts[arg]
+                value = context.symbol_table.symbols.get(slot)
+                if value is not None:
+                    stack.append(value)
+                    ip = end
+
+            elif op == SAVE_INVARIANT:
+                save_invariant(consts[arg], stack[-1], context.symbol_table)
+
+            elif op == INDUCTION:
+                induction_node, end = consts[arg]
+                value = induction_value(induction_node, context.symbol_table)
+                if value is not None:
+                    stack.append(number(value))
+                    ip = end
+
+            elif op == INLINE_CALL:
+                inline_node, fallback = consts[arg]
+                if not inlined_callee(inline_node, context):
+                    ip = fallback
+
+            elif op == ENTER_INLINE:
+                inline_node, count = consts[arg]
+                if count:
+                    args = stack[-count:]
+                    del stack[-count:]
+                else:
+                    args = []
+
+                try:
+                    return_value = execute_inline_fast(inline_node, context, args)
+                except RTException as e:
+                    error = e.error
+                else:
+                    if return_value is GUARD_FAILED:
+                        new_context = inline_frame(inline_node, context, args)
+                        body = self.compile(inline_node.body_node, f"<inlined PROC {inline_node.var_name}>", True)
+                        frame.ip = ip
+                        frame = Frame(body, new_context, inline_node.should_return_null)
+                        frames.append(frame)
+                        code, consts, stack, context = body.code, body.consts, frame.stack, new_context
+                        ip = 0
+                    else:
+                        stack.append(return_value)
+
+            elif op == FOR_APPEND:
+                value = stack.pop()
+                stack[-1][4].append(value)
+
+            elif op == SPECIALIZE:
+                stack[-1] = specialized_callee(consts[arg], stack[-1])
+
+            elif op == CALL or op == TAIL_CALL:
+                count, site = consts[arg]
+                if count:
+                    args = stack[-count:]
+                    del stack[-count:]
+                else:
+                    args = []
+                value_to_call = stack.pop()
+
+                try:
+                    if type(value_to_call) is Procedure and value_to_call.engine is self:
+                        # GUARD_FAILED unless the PROC is hot and transpiled
+                        return_value = value_to_call.execute_fast(args, context, site)
+                        if return_value is GUARD_FAILED:
+                            new_context = value_to_call.prepare(args, context, site)
+                    else:
+                        return_value = value_to_call.execute(args, context, site)
+                except RTException as e:
+                    error = e.error
+                else:
+                    if return_value is GUARD_FAILED:
+                        proc_node = value_to_call.proc_node
+                        body = self.compile(proc_node.body_node, f"<PROC {value_to_call.name or '<anonymous>'}>", True)
+                        if op == TAIL_CALL:
+                            # the caller only has its RETURN left, the call takes
+                            # its frame and its place in a traceback
+                            return_null = frame.return_null or value_to_call.should_return_null
+                            new_context.parent_context = context.parent_context
+                            new_context.entry = context.entry
+                            if len(frames) > 1:
+                                release(context)
+                            frame = frames[-1] = Frame(body, new_context, return_null)
+                        else:
+                            if len(frames) >= MAX_FRAMES:
+                                raise RecursionError("maximum recursion depth exceeded")
+                            frame.ip = ip
+                            frame = Frame(body, new_context, value_to_call.should_return_null)
+                            frames.append(frame)
+                        code, consts, stack, context = body.code, body.consts, frame.stack, new_context
+                        ip = 0
+                    else:
+                        stack.append(return_value)
+
+            elif op == RETURN:
+                value = stack.pop()
+                return_null = frame.return_null
+                frames.pop()
+                if not frames:
+                    return value, None
+                release(context)
+
+                frame = frames[-1]
+                code, consts, stack, context = frame.code, frame.consts, frame.stack, frame.context
+                ip = frame.ip
+
+                stack.append(None if return_null else value)
+
+            elif op == STORE_LOCAL:
+                context.symbol_table.slots[arg] = stack[-1]
+
+            elif op == STORE:
+                context.symbol_table.set_val(consts[arg], stack[-1])
+
+            elif op == LOAD_OUTER:
+                depth, slot, var_name, pos_start, pos_end = consts[arg]
+                value = context.symbol_table.load(depth, slot, var_name)
+                if not value:
+                    error = RTError(pos_start, pos_end, f"{var_name} is not defined", context)
+                else:
+                    stack.append(value)
+
+            elif op == BEGIN_LIST:
+                stack.append(None)
+                frame.blocks.append([len(stack) - 1, 0, False, 0])
+
+            elif op == BUILD_LIST:
+                count = consts[arg]
+                frame.blocks.pop()
+                elements = stack[len(stack) - count:]
+                error = stack[-count - 1]
+                del stack[-count - 1:]
+                value = List(elements)
+                if not error:
+                    stack.append(value)
+
+            elif op == STRING:
+                stack.append(consts[arg])
+
+            elif op == POP:
+                stack.pop()
+
+            elif op == PUSH_NONE:
+                stack.append(None)
+
+            elif op == FOR_SETUP:
+                var_name, has_step, for_node = consts[arg]
+                step_value = stack.pop() if has_step else number(1)
+                end_value = stack.pop()
+                stepper = stack.pop().value
+                reset_invariants(for_node, context.symbol_table)
+                # the direction is picked from the sign of the start value
+                stack.append([stepper, end_value, step_value, stepper >= 0, [], var_name])
+
+            elif op == FOR_END:
+                elements = stack.pop()[4]
+                if consts[arg]:
+                    stack.append(None)
+                else:
+                    stack.append(List(elements))
+
+            elif op == MAKE_PROC:
+                proc_node = consts[arg]
+                proc_name = proc_node.var_name
+                proc_value = Procedure(proc_name, proc_node, self, context.symbol_table)
+                if proc_name:
+                    context.symbol_table.set_val(proc_name, proc_value)
+                stack.append(proc_value)
+
+            elif op == NEGATE or op == NOT:
+                unary_node = consts[arg]
+                operand = stack.pop()
+                try:
+                    stack.append(unary_node.operation[operand.__class__](operand))
+                except OperationError as e:
+                    error = operation_error(e, unary_node, context)
+
+            if error is None:
+                continue
+
+            # Unwind to the innermost list being built, a failed list keeps
+            # its value when it is an element of the list handling the error
+            carried = value if op == BUILD_LIST else None
+            while not frame.blocks:
+                frames.pop()
+                if not frames:
+                    return carried, error
+                frame = frames[-1]
+                carried = None
+            code, consts, stack, context = frame.code, frame.consts, frame.stack, frame.context
+
+            error_slot, ip, keep_value, depth = frame.blocks[-1]
+            del stack[depth:]
+            stack[error_slot] = error
+            stack.append(carried if keep_value else None)
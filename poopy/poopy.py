@@ -1,6 +1,13 @@
 from core.constant import PROMPT, INTRO, OUTRO, OOPSIE_POOPSIE
-from core.run import Run
+from core.run import Run, ENGINES
+from core.cache import ast_cache
+from core.check import check_files
+from core.optimizer import OPT_LEVELS, DEFAULT_OPT_LEVEL
+from core.lookup_cache import lookup_cache_stats
+from core.types.number import set_noice_hook, print_noice
 from argparse import ArgumentParser
+import sys
+import time
 
 from prompt_toolkit import prompt
 from prompt_toolkit.styles import Style
@@ -11,40 +18,112 @@ poop_style = Style.from_dict({
 def get_poop_prompt():
     return f"\U0001F4A9poopy\U0001F4A9"
 
-parser = ArgumentParser()
-parser.add_argument("--file", required= False)
-args = parser.parse_args()
-
-if args.file:
-    file = args.file
-
-    with open(file, "r") as f:
-        text = f.read()
-
-    try:
-        result, error = Run().run(file, text, mode = "File")
-        if error:
-            print(error.as_string())
-        elif result !=" ":
-            print(repr(result)) 
-    except Exception as e:
-        print(e)
-        print(OOPSIE_POOPSIE)
-
-if not args.file:
-    print(INTRO)
-    try:
-        while True:
-            text = prompt(PROMPT, rprompt=get_poop_prompt, style=poop_style)
-            if text == "":
-                continue
-            result, error = Run().run("<STD_IN>", text, mode="Terminal")
+def recursed_through_calls(error):
+    """
+    Whether PROC calls make up the depth a RecursionError ran out of, a
+    call takes a handful of Python frames on the tree and closure engines.
+    Deep expressions exhaust the stack of every engine, vm included.
+    """
+    from core.types.procedure import Procedure
+
+    frames = calls = 0
+    tb = error.__traceback__
+    while tb:
+        frames += 1
+        calls += tb.tb_frame.f_code is Procedure.execute.__code__
+        tb = tb.tb_next
+    return calls * 10 >= frames
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--file", required= False)
+    parser.add_argument("--stream", action="store_true", help="execute --file one statement at a time")
+    parser.add_argument("--strict", action="store_true", help="parse every PROC body up front instead of on first call")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="tree", help="how --file is executed, vm recurses up to a million calls deep and runs tail calls in constant space")
+    parser.add_argument("--dis", action="store_true", help="print the bytecode of --file and its PROCs instead of running it")
+    parser.add_argument("--dump-ast", action="store_true", help="print the tree of --file as it would run instead of running it")
+    parser.add_argument("--opt-level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL, help="0 runs the tree as parsed, 1 folds constants and drops dead code, 2 also hoists loop invariants, inlines small PROCs, specialises the others on literal or numeric args and runs numeric expressions on plain values")
+    parser.add_argument("--no-noice", action="store_true", help="do not print a noice when a program computes 69420")
+    parser.add_argument("--cache-stats", action="store_true", help="print how often the global lookup caches of --file hit once it ran")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the .poopc AST cache")
+    parser.add_argument("--check", nargs="+", metavar="PATH", help="only lex and parse the files and directories, nothing is executed")
+    parser.add_argument("--jobs", type=int, help="worker processes for --check, one per core by default")
+    args = parser.parse_args()
+
+    if not args.no_noice:
+        set_noice_hook(print_noice)
+
+    if args.no_cache:
+        ast_cache.enabled = False
+
+    if args.check:
+        start = time.perf_counter()
+        checked = failed = 0
+        for result in check_files(args.check, args.jobs):
+            checked += 1
+            failed += not result.ok
+            print(result.as_string())
+        print(f"{checked} files checked, {failed} failed in {time.perf_counter() - start:.2f} s")
+        sys.exit(1 if failed else 0)
+
+    if args.file:
+        file = args.file
+
+        try:
+            if args.dis:
+                with open(file, "r") as f:
+                    text = f.read()
+                listing, error = Run().disassemble(file, text, args.opt_level)
+                print(error.as_string() if error else listing)
+                return
+            if args.dump_ast:
+                with open(file, "r") as f:
+                    text = f.read()
+                listing, error = Run().dump_ast(file, text, args.opt_level)
+                print(error.as_string() if error else listing)
+                return
+            if args.stream:
+                result, error = Run().run_stream(file, args.strict, args.engine, args.opt_level)
+            else:
+                with open(file, "r") as f:
+                    text = f.read()
+                runner = Run()
+                result, error = runner.run(file, text, mode = "File", strict=args.strict, engine=args.engine, opt_level=args.opt_level)
+                if args.cache_stats and runner.node is not None:
+                    sites, hits, misses = lookup_cache_stats(runner.node)
+                    print(f"{sites} global lookup sites, {hits} hits, {misses} misses")
             if error:
                 print(error.as_string())
-            elif result !="None":
-                print(repr(result))
-    except KeyboardInterrupt:
-        print(OUTRO)
-    except Exception as e:
-        print(e)
-        print(OOPSIE_POOPSIE)
+            elif result !=" ":
+                print(repr(result)) 
+        except RecursionError as e:
+            print(e)
+            if args.engine != "vm" and recursed_through_calls(e):
+                print("--engine vm runs PROC calls on a stack of its own and recurses a lot deeper")
+            print(OOPSIE_POOPSIE)
+        except Exception as e:
+            print(e)
+            print(OOPSIE_POOPSIE)
+
+    if not args.file:
+        print(INTRO)
+        try:
+            while True:
+                text = prompt(PROMPT, rprompt=get_poop_prompt, style=poop_style)
+                if text == "":
+                    continue
+                result, error = Run().run("<STD_IN>", text, mode="Terminal")
+                if error:
+                    print(error.as_string())
+                elif result !="None":
+                    print(repr(result))
+        except KeyboardInterrupt:
+            print(OUTRO)
+        except Exception as e:
+            print(e)
+            print(OOPSIE_POOPSIE)
+
+
+# process pool workers re-import this module, only the parent runs main
+if __name__ == "__main__":
+    main()